@@ -5,7 +5,7 @@ import sys
 assert py4web.check_compatible("1.20190709.1")
 
 # by importing controllers you expose the actions defined in it
-if not any(x in sys.argv[0] for x in ["cleanup_themealdb.py", "some_other_script.py"]):
+if not any(x in sys.argv[0] for x in ["cleanup_themealdb.py", "rebuild_nutrition.py", "load_recipes.py", "dedupe_uploads.py", "benchmark_", "some_other_script.py"]):
     from . import controllers
 # by importing db you expose it to the _dashboard/dbadmin
 from .models import db
@@ -0,0 +1,172 @@
+"""
+This file runs one-off jobs such as the TheMealDB import in a daemon thread,
+so app startup never waits on the network, and holds the thread helpers every
+background worker of the app is built on: run_in_thread() for a single run
+and Worker for a per-process loop that is started again whenever there is
+new work.
+
+db.background_job keeps one row per job name. Its unique name makes the
+"already done?" check a single indexed lookup and lets only one worker
+process claim a job at a time. Failed jobs are claimed again on next start.
+Work done before a job existed (e.g. an import on an older database) is
+checked once, before the job's first claim, and recorded as its outcome.
+"""
+
+import datetime
+import threading
+import traceback
+
+from .common import db, logger
+
+# a job still "running" after this long is assumed dead and may be claimed again
+STALE_AFTER = datetime.timedelta(hours=1)
+
+
+def claim_job(name):
+    """Mark job name as running, return False if it is already done or running elsewhere"""
+    now = datetime.datetime.utcnow()
+    job = db(db.background_job.name == name).select().first()
+    if job and job.status == 'done':
+        return False
+    if job and job.status == 'running' and job.started_on and now - job.started_on < STALE_AFTER:
+        return False
+    try:
+        if job:
+            # only take over the row if nobody else did since we read it
+            claimed = db(
+                (db.background_job.id == job.id) &
+                (db.background_job.status == job.status) &
+                (db.background_job.started_on == job.started_on)
+            ).update(status='running', started_on=now, finished_on=None, details=None)
+        else:
+            claimed = db.background_job.insert(name=name, status='running', started_on=now)
+        db.commit()
+        return bool(claimed)
+    except Exception:
+        # another process inserted the same name first
+        db.rollback()
+        return False
+
+
+def finish_job(name, status, details=None):
+    """Record the outcome of a claimed job"""
+    db(db.background_job.name == name).update(
+        status=status, finished_on=datetime.datetime.utcnow(), details=details
+    )
+    db.commit()
+
+
+def is_job_done(name, done_before=None):
+    """
+    True once job name has completed successfully. For a job without a row
+    yet, done_before() is asked once whether its work was done before the job
+    existed: details it returns are recorded as the job's, marking it done.
+    """
+    job = db(db.background_job.name == name).select(db.background_job.status).first()
+    if job or done_before is None:
+        return bool(job) and job.status == 'done'
+    details = done_before()
+    if not details:
+        # the first claim adds the row, so this is not asked again
+        return False
+    now = datetime.datetime.utcnow()
+    try:
+        db.background_job.insert(name=name, status='done', started_on=now, finished_on=now, details=details)
+        db.commit()
+    except Exception:
+        # another process recorded the job first
+        db.rollback()
+        return is_job_done(name)
+    return True
+
+
+def run_in_thread(name, description, func, *args):
+    """
+    Run func(*args) in a daemon thread called name and return the thread. A
+    failure is rolled back and logged as "<description> failed"; the thread's
+    own DAL connection (pydal opens one per thread) is closed when it ends.
+    """
+    def run():
+        try:
+            func(*args)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"{description} failed: {e}\n{traceback.format_exc()}")
+        finally:
+            db._adapter.close()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+class Worker:
+    """
+    One daemon thread per process that calls step() until there is nothing
+    left to do. step() returns None when done, else the seconds to wait before
+    calling it again (0: at once). start() runs the thread unless it is already
+    running; a running one is woken from its wait and calls step() again even
+    if it was about to stop, so work queued meanwhile is never missed.
+    """
+
+    def __init__(self, name, description, step):
+        self.name = name
+        self.description = description
+        self.step = step
+        self.thread = None
+        self.wanted = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def start(self):
+        """Make sure the thread runs step() again soon; returns the thread"""
+        with self.lock:
+            self.wanted = True
+            self.wake.set()
+            if self.thread is None:
+                self.thread = run_in_thread(self.name, self.description, self._run)
+            return self.thread
+
+    def _run(self):
+        try:
+            while True:
+                with self.lock:
+                    self.wanted = False
+                    self.wake.clear()
+                wait = self.step()
+                with self.lock:
+                    if wait is None and not self.wanted:
+                        self.thread = None
+                        return
+                if wait:
+                    self.wake.wait(wait)
+        except Exception:
+            # run_in_thread() logs it, the next start() runs a new thread
+            with self.lock:
+                self.thread = None
+            raise
+
+
+def _run_job(name, func, done_before):
+    try:
+        if is_job_done(name, done_before) or not claim_job(name):
+            return
+        logger.info(f"Background job {name} started")
+        details = func()
+        finish_job(name, 'done', details)
+        logger.info(f"Background job {name} done: {details}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Background job {name} failed: {e}\n{traceback.format_exc()}")
+        try:
+            finish_job(name, 'failed', str(e))
+        except Exception:
+            db.rollback()
+
+
+def start_job(name, func, done_before=None):
+    """
+    Run func() once in a daemon thread unless job name is already done (see
+    is_job_done() for done_before); returns the thread
+    """
+    return run_in_thread(f"job-{name}", f"Background job {name}", _run_job, name, func, done_before)
@@ -9,18 +9,19 @@ from pydal.tools.scheduler import Scheduler
 from pydal.tools.tags import Tags
 
 from py4web import DAL, Cache, Field, Flash, Session, Translator, action
-from py4web.server_adapters.logging_utils import make_logger
 from py4web.utils.auth import Auth
 from py4web.utils.downloader import downloader
 from py4web.utils.factories import ActionFactory
 from py4web.utils.mailer import Mailer
 
 from . import settings
+from .session_store import SessionStore, persistent_secret
+from .structured_log import make_queue_logger
 
 # #######################################################
-# implement custom loggers form settings.LOGGERS
+# implement custom loggers form settings.LOGGERS, written from a queue
 # #######################################################
-logger = make_logger("py4web:" + settings.APP_NAME, settings.LOGGERS)
+logger = make_queue_logger("py4web:" + settings.APP_NAME, settings.LOGGERS)
 
 # #######################################################
 # connect to db
@@ -42,11 +43,17 @@ T = Translator(settings.T_FOLDER)
 # #######################################################
 # pick the session type that suits you best
 # #######################################################
-if settings.SESSION_TYPE == "cookies":
-    session = Session(secret=settings.SESSION_SECRET_KEY)
+session_secret = settings.SESSION_SECRET_KEY or persistent_secret(settings.SESSION_SECRET_FILE)
 
-elif settings.SESSION_TYPE == "memory":
-    session = Session(secret=settings.SESSION_SECRET_KEY)
+if settings.SESSION_TYPE == "sqlite":
+    session = Session(
+        secret=session_secret,
+        expiration=settings.SESSION_EXPIRATION,
+        storage=SessionStore(settings.SESSION_DB),
+    )
+
+elif settings.SESSION_TYPE in ("cookies", "memory"):
+    session = Session(secret=session_secret, expiration=settings.SESSION_EXPIRATION)
 
 elif settings.SESSION_TYPE == "redis":
     import redis
@@ -59,7 +66,7 @@ elif settings.SESSION_TYPE == "redis":
         if ct(k) >= 0
         else cs(k, v, e)
     )
-    session = Session(secret=settings.SESSION_SECRET_KEY, storage=conn)
+    session = Session(secret=session_secret, expiration=settings.SESSION_EXPIRATION, storage=conn)
 
 elif settings.SESSION_TYPE == "memcache":
     import time
@@ -67,12 +74,12 @@ elif settings.SESSION_TYPE == "memcache":
     import memcache
 
     conn = memcache.Client(settings.MEMCACHE_CLIENTS, debug=0)
-    session = Session(secret=settings.SESSION_SECRET_KEY, storage=conn)
+    session = Session(secret=session_secret, expiration=settings.SESSION_EXPIRATION, storage=conn)
 
 elif settings.SESSION_TYPE == "database":
     from py4web.utils.dbstore import DBStore
 
-    session = Session(secret=settings.SESSION_SECRET_KEY, storage=DBStore(db))
+    session = Session(secret=session_secret, expiration=settings.SESSION_EXPIRATION, storage=DBStore(db))
 
 # #######################################################
 # Instantiate the object and actions that handle auth
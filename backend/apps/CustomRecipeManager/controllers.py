@@ -31,10 +31,39 @@ from .common import (
     session, unauthenticated
 )
 from . import settings
+from .background_jobs import claim_job, finish_job, is_job_done
+from .credentials import CredentialsBusy, hash_password, needs_rehash, verify_password
+from .nutrition import (
+    CARD_NUTRIENTS, NUTRIENTS, get_additional_images, get_joined_nutrition,
+    nutrition_left_join, refresh_ingredient_nutrition, refresh_recipe_nutrition
+)
+from .ingredient_autocomplete import (
+    build_ingredient_autocomplete, fuzzy_search, index_ingredient, prefix_search
+)
+from .image_derivatives import get_derivative, schedule_derivatives
+from .image_downloads import queue_image_downloads
+from .mail_outbox import queue_mail, start_mail_delivery
+from .models import themealdb_imported_before_jobs
+from .ingredient_index import (
+    build_ingredient_index, index_recipe, match_recipes, rank_matches, unindex_recipe
+)
+from .recipe_etags import conditional_get, public_recipes_validators, recipe_detail_validators
+from .recipe_loader import load_ingredients, load_recipes
+from .response_cache import cached_response, hit_rates, invalidate
+from .rate_limit import client_ip, limiter_stats, throttle
+from .pagination import (
+    after_cursor, approximate_total, decode_position_cursor, encode_position_cursor,
+    get_page_size, paginate, recipe_order
+)
+from .search_index import search_recipes_page
+from .spa import SPA_ROUTES, serve_asset, serve_shell
+from .structured_log import log_config, log_event, set_log_config
+from .static_files import IMMUTABLE, REVALIDATE, send_file
+from .uploads import (
+    MAX_IMAGES, UploadError, discard_uploads, is_content_addressed, release_images, save_uploads, uploaded_files
+)
 import datetime
 import os
-import mimetypes
-import requests
 
 def set_cors_headers():
     """Set CORS headers based on request origin"""
@@ -45,31 +74,16 @@ def set_cors_headers():
     response.headers['Access-Control-Allow-Credentials'] = 'true'
     response.headers['Content-Type'] = 'application/json'
 
-def download_themealdb_image(url, recipe_name):
-    """Download image from TheMealDB and save to uploads directory"""
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            # Create uploads directory if it doesn't exist
-            uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-            os.makedirs(uploads_dir, exist_ok=True)
-            
-            # Create filename from recipe name and add timestamp to ensure uniqueness
-            timestamp = datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            filename = f"themealdb_{recipe_name.lower().replace(' ', '_')}_{timestamp}.jpg"
-            filepath = os.path.join(uploads_dir, filename)
-            
-            # Save the image
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            
-            return filename
-        else:
-            logger.error(f"Failed to download TheMealDB image. Status code: {response.status_code}")
-            return None
-    except Exception as e:
-        logger.error(f"Error downloading TheMealDB image: {e}")
-        return None
+# nutrition values given to ingredients created by the admin TheMealDB import
+THEMEALDB_INGREDIENT_DEFAULTS = {
+    'calories_per_unit': 50,
+    'protein_per_unit': 2,
+    'fat_per_unit': 1,
+    'carbs_per_unit': 10,
+    'sugar_per_unit': 2,
+    'fiber_per_unit': 1,
+    'sodium_per_unit': 5
+}
 
 # ==============================================================
 # -------------------- INGREDIENT SEARCH -----------------------
@@ -77,37 +91,24 @@ def download_themealdb_image(url, recipe_name):
 
 @action('api/ingredients/search', method=['GET'])
 @action.uses(db)
+@cached_response('ingredients', headers=set_cors_headers)
 def ingredients_search():
-    """Search ingredients with pagination"""
+    """Search ingredients with pagination, fuzzy=true ranks typo-tolerant matches by similarity"""
     set_cors_headers()
     
     query = request.params.get('query', '').strip().lower()
+    fuzzy = request.params.get('fuzzy', 'false').lower() == 'true'
 
     page  = int(request.params.get('page', 1))
     limit = int(request.params.get('limit', 5))
 
     start, end = (page - 1) * limit, (page * limit)
 
-    ingredients_query = (
-        db.ingredient.name.ilike(f"{query}%") if query else db.ingredient
-    )
-    total_count = db(ingredients_query).count()
-
-    ingredients = db(ingredients_query).select(
-        db.ingredient.id,
-        db.ingredient.name,
-        db.ingredient.unit,
-        db.ingredient.description,
-        db.ingredient.calories_per_unit,
-        db.ingredient.protein_per_unit,
-        db.ingredient.fat_per_unit,
-        db.ingredient.carbs_per_unit,
-        db.ingredient.sugar_per_unit,
-        db.ingredient.fiber_per_unit,
-        db.ingredient.sodium_per_unit,
-        orderby=db.ingredient.name,
-        limitby=(start, end)
-    ).as_list()
+    # Served from the in-memory autocomplete index, no query per keystroke
+    if fuzzy:
+        ingredients, total_count = fuzzy_search(query, start, end)
+    else:
+        ingredients, total_count = prefix_search(query, start, end)
 
     return dict(
         ingredients=ingredients,
@@ -160,6 +161,11 @@ def add_ingredient():
             created_by=auth.current_user['id']
         )
         
+        index_ingredient(ingredient_id)
+        # commit first, cached ingredient searches are dropped once it is visible
+        db.commit()
+        invalidate('ingredients')
+        
         ingredient = db.ingredient[ingredient_id]
         response.status = 201
         return {
@@ -190,10 +196,75 @@ def ingredients_options():
     set_cors_headers()
     return ""
 
+# ==============================================================
+# ------------------- EDIT INGREDIENT --------------------------
+# ==============================================================
+
+@action('api/ingredients/<ingredient_id:int>', method=['PUT', 'PATCH'])
+@action.uses(db, session, auth.user)
+def update_ingredient(ingredient_id):
+    """Edit an ingredient (its creator or the admin), refreshing the nutrition of every recipe that uses it"""
+    set_cors_headers()
+    
+    if not auth.current_user:
+        response.status = 401
+        return {"error": "Not authenticated"}
+    ingredient = db.ingredient[ingredient_id]
+    if not ingredient:
+        response.status = 404
+        return {"error": "Ingredient not found"}
+    if ingredient.created_by != auth.current_user['id'] and auth.current_user.get('email') != 'admin@example.com':
+        response.status = 403
+        return {"error": "You did not create this ingredient"}
+    
+    try:
+        data = request.json or {}
+        updatable_fields = ['name', 'unit', 'description'] + [f'{n}_per_unit' for n in NUTRIENTS]
+        update_dict = {field: data[field] for field in updatable_fields if field in data}
+        if not update_dict:
+            response.status = 400
+            return {"error": f"Nothing to update, send any of: {', '.join(updatable_fields)}"}
+        if 'name' in update_dict:
+            update_dict['name'] = str(update_dict['name']).strip()
+            same_name = (db.ingredient.name.lower() == update_dict['name'].lower()) & (db.ingredient.id != ingredient_id)
+            if db(same_name).count():
+                response.status = 400
+                return {"error": "Ingredient with this name already exists"}
+        
+        # the table's validators (unit, lengths, per-unit ranges)
+        result = db(db.ingredient.id == ingredient_id).validate_and_update(**update_dict)
+        if result['errors']:
+            response.status = 400
+            return {"error": "Invalid ingredient values", "fields": dict(result['errors'])}
+        # recipes using it get their new totals in the same transaction
+        refreshed = refresh_ingredient_nutrition(ingredient_id)
+        index_ingredient(ingredient_id)
+        db.commit()
+        invalidate('ingredients', 'recipes')
+        
+        return {"success": True, "message": "Ingredient updated successfully", "recipes_refreshed": len(refreshed)}
+    
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ingredient update error: {e}\n{traceback.format_exc()}")
+        response.status = 500
+        return {"error": "Failed to update ingredient. Please try again."}
+
+@action('api/ingredients/<ingredient_id:int>', method=['OPTIONS'])
+def ingredient_options(ingredient_id):
+    set_cors_headers()
+    return ""
+
 # ==============================================================
 # ------------------- AUTHENTICATION API -----------------------
 # ==============================================================
 
+def too_many_attempts(wait):
+    """429 answer for a throttled login / registration, wait is the seconds until the next try"""
+    response.status = 429
+    response.headers['Retry-After'] = str(wait)
+    return {"error": "Too many attempts, please try again later", "retry_after": wait}
+
 @action('api/auth/register', method=['POST'])
 @action.uses(db, session, auth)
 def auth_register():
@@ -207,14 +278,17 @@ def auth_register():
             response.status = 400
             return {"error": f"Missing required fields: {', '.join(required)}"}
 
+        wait = throttle('register', ip=client_ip())
+        if wait:
+            return too_many_attempts(wait)
+
         if db(db.auth_user.email == data['email']).count():
             response.status = 400
             return {"error": "User with this email already exists"}
 
-        from pydal.validators import CRYPT
         user_id = db.auth_user.insert(
             email=data['email'],
-            password=CRYPT()(data['password'])[0],
+            password=hash_password(data['password']),
             first_name=data['first_name'],
             last_name=data.get('last_name', ''),
             username=data['email']
@@ -233,6 +307,10 @@ def auth_register():
             },
             "redirect": "/dashboard"
         }
+    except CredentialsBusy as e:
+        response.status = e.status
+        response.headers['Retry-After'] = '1'
+        return {"error": str(e)}
     except Exception as e:
         logger.error(f"Registration error: {e}\n{traceback.format_exc()}")
         response.status = 500
@@ -246,34 +324,27 @@ def auth_login():
 
     try:
         data = request.json or {}
-        print("=== LOGIN DEBUG ===")
-        print("Request headers:", dict(request.headers))
-        print("Initial session:", dict(session))
-        
+
         if not {'email', 'password'}.issubset(data):
             response.status = 400
             return {"error": "Missing required fields: email, password"}
 
-        print("Attempting to find user:", data['email'])
+        # before the user lookup and password hashing, so a flood costs neither
+        wait = throttle('login', ip=client_ip(), email=data['email'])
+        if wait:
+            return too_many_attempts(wait)
+
         user = db(db.auth_user.email == data['email']).select().first()
-        print("Found user:", user is not None)
-        
-        if not user:
-            response.status = 401
-            return {"error": "Invalid email or password"}
 
-        # Validate password using py4web's built-in methods
-        from pydal.validators import CRYPT
-        crypt = CRYPT()
-        if crypt(data['password'])[0] == user.password:
+        # Verified on the hashing pool, an unknown email takes as long as a wrong password
+        if verify_password(data['password'], user.password if user else None):
+            if needs_rehash(user.password):
+                # stored with an older algorithm or cost, upgrade it while we have the password
+                user.update_record(password=hash_password(data['password']))
+
             # Use auth's session management
             auth.store_user_in_session(user['id'])
-            
-            print("Login success: True")
-            print("User:", user)
-            print("Session after login:", dict(session))
-            print("Auth current_user:", auth.current_user)
-            print("==================")
+            log_event('auth_login', 'login', outcome='success', user_id=user.id)
             
             return {
                 "success": True,
@@ -287,9 +358,14 @@ def auth_login():
                 "redirect": "/dashboard"
             }
         else:
+            log_event('auth_login', 'login', outcome='invalid', known_user=user is not None)
             response.status = 401
             return {"error": "Invalid email or password"}
 
+    except CredentialsBusy as e:
+        response.status = e.status
+        response.headers['Retry-After'] = '1'
+        return {"error": str(e)}
     except Exception as e:
         logger.error(f"Login error: {e}\n{traceback.format_exc()}")
         response.status = 500
@@ -300,13 +376,16 @@ def auth_login():
 def auth_logout():
     """Log a user out"""
     set_cors_headers()
-    # Clear all session data
-    session.clear()
-    auth.clear_session()
-    # Clear auth cookies
-    response.cookies['py4web_session'] = ''
-    response.cookies['py4web_session']['expires'] = 'Thu, 01 Jan 1970 00:00:00 GMT'
-    response.cookies['py4web_session']['path'] = '/'
+    cookie_name = session.local.cookie_name
+    session_id = session.get('uuid')
+    # End the auth state the way py4web's Auth logout does (it has no clear_session()),
+    # keeping the session id so the emptied session replaces the stored one for every worker
+    auth.session.clear()
+    if session_id:
+        session['uuid'] = session_id
+    # Clear the auth cookie in the browser; the emptied session is saved after this
+    # action and its cookie keeps the expiry set here
+    response.delete_cookie(cookie_name, path='/')
     return {"success": True, "message": "Logout successful"}
 
 @action('api/auth/user', method=['GET'])
@@ -345,8 +424,10 @@ for _path in ('register', 'login', 'logout', 'user'):
 def create_recipe():
     set_cors_headers()
 
+    saved = []
     try:
         # Handle both JSON and multipart form data
+        image_files = []
         if request.headers.get('content-type', '').startswith('multipart/form-data'):
             data = {}
             # Get form fields
@@ -359,27 +440,12 @@ def create_recipe():
                 else:
                     data[key] = request.forms[key]
             
-            # Handle multiple image uploads (py4web style)
-            if 'images' in request.files:
-                image_files = request.files['images']
-                # Ensure image_files is always a list
-                if not isinstance(image_files, list):
-                    image_files = [image_files]
-                if image_files:
-                    uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-                    os.makedirs(uploads_dir, exist_ok=True)
-                    data['images'] = []
-                    for image_file in image_files:
-                        if image_file and hasattr(image_file, 'filename'):
-                            filename = f"recipe_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{len(data['images'])}.jpg"
-                            image_path = os.path.join(uploads_dir, filename)
-                            with open(image_path, 'wb') as f:
-                                f.write(image_file.file.read())
-                            data['images'].append(filename)
+            image_files = uploaded_files(request.files, 'images')
         else:
             data = request.json
 
-        print("Received data:", data)  # Debug print
+        # field names only, the recipe text itself is not logged
+        log_event('create_recipe', 'received', 'debug', fields=sorted(data) if isinstance(data, dict) else type(data).__name__)
 
         required_fields = {'name', 'type', 'description', 'instruction_steps', 'servings'}
         
@@ -392,6 +458,11 @@ def create_recipe():
         if data['type'] not in valid_types:
             response.status = 400
             return {"error": f"Invalid recipe type. Must be one of: {', '.join(valid_types)}"}
+        
+        # Handle multiple image uploads, streamed to disk once the recipe is known to be valid
+        if image_files:
+            saved = save_uploads(image_files)
+            data['images'] = [item['filename'] for item in saved]
             
         # Create the recipe
         recipe_id = db.recipe.insert(
@@ -422,6 +493,11 @@ def create_recipe():
                 ingredient_id=ing['id'],
                 quantity_per_serving=ing.get('quantity_per_serving', 1)
             )
+        refresh_recipe_nutrition([recipe_id])
+        index_recipe(recipe_id)
+        db.commit()
+        invalidate('recipes')
+        schedule_derivatives([item['filename'] for item in saved])
         
         # Get the created recipe with all images
         recipe = db.recipe[recipe_id]
@@ -443,7 +519,13 @@ def create_recipe():
             }
         }
         
+    except UploadError as e:
+        response.status = e.status
+        return {"error": str(e)}
     except Exception as e:
+        # nothing refers to the images this request stored
+        db.rollback()
+        discard_uploads(saved)
         logger.error(f"Recipe creation error: {e}\n{traceback.format_exc()}")
         response.status = 500
         return {"error": "Failed to create recipe. Please try again."}
@@ -460,41 +542,26 @@ def get_recipes():
             db.recipe.ALL,
             db.auth_user.first_name,
             db.auth_user.last_name,
-            left=db.auth_user.on(db.recipe.author == db.auth_user.id),
+            db.recipe_nutrition.ALL,
+            left=[db.auth_user.on(db.recipe.author == db.auth_user.id), nutrition_left_join()],
             orderby=~db.recipe.created_on
         ).as_list()
 
+        # Nutrition comes from the joined recipe_nutrition rows, images in one query for the page
+        nutrition = get_joined_nutrition(recipes)
+        additional_images = get_additional_images([recipe['recipe']['id'] for recipe in recipes])
+
         # Format the recipes
         formatted_recipes = []
         for recipe in recipes:
-            # Get additional images for this recipe
-            recipe_images = db(db.recipe_multiple_images.recipe_id == recipe['recipe']['id']).select()
             all_images = []
             if recipe['recipe']['image']:
                 all_images.append(recipe['recipe']['image'])
-            all_images.extend([img.multi_images for img in recipe_images if img.multi_images])
-
-            # Calculate nutrition for this recipe
-            total_nutrition = {
-                'calories': 0,
-                'protein': 0,
-                'carbs': 0,
-                'fat': 0
-            }
-            recipe_ingredients = db(db.recipe_ingredient.recipe_id == recipe['recipe']['id']).select(
-                db.recipe_ingredient.ALL,
-                db.ingredient.ALL,
-                left=db.ingredient.on(db.recipe_ingredient.ingredient_id == db.ingredient.id)
-            )
-            for ri in recipe_ingredients:
-                if ri.ingredient.id:
-                    qty = ri.recipe_ingredient.quantity_per_serving or 0
-                    total_nutrition['calories'] += (ri.ingredient.calories_per_unit or 0) * qty
-                    total_nutrition['protein']  += (ri.ingredient.protein_per_unit or 0) * qty
-                    total_nutrition['carbs']    += (ri.ingredient.carbs_per_unit or 0) * qty
-                    total_nutrition['fat']      += (ri.ingredient.fat_per_unit or 0) * qty
-            servings = recipe['recipe']['servings'] or 1
-            nutrition_per_serving = {k: round(v / servings, 2) for k, v in total_nutrition.items()}
+            all_images.extend(additional_images[recipe['recipe']['id']])
+
+            recipe_nutrition = nutrition[recipe['recipe']['id']]
+            total_nutrition = {n: recipe_nutrition[f'total_{n}'] for n in CARD_NUTRIENTS}
+            nutrition_per_serving = {n: round(recipe_nutrition[f'{n}_per_serving'], 2) for n in CARD_NUTRIENTS}
             # Add both per serving and total fields for the frontend cards
             formatted_recipe = {
                 'id': recipe['recipe']['id'],
@@ -530,51 +597,51 @@ def recipes_options():
 
 @action('api/recipes/public', method=['GET'])
 @action.uses(db, session)
+@conditional_get(public_recipes_validators, headers=set_cors_headers)
+@cached_response('recipes', headers=set_cors_headers)
 def get_public_recipes():
-    """Return all public recipes"""
+    """Return public recipes one cursor page at a time"""
     set_cors_headers()
 
+    cursor = request.params.get('cursor', '').strip()
+    limit = get_page_size(request.params.get('limit'))
+
+    try:
+        query = db.recipe.id > 0
+        if cursor:
+            query &= after_cursor(cursor)
+    except ValueError as e:
+        response.status = 400
+        return {"error": str(e)}
+
     try:
-        # Get all recipes with author details
-        recipes = db().select(
+        # Get one page of recipes with author details, plus one row to detect a next page
+        recipes = db(query).select(
             db.recipe.ALL,
             db.auth_user.first_name,
             db.auth_user.last_name,
-            left=db.auth_user.on(db.recipe.author == db.auth_user.id),
-            orderby=~db.recipe.created_on
+            db.recipe_nutrition.ALL,
+            left=[db.auth_user.on(db.recipe.author == db.auth_user.id), nutrition_left_join()],
+            orderby=recipe_order(),
+            limitby=(0, limit + 1)
         ).as_list()
+        recipes, next_cursor = paginate(recipes, limit)
+
+        # Nutrition comes from the joined recipe_nutrition rows, images in one query for the page
+        nutrition = get_joined_nutrition(recipes)
+        additional_images = get_additional_images([recipe['recipe']['id'] for recipe in recipes])
 
         # Format the recipes
         formatted_recipes = []
         for recipe in recipes:
-            # Get additional images for this recipe
-            recipe_images = db(db.recipe_multiple_images.recipe_id == recipe['recipe']['id']).select()
             all_images = []
             if recipe['recipe']['image']:
                 all_images.append(recipe['recipe']['image'])
-            all_images.extend([img.multi_images for img in recipe_images if img.multi_images])
-
-            # Calculate nutrition for this recipe
-            total_nutrition = {
-                'calories': 0,
-                'protein': 0,
-                'carbs': 0,
-                'fat': 0
-            }
-            recipe_ingredients = db(db.recipe_ingredient.recipe_id == recipe['recipe']['id']).select(
-                db.recipe_ingredient.ALL,
-                db.ingredient.ALL,
-                left=db.ingredient.on(db.recipe_ingredient.ingredient_id == db.ingredient.id)
-            )
-            for ri in recipe_ingredients:
-                if ri.ingredient.id:
-                    qty = ri.recipe_ingredient.quantity_per_serving or 0
-                    total_nutrition['calories'] += (ri.ingredient.calories_per_unit or 0) * qty
-                    total_nutrition['protein']  += (ri.ingredient.protein_per_unit or 0) * qty
-                    total_nutrition['carbs']    += (ri.ingredient.carbs_per_unit or 0) * qty
-                    total_nutrition['fat']      += (ri.ingredient.fat_per_unit or 0) * qty
-            servings = recipe['recipe']['servings'] or 1
-            nutrition_per_serving = {k: round(v / servings, 2) for k, v in total_nutrition.items()}
+            all_images.extend(additional_images[recipe['recipe']['id']])
+
+            recipe_nutrition = nutrition[recipe['recipe']['id']]
+            total_nutrition = {n: recipe_nutrition[f'total_{n}'] for n in CARD_NUTRIENTS}
+            nutrition_per_serving = {n: round(recipe_nutrition[f'{n}_per_serving'], 2) for n in CARD_NUTRIENTS}
             # Add both per serving and total fields for the frontend cards
             formatted_recipe = {
                 'id': recipe['recipe']['id'],
@@ -596,7 +663,13 @@ def get_public_recipes():
             }
             formatted_recipes.append(formatted_recipe)
 
-        return {"success": True, "recipes": formatted_recipes}
+        return {
+            "success": True,
+            "recipes": formatted_recipes,
+            "limit": limit,
+            "next_cursor": next_cursor,
+            "total": approximate_total(db.recipe.id > 0)
+        }
     except Exception as e:
         logger.error(f"Get public recipes error: {e}\n{traceback.format_exc()}")
         response.status = 500
@@ -609,6 +682,8 @@ def public_recipes_options():
 
 @action('api/recipes/<recipe_id>', method=['GET'])
 @action.uses(db, session)
+@conditional_get(recipe_detail_validators, headers=set_cors_headers)
+@cached_response('recipes', headers=set_cors_headers)
 def get_recipe_detail(recipe_id):
     """Get detailed recipe information by ID"""
     set_cors_headers()
@@ -619,7 +694,8 @@ def get_recipe_detail(recipe_id):
             db.recipe.ALL,
             db.auth_user.first_name,
             db.auth_user.last_name,
-            left=db.auth_user.on(db.recipe.author == db.auth_user.id)
+            db.recipe_nutrition.ALL,
+            left=[db.auth_user.on(db.recipe.author == db.auth_user.id), nutrition_left_join()]
         ).first()
         
         if not recipe_query:
@@ -652,18 +728,7 @@ def get_recipe_detail(recipe_id):
             'images': [img['multi_images'] for img in images] if images else []
         }
         
-        # Initialize nutrition totals
-        total_nutrition = {
-            'calories': 0,
-            'protein': 0,
-            'fat': 0,
-            'carbs': 0,
-            'sugar': 0,
-            'fiber': 0,
-            'sodium': 0
-        }
-        
-        # Format ingredients and sum nutrition
+        # Format ingredients with their share of the nutrition
         formatted_recipe['ingredients'] = []
         for ingredient in ingredients:
             ing = ingredient['ingredient']
@@ -689,20 +754,12 @@ def get_recipe_detail(recipe_id):
             ingredient_data['sugar'] = ingredient_data['sugar_per_unit'] * qty
             ingredient_data['fiber'] = ingredient_data['fiber_per_unit'] * qty
             ingredient_data['sodium'] = ingredient_data['sodium_per_unit'] * qty
-            # Add to totals
-            total_nutrition['calories'] += ingredient_data['calories']
-            total_nutrition['protein']  += ingredient_data['protein']
-            total_nutrition['fat']      += ingredient_data['fat']
-            total_nutrition['carbs']    += ingredient_data['carbs']
-            total_nutrition['sugar']    += ingredient_data['sugar']
-            total_nutrition['fiber']    += ingredient_data['fiber']
-            total_nutrition['sodium']   += ingredient_data['sodium']
             formatted_recipe['ingredients'].append(ingredient_data)
         
-        # Add total and per-serving nutrition to recipe
-        servings = formatted_recipe['servings'] or 1
-        formatted_recipe['total_nutrition'] = {k: round(v, 2) for k, v in total_nutrition.items()}
-        formatted_recipe['nutrition_per_serving'] = {k: round(v / servings, 2) for k, v in total_nutrition.items()}
+        # Add total and per-serving nutrition from the materialized recipe_nutrition row
+        recipe_nutrition = get_joined_nutrition([recipe_query])[recipe_query['recipe']['id']]
+        formatted_recipe['total_nutrition'] = {n: round(recipe_nutrition[f'total_{n}'], 2) for n in NUTRIENTS}
+        formatted_recipe['nutrition_per_serving'] = {n: round(recipe_nutrition[f'{n}_per_serving'], 2) for n in NUTRIENTS}
         
         return {"success": True, "recipe": formatted_recipe}
         
@@ -735,26 +792,25 @@ def submit_contact():
 
         contact_id = db.contact.insert(**data)
 
-        # Optional: email notification
-        try:
-            if auth.sender and getattr(settings, 'CONTACT_NOTIFICATION_EMAIL', None):
-                auth.sender.send(
-                    to=[settings.CONTACT_NOTIFICATION_EMAIL],
-                    subject=f"New Contact Submission: {data['subject']}",
-                    body=f"From: {data['name']} <{data['email']}>\n\n{data['message']}"
-                )
-                auth.sender.send(
-                    to=[data['email']],
-                    subject="Thank you for contacting Mealzi!",
-                    body=(
-                        f"Hi {data['name']},\n\n"
-                        f"Thanks for reaching out about \"{data['subject']}\". "
-                        "We'll get back to you within 24 hours.\n\n"
-                        "— Mealzi Team"
-                    )
+        # Optional: email notification, sent in the background once committed
+        if settings.SMTP_SERVER and settings.CONTACT_NOTIFICATION_EMAIL:
+            queue_mail(
+                settings.CONTACT_NOTIFICATION_EMAIL,
+                f"New Contact Submission: {data['subject']}",
+                f"From: {data['name']} <{data['email']}>\n\n{data['message']}"
+            )
+            queue_mail(
+                data['email'],
+                "Thank you for contacting Mealzi!",
+                (
+                    f"Hi {data['name']},\n\n"
+                    f"Thanks for reaching out about \"{data['subject']}\". "
+                    "We'll get back to you within 24 hours.\n\n"
+                    "— Mealzi Team"
                 )
-        except Exception as mail_err:
-            logger.error(f"Email error: {mail_err}")
+            )
+            db.commit()
+            start_mail_delivery()
 
         return {
             "success": True,
@@ -786,34 +842,42 @@ def upload_images(recipe_id):
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
 
 
+    saved = []
     try:
         # get the upload files from the request
-        files = request.files.getlist('upload_images')
+        files = uploaded_files(request.files, 'upload_images')
         if not files:
             return dict(success=False, error="No files uploaded")
 
         # check how many images exist for the recipe
         existing_count = db(db.recipe_multiple_images.recipe_id == recipe_id).count()
-        available_slots = 5 - existing_count
+        available_slots = MAX_IMAGES - existing_count
 
         if available_slots <= 0:
-            return dict(success=False, error="Maximum of 5 images per recipe reached")
+            return dict(success=False, error=f"Maximum of {MAX_IMAGES} images per recipe reached")
 
-        # accept only the number of files that fit within the limit
-        files_to_upload = files[:available_slots]
+        # accept only the number of files that fit within the limit, streamed to disk
+        saved = save_uploads(files[:available_slots])
         uploaded = 0
 
-        for f in files_to_upload:
+        for item in saved:
             db.recipe_multiple_images.insert(
                 recipe_id=recipe_id,
-                multi_images=f
+                multi_images=item['filename']
             )
             uploaded += 1
+        db.commit()
+        invalidate('recipes')
+        schedule_derivatives([item['filename'] for item in saved])
 
+        return dict(success=True, uploaded=uploaded, remaining=MAX_IMAGES - (existing_count + uploaded))
 
-        return dict(success=True, uploaded=uploaded, remaining=5 - (existing_count + uploaded))
-
+    except UploadError as e:
+        response.status = e.status
+        return dict(success=False, error=str(e))
     except Exception as e:
+        db.rollback()
+        discard_uploads(saved)
         return dict(success=False, error=str(e))
 
 # ==============================================================
@@ -834,231 +898,230 @@ def import_themealdb():
         response.status = 403
         return {"error": "Admin access required"}
     
+    # Shares the themealdb_import job with the startup auto-import, so only one of them runs
+    if is_job_done('themealdb_import', done_before=themealdb_imported_before_jobs):
+        return {
+            "success": False,
+            "message": "Import already completed.",
+            "recipes_imported": 0,
+            "ingredients_imported": 0
+        }
+    if not claim_job('themealdb_import'):
+        response.status = 409
+        return {"error": "TheMealDB import is already running"}
+    
     try:
-        import requests
-        import json
-        import time
-        from datetime import datetime
-        
-        # Check if import has already been done
-        existing_recipes = db(db.recipe.description.like('%TheMealDB%')).count()
-        if existing_recipes > 0:
-            return {
-                "success": False, 
-                "message": f"Import already completed. Found {existing_recipes} TheMealDB recipes in database.",
-                "recipes_imported": 0,
-                "ingredients_imported": 0
-            }
+        import re
+        from .themealdb import TheMealDBClient
         
         recipes_imported = 0
         ingredients_imported = 0
         errors = []
         
-        # TheMealDB API endpoints
-        THEMEALDB_BASE = "https://www.themealdb.com/api/json/v1/1"
+        client = TheMealDBClient()
         
         # First, import ingredients from TheMealDB
-        print("Fetching ingredients from TheMealDB...")
+        log_event('import_themealdb', 'fetch_ingredients')
         try:
-            ingredients_response = requests.get(f"{THEMEALDB_BASE}/list.php?i=list", timeout=10)
-            if ingredients_response.status_code == 200:
-                ingredients_data = ingredients_response.json()
-                
-                for ingredient_item in ingredients_data.get('meals', [])[:50]:  # Limit to 50 ingredients
-                    ingredient_name = ingredient_item.get('strIngredient')
-                    if ingredient_name and ingredient_name.strip():
-                        # Check if ingredient already exists
-                        existing = db(db.ingredient.name.ilike(ingredient_name.strip())).select().first()
-                        if not existing:
-                            # Create new ingredient with default values
-                            db.ingredient.insert(
-                                name=ingredient_name.strip(),
-                                unit='g',  # Default unit
-                                description=f'Ingredient imported from TheMealDB',
-                                calories_per_unit=50,  # Default calories
-                                protein_per_unit=2,    # Default protein
-                                fat_per_unit=1,       # Default fat
-                                carbs_per_unit=10,    # Default carbs
-                                sugar_per_unit=2,     # Default sugar
-                                fiber_per_unit=1,     # Default fiber
-                                sodium_per_unit=5     # Default sodium
-                            )
-                            ingredients_imported += 1
-                            
-                    time.sleep(0.1)  # Rate limiting
-                    
+            # Create missing ingredients with default values, in bulk
+            report = load_ingredients({
+                'name': item.get('strIngredient') or '',
+                'unit': 'g',  # Default unit
+                'description': 'Ingredient imported from TheMealDB',
+                **THEMEALDB_INGREDIENT_DEFAULTS
+            } for item in client.list_ingredients()[:50])  # Limit to 50 ingredients
+            ingredients_imported += report['ingredients']
         except Exception as e:
             errors.append(f"Error importing ingredients: {str(e)}")
         
         # Get categories to fetch recipes from different categories
         categories = ['Beef', 'Chicken', 'Dessert', 'Lamb', 'Pasta', 'Pork', 'Seafood', 'Vegetarian']
         
-        for category in categories:
-            try:
-                print(f"Fetching {category} recipes...")
-                category_response = requests.get(f"{THEMEALDB_BASE}/filter.php?c={category}", timeout=10)
-                
-                if category_response.status_code == 200:
-                    category_data = category_response.json()
-                    meals = category_data.get('meals', [])[:5]  # Limit to 5 recipes per category
-                    
-                    for meal in meals:
-                        meal_id = meal.get('idMeal')
-                        if meal_id:
-                            try:
-                                # Get detailed recipe information
-                                detail_response = requests.get(f"{THEMEALDB_BASE}/lookup.php?i={meal_id}", timeout=10)
-                                if detail_response.status_code == 200:
-                                    detail_data = detail_response.json()
-                                    recipe_detail = detail_data.get('meals', [{}])[0]
-                                    
-                                    if recipe_detail:
-                                        # Extract recipe data
-                                        recipe_name = recipe_detail.get('strMeal', '').strip()
-                                        recipe_category = recipe_detail.get('strCategory', 'Dinner')
-                                        recipe_instructions = recipe_detail.get('strInstructions', '').strip()
-                                        recipe_image_url = recipe_detail.get('strMealThumb', '')
-                                        
-                                        # Download and save the image
-                                        image_filename = download_themealdb_image(recipe_image_url, recipe_name) if recipe_image_url else None
-                                        
-                                        # Map TheMealDB categories to our categories
-                                        category_mapping = {
-                                            'Beef': 'Dinner',
-                                            'Chicken': 'Dinner', 
-                                            'Dessert': 'Dessert',
-                                            'Lamb': 'Dinner',
-                                            'Pasta': 'Dinner',
-                                            'Pork': 'Dinner',
-                                            'Seafood': 'Dinner',
-                                            'Vegetarian': 'Lunch',
-                                            'Breakfast': 'Breakfast'
-                                        }
-                                        
-                                        mapped_category = category_mapping.get(recipe_category, 'Dinner')
-                                        
-                                        if recipe_name and recipe_instructions:
-                                            # Check if recipe already exists
-                                            existing_recipe = db(db.recipe.name.ilike(recipe_name)).select().first()
-                                            if not existing_recipe:
-                                                # Create admin user if doesn't exist
-                                                admin_user = db(db.auth_user.email == 'admin@themealdb.com').select().first()
-                                                if not admin_user:
-                                                    admin_user_id = db.auth_user.insert(
-                                                        first_name='TheMealDB',
-                                                        last_name='Admin',
-                                                        email='admin@themealdb.com',
-                                                        password='dummy_password'
-                                                    )
-                                                else:
-                                                    admin_user_id = admin_user.id
-                                                
-                                                # Create the recipe
-                                                recipe_id = db.recipe.insert(
-                                                    name=recipe_name,
-                                                    type=mapped_category,
-                                                    description=f"Delicious {recipe_name} recipe imported from TheMealDB. {recipe_category} cuisine.",
-                                                    instruction_steps=recipe_instructions,
-                                                    servings=4,  # Default servings
-                                                    image=image_filename,  # Store local filename instead of URL
-                                                    author=admin_user_id,
-                                                    created_on=datetime.datetime.utcnow()
-                                                )
-                                                
-                                                # Extract and add ingredients
-                                                for i in range(1, 21):  # TheMealDB has up to 20 ingredients
-                                                    ingredient_name = recipe_detail.get(f'strIngredient{i}', '').strip()
-                                                    ingredient_measure = recipe_detail.get(f'strMeasure{i}', '').strip()
-                                                    
-                                                    if ingredient_name and ingredient_measure:
-                                                        # Find or create ingredient
-                                                        ingredient = db(db.ingredient.name.ilike(ingredient_name)).select().first()
-                                                        if not ingredient:
-                                                            ingredient_id = db.ingredient.insert(
-                                                                name=ingredient_name,
-                                                                unit='g',
-                                                                description=f'Ingredient from TheMealDB recipe: {recipe_name}',
-                                                                calories_per_unit=50,
-                                                                protein_per_unit=2,
-                                                                fat_per_unit=1,
-                                                                carbs_per_unit=10,
-                                                                sugar_per_unit=2,
-                                                                fiber_per_unit=1,
-                                                                sodium_per_unit=5
-                                                            )
-                                                            ingredients_imported += 1
-                                                        else:
-                                                            ingredient_id = ingredient.id
-                                                        
-                                                        # Parse quantity (simple parsing)
-                                                        quantity = 1.0
-                                                        try:
-                                                            # Extract numbers from measure string
-                                                            import re
-                                                            numbers = re.findall(r'\d+\.?\d*', ingredient_measure)
-                                                            if numbers:
-                                                                quantity = float(numbers[0])
-                                                        except:
-                                                            quantity = 1.0
-                                                        
-                                                        # Add ingredient to recipe
-                                                        db.recipe_ingredient.insert(
-                                                            recipe_id=recipe_id,
-                                                            ingredient_id=ingredient_id,
-                                                            quantity_per_serving=quantity
-                                                        )
-                                                
-                                                recipes_imported += 1
-                                                print(f"Imported recipe: {recipe_name}")
-                                                
-                                time.sleep(0.5)  # Rate limiting between detailed requests
-                                
-                            except Exception as e:
-                                errors.append(f"Error importing recipe {meal_id}: {str(e)}")
-                                continue
-                                
-                time.sleep(1)  # Rate limiting between categories
-                
-            except Exception as e:
-                errors.append(f"Error fetching {category} recipes: {str(e)}")
+        # Category lists and recipe details are fetched concurrently, then loaded in bulk
+        log_event('import_themealdb', 'fetch_recipes', categories=categories)
+        meals, fetch_errors = client.fetch_category_meals(categories, per_category=5)  # Limit to 5 recipes per category
+        errors.extend(fetch_errors)
+        
+        # Map TheMealDB categories to our categories
+        category_mapping = {
+            'Beef': 'Dinner',
+            'Chicken': 'Dinner', 
+            'Dessert': 'Dessert',
+            'Lamb': 'Dinner',
+            'Pasta': 'Dinner',
+            'Pork': 'Dinner',
+            'Seafood': 'Dinner',
+            'Vegetarian': 'Lunch',
+            'Breakfast': 'Breakfast'
+        }
+        
+        # Create admin user if doesn't exist
+        admin_user = db(db.auth_user.email == 'admin@themealdb.com').select().first()
+        if not admin_user:
+            admin_user_id = db.auth_user.insert(
+                first_name='TheMealDB',
+                last_name='Admin',
+                email='admin@themealdb.com',
+                password='dummy_password'
+            )
+        else:
+            admin_user_id = admin_user.id
+        
+        recipes = []
+        for category, recipe_detail in meals:
+            # Extract recipe data
+            recipe_name = recipe_detail.get('strMeal', '').strip()
+            recipe_category = recipe_detail.get('strCategory', 'Dinner')
+            recipe_instructions = recipe_detail.get('strInstructions', '').strip()
+            recipe_image_url = recipe_detail.get('strMealThumb', '')
+            
+            if not recipe_name or not recipe_instructions:
                 continue
+            
+            # Extract ingredients
+            ingredients = []
+            for i in range(1, 21):  # TheMealDB has up to 20 ingredients
+                ingredient_name = (recipe_detail.get(f'strIngredient{i}') or '').strip()
+                ingredient_measure = (recipe_detail.get(f'strMeasure{i}') or '').strip()
+                
+                if ingredient_name and ingredient_measure:
+                    # Parse quantity (simple parsing)
+                    numbers = re.findall(r'\d+\.?\d*', ingredient_measure)
+                    ingredients.append({
+                        'name': ingredient_name,
+                        'quantity_per_serving': float(numbers[0]) if numbers else 1.0,
+                        'unit': 'g',
+                        'description': f'Ingredient from TheMealDB recipe: {recipe_name}',
+                        **THEMEALDB_INGREDIENT_DEFAULTS
+                    })
+            
+            recipes.append({
+                'name': recipe_name,
+                'type': category_mapping.get(recipe_category, 'Dinner'),
+                'description': f"Delicious {recipe_name} recipe imported from TheMealDB. {recipe_category} cuisine.",
+                'instruction_steps': recipe_instructions,
+                'servings': 4,  # Default servings
+                # TheMealDB URL until the background download replaces it with the local file
+                'image': recipe_image_url or None,
+                'created_on': datetime.datetime.utcnow(),
+                'ingredients': ingredients
+            })
+        
+        # Existing recipes are skipped, the rest is loaded in one transaction
+        try:
+            report = load_recipes(recipes, author=admin_user_id)
+            recipes_imported += report['recipes']
+            ingredients_imported += report['ingredients']
+            log_event('import_themealdb', 'imported', recipes=report['recipes'], rows_per_second=report['rows_per_second'])
+        except Exception as e:
+            errors.append(f"Error loading recipes: {str(e)}")
         
         # Commit all changes
         db.commit()
+        # Like the startup job, an import that loaded no recipes can be run again
+        finish_job(
+            'themealdb_import', 'done' if recipes_imported else 'failed',
+            f"{recipes_imported} recipes, {ingredients_imported} ingredients"
+        )
+        build_ingredient_index()
+        build_ingredient_autocomplete()
+        
+        # Images are copied into uploads/ in the background
+        images_queued = queue_image_downloads([recipe['image'] for recipe in recipes])
         
         return {
             "success": True,
             "message": f"Successfully imported {recipes_imported} recipes and {ingredients_imported} ingredients from TheMealDB",
             "recipes_imported": recipes_imported,
             "ingredients_imported": ingredients_imported,
+            "images_queued": images_queued,
             "errors": errors[:10]  # Limit errors shown
         }
         
     except Exception as e:
+        db.rollback()
         logger.error(f"TheMealDB import error: {e}\n{traceback.format_exc()}")
+        finish_job('themealdb_import', 'failed', str(e))
         response.status = 500
         return {"error": f"Import failed: {str(e)}"}
 
+@action('api/admin/cache-stats', method=['GET'])
+@action.uses(db, session, auth.user)
+def cache_stats():
+    """Admin-only hit rates of the response cache of the public read endpoints"""
+    set_cors_headers()
+    
+    if not auth.current_user or auth.current_user.get('email') != 'admin@example.com':
+        response.status = 403
+        return {"error": "Admin access required"}
+    
+    return {"success": True, **hit_rates()}
+
+@action('api/admin/rate-limit-stats', method=['GET'])
+@action.uses(db, session, auth.user)
+def rate_limit_stats():
+    """Admin-only allowed / blocked counts of the login and registration throttling"""
+    set_cors_headers()
+    
+    if not auth.current_user or auth.current_user.get('email') != 'admin@example.com':
+        response.status = 403
+        return {"error": "Admin access required"}
+    
+    return {"success": True, **limiter_stats()}
+
+@action('api/admin/logging', method=['GET', 'POST'])
+@action.uses(db, session, auth.user)
+def logging_config():
+    """
+    Admin-only endpoint log levels, sampling rates and event counters of this worker.
+    POST {"levels": {"auth_login": "info"}, "sampling": {"spa": 0.1}} changes them at runtime.
+    """
+    set_cors_headers()
+    
+    if not auth.current_user or auth.current_user.get('email') != 'admin@example.com':
+        response.status = 403
+        return {"error": "Admin access required"}
+    
+    if request.method == 'POST':
+        data = request.json or {}
+        try:
+            set_log_config(levels=data.get('levels'), sampling=data.get('sampling'))
+        except (ValueError, AttributeError) as e:
+            response.status = 400
+            return {"error": str(e)}
+    
+    return {"success": True, **log_config()}
+
 @action('api/admin/import-themealdb', method=['OPTIONS'])
 def import_themealdb_options():
     set_cors_headers()
     return ""
 
-@action('uploads/<filename>')
+@action('uploads/<filename>', method=['GET', 'HEAD'])
 def serve_upload(filename):
-    """Serve uploaded files from the local uploads directory"""
-    uploads_folder = os.path.join(os.path.dirname(__file__), 'uploads')
-    file_path = os.path.join(uploads_folder, filename)
+    """
+    Serve uploaded files from the local uploads directory, ?size=thumb|medium for a resized copy.
+    Content-addressed names are cached forever, the rest revalidates with ETag / Last-Modified.
+    """
+    file_path = os.path.join(settings.UPLOAD_FOLDER, filename)
     if not os.path.isfile(file_path):
         response.status = 404
         return "File not found"
-    import mimetypes
-    content_type, _ = mimetypes.guess_type(file_path)
-    if not content_type:
-        content_type = 'application/octet-stream'
-    response.headers['Content-Type'] = content_type
-    with open(file_path, 'rb') as f:
-        return f.read()
+    size = request.query.get('size')
+    if size:
+        # WebP for browsers that take it, JPEG otherwise
+        extension = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpg'
+        response.headers['Vary'] = 'Accept'
+        derived_path, pending = get_derivative(filename, size, extension)
+        if derived_path:
+            return send_file(derived_path, cache_control=IMMUTABLE if is_content_addressed(filename) else REVALIDATE)
+        if pending:
+            # the original while the resized copy is made, asked for again next time
+            return send_file(file_path, cache_control='no-cache')
+    if is_content_addressed(filename):
+        # the name is the SHA-256 of the content, no need to hash it
+        return send_file(file_path, etag=f'"{os.path.splitext(filename)[0]}"', cache_control=IMMUTABLE)
+    return send_file(file_path)
 
 # ==============================================================
 # ------------------ RECIPE SEARCH ----------------------------
@@ -1066,68 +1129,112 @@ def serve_upload(filename):
 
 @action('api/recipes/search', method=['GET'])
 @action.uses(db, session)
+@cached_response('recipes', headers=set_cors_headers)
 def search_recipes():
-    """Search recipes by name and/or type with pagination"""
+    """Search recipes by text and/or type with cursor pagination"""
     set_cors_headers()
     
     # Get search parameters from request
     name_query = request.params.get('name', '').strip()
     type_query = request.params.get('type', '').strip()
     
-    # Pagination parameters
+    # Pagination parameters: send next_cursor back as cursor to get the following page.
+    # page is still honoured as an OFFSET for clients that do not use cursors yet.
+    cursor = request.params.get('cursor', '').strip()
     page = int(request.params.get('page', 1))
-    limit = int(request.params.get('limit', 10))
-    start, end = (page - 1) * limit, (page * limit)
+    limit = get_page_size(request.params.get('limit'), default=10)
+    include_total = request.params.get('include_total', 'true').lower() != 'false'
+    
+    # Optional per-serving nutrition filters, e.g. max_calories=500&min_protein=20
+    nutrition_filters = []
+    try:
+        for nutrient in NUTRIENTS:
+            per_serving = db.recipe_nutrition[f'{nutrient}_per_serving']
+            min_value = request.params.get(f'min_{nutrient}', '').strip()
+            max_value = request.params.get(f'max_{nutrient}', '').strip()
+            if min_value:
+                nutrition_filters.append(per_serving >= float(min_value))
+            if max_value:
+                nutrition_filters.append(per_serving <= float(max_value))
+    except ValueError:
+        response.status = 400
+        return {"error": "Nutrition filters must be numbers"}
+    
+    type_filters = [db.recipe.type == type_query] if type_query else []
+    
+    # Name search goes through the full-text index (name, description, instructions and
+    # ingredient names, best match first); the type and nutrition filters, ranking, page
+    # and total all run in the same SQL join. ilike() on the name is the fallback.
+    ranked = None
+    if name_query:
+        try:
+            start = decode_position_cursor(cursor) if cursor else (page - 1) * limit
+        except ValueError as e:
+            response.status = 400
+            return {"error": str(e)}
+        text_filters = None
+        for text_filter in type_filters + nutrition_filters:
+            text_filters = text_filter if text_filters is None else text_filters & text_filter
+        ranked = search_recipes_page(name_query, text_filters, start, limit, count=include_total)
     
     # Build query based on search parameters
+    filters = list(type_filters)
+    if name_query and ranked is None:
+        filters.insert(0, db.recipe.name.ilike(f'%{name_query}%'))
+    if nutrition_filters:
+        matches = nutrition_filters[0]
+        for nutrition_filter in nutrition_filters[1:]:
+            matches &= nutrition_filter
+        filters.append(db.recipe.id.belongs(db(matches)._select(db.recipe_nutrition.recipe_id)))
     query = db.recipe
-    if name_query:
-        query = db.recipe.name.ilike(f'%{name_query}%')
-    if type_query:
-        if name_query:
-            query = query & (db.recipe.type == type_query)
-        else:
-            query = db.recipe.type == type_query
+    for search_filter in filters:
+        query = search_filter if query is db.recipe else query & search_filter
     
-    # Count total recipes matching the query
-    total_count = db(query).count()
+    select_fields = [db.recipe.ALL, db.auth_user.first_name, db.auth_user.last_name, db.recipe_nutrition.ALL]
+    select_left = [db.auth_user.on(db.recipe.author == db.auth_user.id), nutrition_left_join()]
     
-    # Get recipes with author information
-    recipes = db(query).select(
-        db.recipe.ALL,
-        db.auth_user.first_name,
-        db.auth_user.last_name,
-        left=db.auth_user.on(db.recipe.author == db.auth_user.id),
-        orderby=~db.recipe.created_on,
-        limitby=(start, end)
-    )
+    if ranked is not None:
+        # Relevance order: the index matched, filtered, ranked and paged in one statement
+        page_ids, total_count = ranked
+        next_cursor = encode_position_cursor(start + limit) if len(page_ids) > limit else None
+        page_ids = page_ids[:limit]
+        position = {recipe_id: index for index, recipe_id in enumerate(page_ids)}
+        recipes = sorted(
+            db(db.recipe.id.belongs(page_ids)).select(*select_fields, left=select_left),
+            key=lambda row: position[row.recipe.id]
+        )
+    else:
+        # Approximate total, cached per query instead of counting on every page
+        total_count = approximate_total(query) if include_total else None
+        
+        if cursor:
+            try:
+                page_query = after_cursor(cursor) if query is db.recipe else query & after_cursor(cursor)
+            except ValueError as e:
+                response.status = 400
+                return {"error": str(e)}
+            start = 0
+        else:
+            page_query = query
+            start = (page - 1) * limit
+        
+        # Get recipes with author information, one extra row tells whether a next page exists
+        recipes = db(page_query).select(
+            *select_fields,
+            left=select_left,
+            orderby=recipe_order(),
+            limitby=(start, start + limit + 1)
+        )
+        recipes, next_cursor = paginate(recipes, limit)
+    
+    # Nutrition comes from the joined recipe_nutrition rows
+    nutrition = get_joined_nutrition(recipes)
     
     # Process recipes for response
     result = []
     for recipe in recipes:
         author_name = f"{recipe.auth_user.first_name} {recipe.auth_user.last_name}".strip()
-        
-        # Get total nutritional values
-        total_calories = 0
-        total_protein = 0
-        total_fat = 0
-        total_carbs = 0
-        
-        # Get recipe ingredients with nutritional info
-        recipe_ingredients = db(db.recipe_ingredient.recipe_id == recipe.recipe.id).select(
-            db.recipe_ingredient.ALL,
-            db.ingredient.ALL,
-            left=db.ingredient.on(db.recipe_ingredient.ingredient_id == db.ingredient.id)
-        )
-        
-        # Calculate total nutritional values
-        for ri in recipe_ingredients:
-            if ri.ingredient.id:
-                quantity = ri.recipe_ingredient.quantity_per_serving
-                total_calories += quantity * ri.ingredient.calories_per_unit
-                total_protein += quantity * ri.ingredient.protein_per_unit
-                total_fat += quantity * ri.ingredient.fat_per_unit
-                total_carbs += quantity * ri.ingredient.carbs_per_unit
+        recipe_nutrition = nutrition[recipe.recipe.id]
         
         # Format the recipe for response
         result.append({
@@ -1140,10 +1247,10 @@ def search_recipes():
             "author_name": author_name,
             "servings": recipe.recipe.servings,
             "created_on": recipe.recipe.created_on,
-            "total_calories": round(total_calories, 2),
-            "total_protein": round(total_protein, 2),
-            "total_fat": round(total_fat, 2),
-            "total_carbs": round(total_carbs, 2)
+            "total_calories": round(recipe_nutrition['total_calories'], 2),
+            "total_protein": round(recipe_nutrition['total_protein'], 2),
+            "total_fat": round(recipe_nutrition['total_fat'], 2),
+            "total_carbs": round(recipe_nutrition['total_carbs'], 2)
         })
     
     return {
@@ -1151,6 +1258,7 @@ def search_recipes():
         "total": total_count,
         "page": page,
         "limit": limit,
+        "next_cursor": next_cursor,
         "recipes": result
     }
 
@@ -1162,7 +1270,7 @@ def search_recipes_options():
 @action('api/recipes/search_by_ingredients', method=['GET'])
 @action.uses(db, session)
 def search_recipes_by_ingredients():
-    """Search recipes containing a subset of provided ingredients"""
+    """Search recipes containing all, any or at least min_matches of the provided ingredients"""
     set_cors_headers()
     
     # Get ingredients from query parameters (comma-separated list of IDs)
@@ -1176,7 +1284,7 @@ def search_recipes_by_ingredients():
     # Parse ingredient IDs
     if ingredient_ids:
         try:
-            ingredient_ids = [int(id) for id in ingredient_ids.split(',')]
+            ingredient_ids = list(dict.fromkeys(int(id) for id in ingredient_ids.split(',')))
         except ValueError:
             response.status = 400
             return {"error": "Invalid ingredient IDs format"}
@@ -1198,101 +1306,53 @@ def search_recipes_by_ingredients():
             "recipes": []
         }
     
-    # Construct the query
+    # "at least k of n" ingredients, match_all means all n
     if match_all:
-        # Find recipes that contain ALL of the specified ingredients
-        # For each ingredient, find recipes that contain it, then intersect the sets
-        recipe_ids = None
-        for ingredient_id in ingredient_ids:
-            recipes_with_ingredient = db(db.recipe_ingredient.ingredient_id == ingredient_id).select(
-                db.recipe_ingredient.recipe_id
-            )
-            ingredient_recipe_ids = {r.recipe_id for r in recipes_with_ingredient}
-            
-            if recipe_ids is None:
-                recipe_ids = ingredient_recipe_ids
-            else:
-                recipe_ids &= ingredient_recipe_ids  # Set intersection
-        
-        if not recipe_ids:
-            return {
-                "success": True,
-                "total": 0,
-                "page": page,
-                "limit": limit,
-                "recipes": []
-            }
-        
-        # Base query for recipes with all ingredients
-        query = db.recipe.id.belongs(recipe_ids)
+        min_matches = None
     else:
-        # Find recipes that contain ANY of the specified ingredients
-        recipe_ids = db(db.recipe_ingredient.ingredient_id.belongs(ingredient_ids)).select(
-            db.recipe_ingredient.recipe_id, distinct=True
-        )
-        recipe_ids = [r.recipe_id for r in recipe_ids]
-        
-        if not recipe_ids:
-            return {
-                "success": True,
-                "total": 0,
-                "page": page,
-                "limit": limit,
-                "recipes": []
-            }
-        
-        # Base query for recipes with any of the ingredients
-        query = db.recipe.id.belongs(recipe_ids)
+        try:
+            min_matches = int(request.params.get('min_matches', 1))
+        except ValueError:
+            response.status = 400
+            return {"error": "min_matches must be a number"}
     
-    # Apply additional filters
-    if name_query:
-        query = query & db.recipe.name.ilike(f'%{name_query}%')
-    if type_query:
-        query = query & (db.recipe.type == type_query)
+    # Matching runs on the in-memory ingredient index, SQL only applies the name/type filters
+    matches = match_recipes(ingredient_ids, min_matches)
+    if matches and (name_query or type_query):
+        query = db.recipe.id.belongs(list(matches))
+        if name_query:
+            query = query & db.recipe.name.ilike(f'%{name_query}%')
+        if type_query:
+            query = query & (db.recipe.type == type_query)
+        allowed_ids = {row.id for row in db(query).select(db.recipe.id)}
+        matches = {recipe_id: count for recipe_id, count in matches.items() if recipe_id in allowed_ids}
     
-    # Count total recipes matching the query
-    total_count = db(query).count()
+    # Most matched ingredients first, so pantry-style searches show the best candidates
+    ranked_ids = rank_matches(matches)
+    total_count = len(ranked_ids)
+    page_ids = ranked_ids[start:end]
+    position = {recipe_id: index for index, recipe_id in enumerate(page_ids)}
     
     # Get recipes with author information
-    recipes = db(query).select(
-        db.recipe.ALL,
-        db.auth_user.first_name,
-        db.auth_user.last_name,
-        left=db.auth_user.on(db.recipe.author == db.auth_user.id),
-        orderby=~db.recipe.created_on,
-        limitby=(start, end)
+    recipes = sorted(
+        db(db.recipe.id.belongs(page_ids)).select(
+            db.recipe.ALL,
+            db.auth_user.first_name,
+            db.auth_user.last_name,
+            db.recipe_nutrition.ALL,
+            left=[db.auth_user.on(db.recipe.author == db.auth_user.id), nutrition_left_join()]
+        ),
+        key=lambda row: position[row.recipe.id]
     )
     
+    # Nutrition comes from the joined recipe_nutrition rows
+    nutrition = get_joined_nutrition(recipes)
+    
     # Process recipes for response
     result = []
     for recipe in recipes:
         author_name = f"{recipe.auth_user.first_name} {recipe.auth_user.last_name}".strip()
-        
-        # Get total nutritional values
-        total_calories = 0
-        total_protein = 0
-        total_fat = 0
-        total_carbs = 0
-        
-        # Get recipe ingredients with nutritional info
-        recipe_ingredients = db(db.recipe_ingredient.recipe_id == recipe.recipe.id).select(
-            db.recipe_ingredient.ALL,
-            db.ingredient.ALL,
-            left=db.ingredient.on(db.recipe_ingredient.ingredient_id == db.ingredient.id)
-        )
-        
-        # Calculate which requested ingredients are in this recipe
-        recipe_ingredient_ids = [ri.ingredient.id for ri in recipe_ingredients if ri.ingredient.id]
-        matching_ingredients = [id for id in ingredient_ids if id in recipe_ingredient_ids]
-        
-        # Calculate total nutritional values
-        for ri in recipe_ingredients:
-            if ri.ingredient.id:
-                quantity = ri.recipe_ingredient.quantity_per_serving
-                total_calories += quantity * ri.ingredient.calories_per_unit
-                total_protein += quantity * ri.ingredient.protein_per_unit
-                total_fat += quantity * ri.ingredient.fat_per_unit
-                total_carbs += quantity * ri.ingredient.carbs_per_unit
+        recipe_nutrition = nutrition[recipe.recipe.id]
         
         # Format the recipe for response
         result.append({
@@ -1305,11 +1365,11 @@ def search_recipes_by_ingredients():
             "author_name": author_name,
             "servings": recipe.recipe.servings,
             "created_on": recipe.recipe.created_on,
-            "total_calories": round(total_calories, 2),
-            "total_protein": round(total_protein, 2),
-            "total_fat": round(total_fat, 2),
-            "total_carbs": round(total_carbs, 2),
-            "matching_ingredients": len(matching_ingredients),
+            "total_calories": round(recipe_nutrition['total_calories'], 2),
+            "total_protein": round(recipe_nutrition['total_protein'], 2),
+            "total_fat": round(recipe_nutrition['total_fat'], 2),
+            "total_carbs": round(recipe_nutrition['total_carbs'], 2),
+            "matching_ingredients": matches[recipe.recipe.id],
             "total_requested_ingredients": len(ingredient_ids)
         })
     
@@ -1352,68 +1412,64 @@ def update_recipe(recipe_id):
                     data[key] = []
             else:
                 data[key] = request.forms[key]
-        # Handle new image uploads
-        new_image_files = request.files.get('images', [])
-        if not isinstance(new_image_files, list):
-            new_image_files = [new_image_files] if new_image_files else []
-        uploads_dir = os.path.join(os.path.dirname(__file__), 'uploads')
-        os.makedirs(uploads_dir, exist_ok=True)
-        new_filenames = []
-        for image_file in new_image_files:
-            if image_file and hasattr(image_file, 'filename'):
-                filename = f"recipe_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{image_file.filename}"
-                image_path = os.path.join(uploads_dir, filename)
-                with open(image_path, 'wb') as f:
-                    f.write(image_file.file.read())
-                new_filenames.append(filename)
         # Images to keep
         existing_images = data.get('existing_images', [])
-        # Remove images not in existing_images
-        all_db_images = [recipe.image] if recipe.image else []
-        all_db_images += [img.multi_images for img in db(db.recipe_multiple_images.recipe_id == recipe_id).select()]
-        to_remove = [img for img in all_db_images if img not in existing_images]
-        for img in to_remove:
-            # Remove from DB and filesystem
-            db(db.recipe_multiple_images.recipe_id == recipe_id and db.recipe_multiple_images.multi_images == img).delete()
-            if recipe.image == img:
-                db.recipe[recipe_id] = dict(image=None)
-            img_path = os.path.join(uploads_dir, img)
-            if os.path.exists(img_path):
-                try:
-                    os.remove(img_path)
-                except Exception:
-                    pass
-        # Add new images to DB
-        all_images = existing_images + new_filenames
-        # First image is main image
-        db.recipe[recipe_id] = dict(image=all_images[0] if all_images else None)
-        # Remove all old additional images, re-add those in all_images[1:]
-        db(db.recipe_multiple_images.recipe_id == recipe_id).delete()
-        for img in all_images[1:]:
-            db.recipe_multiple_images.insert(recipe_id=recipe_id, multi_images=img)
-        # Update other fields
-        updatable_fields = ['name', 'type', 'description', 'instruction_steps', 'servings']
-        update_dict = {field: data[field] for field in updatable_fields if field in data}
-        if update_dict:
-            db.recipe[recipe_id] = update_dict
-        # Update ingredients if provided
-        if 'ingredients' in data:
-            db(db.recipe_ingredient.recipe_id == recipe_id).delete()
-            for ing in data['ingredients']:
-                db.recipe_ingredient.insert(
-                    recipe_id=recipe_id,
-                    ingredient_id=ing['id'],
-                    quantity_per_serving=ing.get('quantity_per_serving', 1)
-                )
+        # Handle new image uploads, streamed to disk
+        try:
+            saved = save_uploads(
+                uploaded_files(request.files, 'images'),
+                max_count=max(0, MAX_IMAGES - len(existing_images))
+            )
+        except UploadError as e:
+            response.status = e.status
+            return {"error": str(e)}
+        new_filenames = [item['filename'] for item in saved]
+        try:
+            # Images not in existing_images, deleted once the update is saved
+            all_db_images = [recipe.image] if recipe.image else []
+            all_db_images += [img.multi_images for img in db(db.recipe_multiple_images.recipe_id == recipe_id).select()]
+            to_remove = [img for img in all_db_images if img not in existing_images]
+            # Add new images to DB
+            all_images = existing_images + new_filenames
+            # First image is main image
+            db.recipe[recipe_id] = dict(image=all_images[0] if all_images else None)
+            # Remove all old additional images, re-add those in all_images[1:]
+            db(db.recipe_multiple_images.recipe_id == recipe_id).delete()
+            for img in all_images[1:]:
+                db.recipe_multiple_images.insert(recipe_id=recipe_id, multi_images=img)
+            # Update other fields
+            updatable_fields = ['name', 'type', 'description', 'instruction_steps', 'servings']
+            update_dict = {field: data[field] for field in updatable_fields if field in data}
+            if update_dict:
+                db.recipe[recipe_id] = update_dict
+            # Update ingredients if provided
+            if 'ingredients' in data:
+                db(db.recipe_ingredient.recipe_id == recipe_id).delete()
+                for ing in data['ingredients']:
+                    db.recipe_ingredient.insert(
+                        recipe_id=recipe_id,
+                        ingredient_id=ing['id'],
+                        quantity_per_serving=ing.get('quantity_per_serving', 1)
+                    )
+            refresh_recipe_nutrition([recipe_id])
+            index_recipe(recipe_id)
+            db.commit()
+        except Exception:
+            # nothing refers to the images this request stored
+            db.rollback()
+            discard_uploads(saved)
+            raise
+        invalidate('recipes')
+        # delete the removed images no other recipe uses, now that nothing refers to them
+        release_images(to_remove)
+        schedule_derivatives(new_filenames)
         return {"success": True, "message": "Recipe updated successfully"}
     else:
         # Fallback to JSON (no image update)
         data = request.json or {}
         updatable_fields = ['name', 'type', 'description', 'instruction_steps', 'servings']
-        for field in updatable_fields:
-            if field in data:
-                recipe[field] = data[field]
-        db.recipe[recipe_id] = recipe
+        # only the changed fields, so modified_on / modified_by are set again
+        db.recipe[recipe_id] = {field: data[field] for field in updatable_fields if field in data}
         if 'ingredients' in data:
             db(db.recipe_ingredient.recipe_id == recipe_id).delete()
             for ing in data['ingredients']:
@@ -1422,6 +1478,10 @@ def update_recipe(recipe_id):
                     ingredient_id=ing['id'],
                     quantity_per_serving=ing.get('quantity_per_serving', 1)
                 )
+        refresh_recipe_nutrition([recipe_id])
+        index_recipe(recipe_id)
+        db.commit()
+        invalidate('recipes')
         return {"success": True, "message": "Recipe updated successfully"}
 
 @action('api/recipes/<recipe_id>', method=['DELETE'])
@@ -1438,10 +1498,17 @@ def delete_recipe(recipe_id):
     if recipe.author != auth.current_user['id']:
         response.status = 403
         return {"error": "You are not the author of this recipe"}
+    images = [recipe.image] + [img.multi_images for img in db(db.recipe_multiple_images.recipe_id == recipe_id).select()]
     # Delete related ingredients and images
     db(db.recipe_ingredient.recipe_id == recipe_id).delete()
     db(db.recipe_multiple_images.recipe_id == recipe_id).delete()
+    db(db.recipe_nutrition.recipe_id == recipe_id).delete()
     db(db.recipe.id == recipe_id).delete()
+    unindex_recipe(recipe_id)
+    db.commit()
+    invalidate('recipes')
+    # image files no other recipe uses go too, once the delete is committed
+    release_images(images)
     return {"success": True, "message": "Recipe deleted successfully"}
 
 # Root redirect to static path (as requested by user)
@@ -1451,93 +1518,17 @@ def root_redirect():
     """Redirect root path to the static React app"""
     redirect('/CustomRecipeManager/static/')
 
-# Handle static directory root to serve index.html
-@action('static/')
-def serve_static_root():
-    """Serve index.html when accessing the static directory root"""
-    static_folder = os.path.join(os.path.dirname(__file__), 'static')
-    index_html_path = os.path.join(static_folder, 'index.html')
-    
-    logger.info("Serving React SPA index.html for static root")
-    
-    if os.path.isfile(index_html_path):
-        response.headers['Content-Type'] = 'text/html'
-        try:
-            with open(index_html_path, 'rb') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error serving index.html: {str(e)}")
-            response.status = 500
-            return "Error serving frontend"
-    else:
-        response.status = 404
-        return "Frontend not found"
-
-# Redirect clean URLs to the React app
-@action('static/recipe/<recipe_id:int>')
-def serve_recipe_spa(recipe_id):
-    """Serve React app for recipe URLs"""
-    static_folder = os.path.join(os.path.dirname(__file__), 'static')
-    index_html_path = os.path.join(static_folder, 'index.html')
-    
-    logger.info(f"Serving React SPA for recipe route: {recipe_id}")
-    
-    if os.path.isfile(index_html_path):
-        response.headers['Content-Type'] = 'text/html'
-        try:
-            with open(index_html_path, 'rb') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error serving index.html: {str(e)}")
-            response.status = 500
-            return "Error serving frontend"
-    else:
-        response.status = 404
-        return "Frontend not found"
+# One handler for every client-side route of the React app
+def serve_spa(recipe_id=None):
+    """Serve the React app shell (index.html), cached in memory and precompressed"""
+    log_event('spa', 'shell', path=request.path)
+    return serve_shell()
 
-@action('static/recipes')
-def serve_recipes_spa():
-    """Serve React app for recipes page"""
-    static_folder = os.path.join(os.path.dirname(__file__), 'static')
-    index_html_path = os.path.join(static_folder, 'index.html')
-    
-    logger.info("Serving React SPA for recipes page")
-    
-    if os.path.isfile(index_html_path):
-        response.headers['Content-Type'] = 'text/html'
-        try:
-            with open(index_html_path, 'rb') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error serving index.html: {str(e)}")
-            response.status = 500
-            return "Error serving frontend"
-    else:
-        response.status = 404
-        return "Frontend not found"
-
-@action('static/dashboard')
-@action('static/create-recipe')  
-@action('static/login')
-@action('static/register')
-@action('static/contact')
-@action('static/about')
-def serve_common_spa_routes():
-    """Serve React app for common routes"""
-    static_folder = os.path.join(os.path.dirname(__file__), 'static')
-    index_html_path = os.path.join(static_folder, 'index.html')
-    
-    logger.info("Serving React SPA for common route")
-    
-    if os.path.isfile(index_html_path):
-        response.headers['Content-Type'] = 'text/html'
-        try:
-            with open(index_html_path, 'rb') as f:
-                return f.read()
-        except Exception as e:
-            logger.error(f"Error serving index.html: {str(e)}")
-            response.status = 500
-            return "Error serving frontend"
-    else:
-        response.status = 404
-        return "Frontend not found"
\ No newline at end of file
+for spa_route in SPA_ROUTES:
+    action(spa_route)(serve_spa)
+
+@action('static/assets/<filename>', method=['GET', 'HEAD'])
+def serve_static_asset(filename):
+    """Serve hashed build assets with immutable caching and gzip/brotli siblings"""
+    log_event('spa', 'asset', filename=filename)
+    return serve_asset(filename)
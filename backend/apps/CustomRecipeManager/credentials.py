@@ -0,0 +1,92 @@
+"""
+This file hashes and verifies user passwords.
+
+Hashes keep pydal's CRYPT format, <algorithm>$<salt>$<hash>, so py4web's own
+auth actions can read them too. New hashes use settings.PASSWORD_HASH, e.g.
+"pbkdf2(210000,32,sha512)" (iterations, key length, digest). A successful
+login whose stored hash uses another algorithm or cost is rehashed with the
+current one (needs_rehash()), so raising the cost upgrades every account the
+next time its user logs in.
+
+Hashing is CPU-bound by design. hash_password() and verify_password() run it
+on a pool of HASH_WORKERS threads (hashlib releases the GIL while hashing),
+so a burst of logins occupies at most that many cores and the other request
+threads keep serving. At most MAX_WAITING calls wait for the pool, beyond
+that CredentialsBusy is raised and the caller answers 503.
+"""
+
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pydal.validators import CRYPT, simple_hash
+
+from . import settings
+
+HASH_WORKERS = settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1
+MAX_WAITING = HASH_WORKERS * 8
+
+_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='password-hash')
+_slots = threading.BoundedSemaphore(MAX_WAITING)
+
+
+class CredentialsBusy(Exception):
+    """Raised when too many password hashes are already waiting; status is the HTTP status to answer with"""
+
+    def __init__(self, message="Too many login attempts in progress, please retry", status=503):
+        super().__init__(message)
+        self.status = status
+
+
+def _hash(password, digest_alg):
+    salt = secrets.token_hex(8)
+    return f"{digest_alg}${salt}${simple_hash(password, '', salt, digest_alg)}"
+
+
+def _verify(password, stored):
+    if stored is None:
+        # unknown user: spend the same time as a real check so it can not be told apart
+        _verify(password, _dummy.result())
+        return False
+    if stored.count('$') == 2:
+        digest_alg, salt, expected = stored.split('$')
+        try:
+            computed = simple_hash(password, '', salt, digest_alg)
+        except (ValueError, RuntimeError):
+            return False
+        return hmac.compare_digest(computed, expected)
+    # legacy unsalted hashes, CRYPT guesses the algorithm from the length
+    return CRYPT()(password)[0] == stored
+
+
+# hashed once in the background, taken from the pool queue before any login
+_dummy = _pool.submit(_hash, secrets.token_hex(8), settings.PASSWORD_HASH)
+
+
+def _run(func, *args):
+    if not _slots.acquire(blocking=False):
+        raise CredentialsBusy()
+    try:
+        return _pool.submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password, digest_alg=None):
+    """Hash password with settings.PASSWORD_HASH (or digest_alg) on the hashing pool"""
+    return _run(_hash, password, digest_alg or settings.PASSWORD_HASH)
+
+
+def verify_password(password, stored):
+    """
+    True if password matches the stored hash, compared in constant time.
+    stored=None (no such user) takes as long as a real check and returns False.
+    """
+    return _run(_verify, password, stored)
+
+
+def needs_rehash(stored):
+    """True if stored was not made with the current settings.PASSWORD_HASH"""
+    return not stored or stored.count('$') != 2 or stored.split('$', 1)[0] != settings.PASSWORD_HASH
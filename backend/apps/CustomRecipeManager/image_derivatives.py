@@ -0,0 +1,132 @@
+"""
+This file makes the resized copies of stored images used by recipe listings.
+
+Every image in uploads/ gets a 'thumb' and a 'medium' version (SIZES, longest
+side in pixels), each as JPEG and as WebP, cached under uploads/derived/.
+They are made by a small worker pool after create_recipe, update_recipe and
+upload_images, or queued by the first request for images stored before
+(imports, older uploads). serve_upload returns them for
+uploads/<filename>?size=thumb, as WebP when the browser accepts it, and the
+original (not cached) until they are made: requests never resize images.
+
+Pillow is optional: without it no derivatives are made and the original
+image is served.
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import settings
+from .common import logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+SIZES = {'thumb': 400, 'medium': 1024}
+# extension -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+MAX_WORKERS = 2
+
+DERIVED_FOLDER = os.path.join(settings.UPLOAD_FOLDER, 'derived')
+
+_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='derivatives')
+_pending = set()
+_failed = set()   # images get_derivative() does not queue again
+_lock = threading.Lock()
+
+
+def derivative_path(filename, size, extension):
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(DERIVED_FOLDER, f"{stem}.{size}.{extension}")
+
+
+def _save(image, path, pil_format, options):
+    # write to a temp file and rename, a concurrent request never reads half a file
+    fd, tmp_path = tempfile.mkstemp(dir=DERIVED_FOLDER, prefix='.derived-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, pil_format, **options)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def make_derivatives(filename):
+    """Write every missing size and format of one stored image"""
+    os.makedirs(DERIVED_FOLDER, exist_ok=True)
+    with Image.open(os.path.join(settings.UPLOAD_FOLDER, os.path.basename(filename))) as original:
+        original = ImageOps.exif_transpose(original)
+        for size, longest_side in SIZES.items():
+            wanted = [(ext, fmt) for ext, fmt in FORMATS.items() if not os.path.exists(derivative_path(filename, size, ext))]
+            if not wanted:
+                continue
+            resized = original.copy()
+            resized.thumbnail((longest_side, longest_side), Image.LANCZOS)
+            for extension, (pil_format, options) in wanted:
+                image = resized
+                if pil_format == 'JPEG' and image.mode != 'RGB':
+                    image = image.convert('RGB')
+                elif image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                _save(image, derivative_path(filename, size, extension), pil_format, options)
+
+
+def _run(filename):
+    try:
+        make_derivatives(filename)
+    except Exception as e:
+        logger.error(f"Image derivatives for {filename} failed: {e}")
+        with _lock:
+            _failed.add(filename)
+    finally:
+        with _lock:
+            _pending.discard(filename)
+
+
+def schedule_derivatives(filenames):
+    """Make the derivatives of filenames in the background worker pool"""
+    if Image is None:
+        return
+    for filename in filenames:
+        if not filename or filename.startswith('http'):
+            continue
+        with _lock:
+            if filename in _pending:
+                continue
+            _pending.add(filename)
+        _pool.submit(_run, filename)
+
+
+def get_derivative(filename, size, extension):
+    """
+    (path, pending): path of the derivative if it is made, else None and
+    whether it is being made in the background (queued now if missing)
+    """
+    if Image is None or size not in SIZES or extension not in FORMATS:
+        return None, False
+    path = derivative_path(filename, size, extension)
+    if os.path.exists(path):
+        return path, False
+    with _lock:
+        failed = filename in _failed
+    if failed:
+        return None, False
+    schedule_derivatives([filename])
+    return None, True
+
+
+def remove_derivatives(filename):
+    """Delete the derivatives of an image that was removed"""
+    for size in SIZES:
+        for extension in FORMATS:
+            path = derivative_path(filename, size, extension)
+            if os.path.exists(path):
+                os.remove(path)
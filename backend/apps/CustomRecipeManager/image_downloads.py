@@ -0,0 +1,185 @@
+"""
+This file copies remote recipe images (TheMealDB strMealThumb URLs) into the
+local image store in the background, so imports never wait on image I/O.
+
+Importers store the remote URL in recipe.image, which the frontend can show
+right away, and call queue_image_downloads(). db.image_download keeps one row
+per URL with its status, so the queue survives restarts: pending and
+interrupted URLs are picked up again on the next start.
+
+One worker thread drains the queue: a bounded pool (MAX_WORKERS) streams the
+images through a pooled requests.Session with timeouts and retries, and the
+worker thread itself records each result, pointing every recipe.image that
+still holds the URL at the stored file as soon as its download completes.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .background_jobs import Worker
+from .common import db, logger
+from .image_derivatives import schedule_derivatives
+from .response_cache import invalidate
+from .uploads import image_extension, save_stream
+
+MAX_WORKERS = 4
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+# (connect, read) in seconds
+TIMEOUT_SECONDS = (5, 30)
+# runs in which a URL may fail before it is given up on
+MAX_ATTEMPTS = 3
+BATCH_SIZE = 50
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+
+# set by start_image_downloads(resume=True), the worker queues remote recipe.image values first
+_resume = threading.Event()
+
+
+class ImageDownloadError(Exception):
+    """Raised when an image can not be downloaded"""
+
+
+def is_remote(image):
+    return bool(image) and image.startswith(('http://', 'https://'))
+
+
+def fetch_image(url):
+    """Stream url into the image store with retries, return the save_stream() result"""
+    extension = image_extension(urlparse(url).path)
+    for attempt in range(RETRIES + 1):
+        delay = BACKOFF_SECONDS * 2 ** attempt * (1 + random.random())
+        try:
+            with _session.get(url, stream=True, timeout=TIMEOUT_SECONDS) as response:
+                if response.status_code == 429 or response.status_code >= 500:
+                    error = f"HTTP {response.status_code}"
+                else:
+                    response.raise_for_status()
+                    if not response.headers.get('Content-Type', 'image/').startswith('image/'):
+                        raise ImageDownloadError(f"{url}: not an image ({response.headers['Content-Type']})")
+                    response.raw.decode_content = True
+                    return save_stream(response.raw, extension)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        except requests.RequestException as e:
+            # other HTTP errors (404, ...) are not worth retrying
+            raise ImageDownloadError(f"{url}: {e}")
+        if attempt < RETRIES:
+            time.sleep(delay)
+    raise ImageDownloadError(f"{url} failed after {RETRIES + 1} attempts: {error}")
+
+
+def _backfill(url, filename):
+    # every recipe still pointing at the remote URL gets the stored file
+    return db(db.recipe.image == url).update(image=filename)
+
+
+def queue_image_downloads(urls=None, start=True):
+    """
+    Record remote image URLs to download (None: every remote recipe.image) and
+    start the worker. URLs downloaded before are backfilled at once. Returns
+    the number of URLs queued.
+    """
+    if urls is None:
+        rows = db(db.recipe.image.startswith('http')).select(db.recipe.image, distinct=True)
+        urls = [row.image for row in rows]
+    urls = {url for url in urls if is_remote(url)}
+    if not urls:
+        return 0
+    known = {row.url: row for row in db(db.image_download.url.belongs(urls)).select()}
+    queued = backfilled = 0
+    for url in urls:
+        row = known.get(url)
+        if row and row.status == 'done':
+            backfilled += _backfill(url, row.filename)
+        elif row:
+            if row.status == 'failed' and row.attempts >= MAX_ATTEMPTS:
+                continue
+            row.update_record(status='pending')
+            queued += 1
+        else:
+            db.image_download.insert(url=url, status='pending')
+            queued += 1
+    db.commit()
+    if backfilled:
+        invalidate('recipes')
+    if queued and start:
+        start_image_downloads()
+    return queued
+
+
+def _record(row, saved=None, error=None):
+    backfilled = 0
+    if saved:
+        row.update_record(status='done', filename=saved['filename'], attempts=row.attempts + 1, error=None)
+        backfilled = _backfill(row.url, saved['filename'])
+    else:
+        attempts = row.attempts + 1
+        row.update_record(status='pending' if attempts < MAX_ATTEMPTS else 'failed', attempts=attempts, error=str(error))
+    db.commit()
+    if backfilled:
+        invalidate('recipes')
+    if saved:
+        schedule_derivatives([saved['filename']])
+
+
+def download_pending_images(max_workers=MAX_WORKERS):
+    """
+    Download every pending URL on a pool of max_workers threads, recording
+    each one as it completes. Returns {'downloaded', 'failed'}.
+    """
+    counts = {'downloaded': 0, 'failed': 0}
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-download') as pool:
+        while True:
+            # by id, so a URL that failed is not retried again in the same run
+            rows = db((db.image_download.status == 'pending') & (db.image_download.id > last_id)).select(
+                orderby=db.image_download.id, limitby=(0, BATCH_SIZE)
+            )
+            if not rows:
+                break
+            last_id = rows.last().id
+            futures = {pool.submit(fetch_image, row.url): row for row in rows}
+            for future in as_completed(futures):
+                row = futures[future]
+                try:
+                    _record(row, saved=future.result())
+                    counts['downloaded'] += 1
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"Image download {row.url} failed: {e}")
+                    _record(row, error=e)
+                    counts['failed'] += 1
+    return counts
+
+
+def _download():
+    if _resume.is_set():
+        _resume.clear()
+        queue_image_downloads(start=False)
+    counts = download_pending_images()
+    if counts['downloaded'] or counts['failed']:
+        logger.info(f"Image downloads: {counts}")
+
+
+_worker = Worker('image-downloads', 'Image downloads', _download)
+
+
+def start_image_downloads(resume=False):
+    """
+    Drain the download queue in a daemon thread unless one is already
+    running; resume=True first queues every remote recipe.image. Returns the thread.
+    """
+    if resume:
+        _resume.set()
+    return _worker.start()
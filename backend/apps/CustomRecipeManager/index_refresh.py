@@ -0,0 +1,84 @@
+"""
+This file keeps the in-memory indexes of ingredient_index and
+ingredient_autocomplete current with writes made by other processes or by
+the import scripts, without rebuilding on the request path.
+
+Each index is a RefreshedIndex over the tables it is loaded from. Requests
+call ensure_fresh(), which never waits: at most every CHECK_SECONDS it starts
+a background thread that reads count(*), max(id) and max(modified_on) of
+those tables, a few aggregates next to a full load, and only when they
+differ from what the index was built from loads it again. The loader builds
+new structures and swaps them in under the index's own lock in one step, so
+requests keep answering from the previous index until then. Rows that are
+replaced get new ids, deletes lower the count and updates move modified_on.
+"""
+
+import threading
+import time
+
+from .background_jobs import run_in_thread
+from .common import db, logger
+
+# how often requests may trigger a check for writes by other processes (seconds)
+CHECK_SECONDS = 30
+
+
+def table_signature(tables):
+    """(count, max id, max modified_on) of each table, changes with any committed write"""
+    signature = []
+    for name in tables:
+        table = db[name]
+        columns = [table.id.count(), table.id.max()]
+        if 'modified_on' in table.fields:
+            columns.append(table.modified_on.max())
+        row = db(table).select(*columns).first()
+        signature.append(tuple(row[column] for column in columns))
+    return tuple(signature)
+
+
+class RefreshedIndex:
+    """An in-memory index loaded by load() from tables, reloaded in the background when they change"""
+
+    def __init__(self, name, tables, load):
+        self.name = name
+        self.tables = tables
+        self.load = load
+        self.signature = None
+        self.checked_on = 0
+        self.worker = None
+        self.lock = threading.Lock()
+        # one load at a time, so an older load never replaces a newer one
+        self.building = threading.Lock()
+
+    @property
+    def built(self):
+        return self.signature is not None
+
+    def build(self):
+        """Load the index now, e.g. at startup or after an import"""
+        with self.building:
+            # read before the rows, a write in between only causes another load
+            signature = table_signature(self.tables)
+            self.load()
+            with self.lock:
+                self.signature = signature
+                self.checked_on = time.time()
+
+    def ensure_fresh(self):
+        """Start a background check for changed tables when the last one is CHECK_SECONDS old"""
+        with self.lock:
+            if self.worker is not None or time.time() - self.checked_on < CHECK_SECONDS:
+                return
+            self.checked_on = time.time()
+            self.worker = run_in_thread(f'{self.name}-refresh', f'Rebuilding {self.name}', self._refresh)
+
+    def _refresh(self):
+        try:
+            if table_signature(self.tables) != self.signature:
+                started = time.time()
+                self.build()
+                logger.info(f"Rebuilt {self.name} in {time.time() - started:.2f}s")
+        finally:
+            db.rollback()
+            with self.lock:
+                self.worker = None
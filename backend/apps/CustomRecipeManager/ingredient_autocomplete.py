@@ -0,0 +1,144 @@
+"""
+This file keeps an in-memory autocomplete index over ingredient names for
+api/ingredients/search, so type-ahead requests do not hit the database.
+
+Names are kept in a sorted array of lowercased names for prefix lookups with
+bisect, and in a trigram index for typo-tolerant and infix (fuzzy) matching.
+The index is built at startup, add_ingredient() adds new rows through
+index_ingredient(), and it is reloaded in the background when the ingredient
+table changes in other processes or the import scripts (see index_refresh).
+"""
+
+import bisect
+import threading
+from collections import Counter
+
+from .common import db
+from .index_refresh import RefreshedIndex
+from .response_cache import invalidate
+
+# fraction of the query trigrams a name must contain to be a fuzzy match
+FUZZY_THRESHOLD = 0.5
+
+FIELDS = [
+    'id', 'name', 'unit', 'description', 'calories_per_unit', 'protein_per_unit', 'fat_per_unit',
+    'carbs_per_unit', 'sugar_per_unit', 'fiber_per_unit', 'sodium_per_unit',
+]
+
+_lock = threading.RLock()
+_rows = {}          # ingredient_id -> row dict in the api/ingredients/search shape
+_prefix_keys = []   # sorted (lowercased name, ingredient_id)
+_name_order = {}    # ingredient_id -> position when sorted by name like orderby=db.ingredient.name
+_by_name = []       # ingredient ids sorted by name
+_trigrams = {}      # trigram -> set of ingredient ids
+
+
+def trigrams(text):
+    """Return the set of trigrams of each word in text, padded like pg_trgm"""
+    grams = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _row_dict(row):
+    return {field: row[field] for field in FIELDS}
+
+
+def _reorder():
+    global _by_name, _name_order
+    _by_name = sorted(_rows, key=lambda ingredient_id: (_rows[ingredient_id]['name'], ingredient_id))
+    _name_order = {ingredient_id: position for position, ingredient_id in enumerate(_by_name)}
+
+
+def _load():
+    global _rows, _prefix_keys, _trigrams, _by_name, _name_order
+    rows = db(db.ingredient).select(*[db.ingredient[field] for field in FIELDS])
+    # built outside the lock, searches keep using the old index meanwhile
+    by_id = {row.id: _row_dict(row) for row in rows}
+    prefix_keys = sorted((row.name.lower(), row.id) for row in rows)
+    grams = {}
+    for row in rows:
+        for gram in trigrams(row.name):
+            grams.setdefault(gram, set()).add(row.id)
+    by_name = sorted(by_id, key=lambda ingredient_id: (by_id[ingredient_id]['name'], ingredient_id))
+    with _lock:
+        _rows, _prefix_keys, _trigrams = by_id, prefix_keys, grams
+        _by_name = by_name
+        _name_order = {ingredient_id: position for position, ingredient_id in enumerate(by_name)}
+    # cached ingredient searches were answered from the old index
+    invalidate('ingredients')
+
+
+_index = RefreshedIndex('ingredient autocomplete', ['ingredient'], _load)
+
+
+def build_ingredient_autocomplete():
+    """Load every ingredient into the prefix array and the trigram index"""
+    _index.build()
+
+
+def index_ingredient(ingredient_id):
+    """Add or refresh one ingredient, call after inserting it"""
+    row = db(db.ingredient.id == ingredient_id).select(*[db.ingredient[field] for field in FIELDS]).first()
+    with _lock:
+        if not _index.built or not row:
+            return
+        old = _rows.get(row.id)
+        if old:
+            _prefix_keys.remove((old['name'].lower(), row.id))
+            for gram in trigrams(old['name']):
+                _trigrams.get(gram, set()).discard(row.id)
+        _rows[row.id] = _row_dict(row)
+        bisect.insort(_prefix_keys, (row.name.lower(), row.id))
+        for gram in trigrams(row.name):
+            _trigrams.setdefault(gram, set()).add(row.id)
+        _reorder()
+
+
+def prefix_search(query, start, end):
+    """
+    Return (rows, total) for ingredients whose name starts with query
+    (case-insensitive), ordered by name. An empty query matches everything.
+    """
+    query = query.lower()
+    _index.ensure_fresh()
+    with _lock:
+        if not query:
+            return [_rows[i] for i in _by_name[start:end]], len(_by_name)
+        low = bisect.bisect_left(_prefix_keys, (query,))
+        high = bisect.bisect_left(_prefix_keys, (query + '\U0010ffff',))
+        matched = sorted((ingredient_id for _, ingredient_id in _prefix_keys[low:high]), key=_name_order.get)
+        return [_rows[i] for i in matched[start:end]], len(matched)
+
+
+def fuzzy_search(query, start, end):
+    """
+    Return (rows, total) for ingredients similar to query, best match first:
+    name prefixes, then infix matches, then names sharing most query trigrams.
+    """
+    query = query.lower().strip()
+    if not query:
+        return prefix_search(query, start, end)
+    query_grams = trigrams(query)
+    _index.ensure_fresh()
+    with _lock:
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(_trigrams.get(gram, ()))
+        if len(query) < 3:
+            # too short to contain a whole trigram, infix matches need a scan
+            for ingredient_id, row in _rows.items():
+                if ingredient_id not in shared and query in row['name'].lower():
+                    shared[ingredient_id] = 0
+        scored = []
+        for ingredient_id, count in shared.items():
+            name = _rows[ingredient_id]['name'].lower()
+            similarity = count / len(query_grams)
+            is_prefix = name.startswith(query)
+            is_infix = query in name
+            if is_prefix or is_infix or similarity >= FUZZY_THRESHOLD:
+                scored.append(((-is_prefix, -is_infix, -similarity, len(name), _name_order[ingredient_id]), ingredient_id))
+        scored.sort()
+        return [_rows[i] for _, i in scored[start:end]], len(scored)
@@ -0,0 +1,130 @@
+"""
+This file keeps an in-memory inverted index from ingredients to recipes for
+api/recipes/search_by_ingredients.
+
+Every ingredient maps to a sorted array of the recipe ids that use it, so
+"all", "any" and "at least k of n" ingredient queries and their match counts
+are answered without SQL. The index lives in each process: it is built from
+recipe_ingredient at startup, kept current by the recipe endpoints through
+index_recipe() / unindex_recipe(), and reloaded in the background when
+recipe or recipe_ingredient change in other processes or the import scripts
+(see index_refresh).
+"""
+
+import bisect
+import datetime
+import threading
+from array import array
+from collections import Counter
+
+from .common import db
+from .index_refresh import RefreshedIndex
+
+# sort key for recipes without created_on, they come last like in recipe_order()
+OLDEST = datetime.datetime.min
+
+_lock = threading.RLock()
+_postings = {}            # ingredient_id -> array('I') of recipe ids, sorted
+_recipe_ingredients = {}  # recipe_id -> tuple of ingredient ids
+_sort_keys = {}           # recipe_id -> (created_on, recipe_id)
+
+
+def _load():
+    global _postings, _recipe_ingredients, _sort_keys
+    pairs = db.executesql(db(db.recipe_ingredient)._select(
+        db.recipe_ingredient.recipe_id, db.recipe_ingredient.ingredient_id
+    ))
+    recipes = db(db.recipe).select(db.recipe.id, db.recipe.created_on)
+
+    by_ingredient = {}
+    by_recipe = {}
+    for recipe_id, ingredient_id in pairs:
+        by_ingredient.setdefault(ingredient_id, set()).add(recipe_id)
+        by_recipe.setdefault(recipe_id, set()).add(ingredient_id)
+
+    with _lock:
+        _postings = {ingredient_id: array('I', sorted(ids)) for ingredient_id, ids in by_ingredient.items()}
+        _recipe_ingredients = {recipe_id: tuple(ids) for recipe_id, ids in by_recipe.items()}
+        _sort_keys = {row.id: (row.created_on or OLDEST, row.id) for row in recipes}
+
+
+_index = RefreshedIndex('ingredient index', ['recipe', 'recipe_ingredient'], _load)
+
+
+def build_ingredient_index():
+    """Load the whole index from recipe_ingredient and recipe"""
+    _index.build()
+
+
+def _remove(recipe_id):
+    for ingredient_id in _recipe_ingredients.pop(recipe_id, ()):
+        posting = _postings.get(ingredient_id)
+        if posting is None:
+            continue
+        position = bisect.bisect_left(posting, recipe_id)
+        if position < len(posting) and posting[position] == recipe_id:
+            del posting[position]
+        if not posting:
+            del _postings[ingredient_id]
+    _sort_keys.pop(recipe_id, None)
+
+
+def index_recipe(recipe_id):
+    """(Re)index one recipe from the database, call after its ingredients were written"""
+    recipe_id = int(recipe_id)
+    recipe = db.recipe[recipe_id]
+    rows = db(db.recipe_ingredient.recipe_id == recipe_id).select(db.recipe_ingredient.ingredient_id)
+    ingredient_ids = tuple({row.ingredient_id for row in rows})
+    with _lock:
+        if not _index.built:
+            return
+        _remove(recipe_id)
+        if not recipe:
+            return
+        _sort_keys[recipe_id] = (recipe.created_on or OLDEST, recipe_id)
+        if ingredient_ids:
+            _recipe_ingredients[recipe_id] = ingredient_ids
+        for ingredient_id in ingredient_ids:
+            bisect.insort(_postings.setdefault(ingredient_id, array('I')), recipe_id)
+
+
+def unindex_recipe(recipe_id):
+    """Drop a deleted recipe from the index"""
+    with _lock:
+        if _index.built:
+            _remove(int(recipe_id))
+
+
+def match_recipes(ingredient_ids, min_matches=None):
+    """
+    Return {recipe_id: match_count} for the recipes that use at least
+    min_matches of ingredient_ids (all of them when min_matches is None).
+    """
+    ingredient_ids = list(dict.fromkeys(ingredient_ids))
+    if min_matches is None:
+        min_matches = len(ingredient_ids)
+    if not ingredient_ids or min_matches > len(ingredient_ids):
+        return {}
+    min_matches = max(1, min_matches)
+
+    _index.ensure_fresh()
+    with _lock:
+        postings = sorted((_postings.get(i, ()) for i in ingredient_ids), key=len)
+        if min_matches == len(postings):
+            # all of them: intersect starting from the rarest ingredient
+            matched = set(postings[0]).intersection(*postings[1:])
+            return dict.fromkeys(matched, len(postings))
+        counts = Counter()
+        for posting in postings:
+            counts.update(posting)
+    return {recipe_id: count for recipe_id, count in counts.items() if count >= min_matches}
+
+
+def rank_matches(matches):
+    """Recipe ids from match_recipes(), most matched ingredients first, then newest first"""
+    with _lock:
+        return sorted(
+            matches,
+            key=lambda recipe_id: (matches[recipe_id], _sort_keys.get(recipe_id, (OLDEST, recipe_id))),
+            reverse=True
+        )
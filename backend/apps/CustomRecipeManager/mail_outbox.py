@@ -0,0 +1,190 @@
+"""
+This file sends outbound mail (contact form notifications) in the background,
+so requests never wait on SMTP.
+
+queue_mail() adds a db.mail_outbox row inside the caller's transaction; after
+its commit the caller calls start_mail_delivery(). Mail that is committed is
+never lost: pending rows are picked up again on the next start.
+
+One worker thread per process delivers the due messages in batches over a
+single SMTP connection (settings.SMTP_*), reconnecting when the server drops
+it or the socket fails; a message the server rejects keeps the connection.
+A batch is claimed first by moving its next attempt past a lease, so
+workers of other processes never send the same message twice. A message
+that fails with a temporary error is retried with exponential backoff; after
+MAX_ATTEMPTS, or on a permanent (5xx) rejection, it is marked 'dead' with the
+last error and left for an admin to look at. While retries are scheduled the
+worker sleeps until the next one is due.
+"""
+
+import datetime
+import email.utils
+import random
+import smtplib
+import uuid
+from email.message import EmailMessage
+
+from . import settings
+from .background_jobs import Worker
+from .common import db, logger
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+# first retry after about this long, doubled on every attempt, capped at MAX_BACKOFF_SECONDS
+BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+TIMEOUT_SECONDS = 20
+# a claimed batch is left alone by other workers this long (a crashed worker's batch is retried after it)
+LEASE_SECONDS = BATCH_SIZE * TIMEOUT_SECONDS
+
+
+def queue_mail(to, subject, body):
+    """Add a message to the outbox in the current transaction, returns its id"""
+    return db.mail_outbox.insert(
+        to_address=to, subject=subject, body=body,
+        status='pending', next_attempt_on=datetime.datetime.utcnow(),
+    )
+
+
+def _connect():
+    host, _, port = settings.SMTP_SERVER.partition(':')
+    port = int(port or 0)
+    if settings.SMTP_SSL:
+        connection = smtplib.SMTP_SSL(host, port, timeout=TIMEOUT_SECONDS)
+    else:
+        connection = smtplib.SMTP(host, port, timeout=TIMEOUT_SECONDS)
+    try:
+        if settings.SMTP_TLS and not settings.SMTP_SSL:
+            connection.starttls()
+        if settings.SMTP_LOGIN:
+            connection.login(*settings.SMTP_LOGIN.split(':', 1))
+    except Exception:
+        connection.close()
+        raise
+    return connection
+
+
+def _close(connection):
+    try:
+        connection.quit()
+    except Exception:
+        connection.close()
+
+
+def _message(row):
+    message = EmailMessage()
+    message['From'] = settings.SMTP_SENDER
+    message['To'] = row.to_address
+    message['Subject'] = row.subject
+    message['Date'] = email.utils.formatdate()
+    message['Message-ID'] = email.utils.make_msgid()
+    message.set_content(row.body)
+    return message
+
+
+def _is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _record(row, error=None):
+    now = datetime.datetime.utcnow()
+    attempts = row.attempts + 1
+    if error is None:
+        row.update_record(status='sent', attempts=attempts, sent_on=now, error=None)
+        outcome = 'sent'
+    elif _is_permanent(error) or attempts >= MAX_ATTEMPTS:
+        row.update_record(status='dead', attempts=attempts, error=str(error))
+        outcome = 'dead'
+        logger.error(f"Mail {row.id} to {row.to_address} given up after {attempts} attempts: {error}")
+    else:
+        delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempts - 1)) * (1 + random.random() / 4)
+        row.update_record(attempts=attempts, error=str(error), next_attempt_on=now + datetime.timedelta(seconds=delay))
+        outcome = 'retried'
+    db.commit()
+    return outcome
+
+
+def _claim_batch():
+    # push the next attempt of the due rows past a lease, so workers in other processes skip them
+    now = datetime.datetime.utcnow()
+    due = (db.mail_outbox.status == 'pending') & (db.mail_outbox.next_attempt_on <= now)
+    ids = [row.id for row in db(due).select(db.mail_outbox.id, orderby=db.mail_outbox.id, limitby=(0, BATCH_SIZE))]
+    if not ids:
+        db.commit()
+        return []
+    claim = uuid.uuid4().hex
+    lease = now + datetime.timedelta(seconds=LEASE_SECONDS)
+    db(due & db.mail_outbox.id.belongs(ids)).update(next_attempt_on=lease, claim=claim)
+    db.commit()
+    return db(db.mail_outbox.claim == claim).select(orderby=db.mail_outbox.id)
+
+
+def deliver_pending():
+    """
+    Send every due message over one SMTP connection, recording each one as it
+    goes. Returns {'sent', 'retried', 'dead'}.
+    """
+    counts = {'sent': 0, 'retried': 0, 'dead': 0}
+    connection = None
+    try:
+        while True:
+            rows = _claim_batch()
+            if not rows:
+                break
+            for row in rows:
+                if connection is None:
+                    try:
+                        connection = _connect()
+                    except (smtplib.SMTPException, OSError) as e:
+                        # nothing else can be sent now either, retry the rest of the batch later
+                        for pending in rows.find(lambda r: r.status == 'pending' and r.id >= row.id):
+                            counts[_record(pending, e)] += 1
+                        return counts
+                try:
+                    connection.send_message(_message(row))
+                    counts[_record(row)] += 1
+                except OSError as e:
+                    # SMTPException subclasses OSError: only a hangup or a socket error ends the connection,
+                    # a rejected message (recipient, data, ...) leaves it usable for the next one
+                    if isinstance(e, smtplib.SMTPServerDisconnected) or not isinstance(e, smtplib.SMTPException):
+                        # no QUIT over a broken socket, just release it; the next message reconnects
+                        connection.close()
+                        connection = None
+                    counts[_record(row, e)] += 1
+    finally:
+        if connection is not None:
+            _close(connection)
+    return counts
+
+
+def _next_due():
+    # seconds until the earliest scheduled retry, None when the outbox is empty
+    row = db(db.mail_outbox.status == 'pending').select(
+        db.mail_outbox.next_attempt_on, orderby=db.mail_outbox.next_attempt_on, limitby=(0, 1)
+    ).first()
+    db.commit()
+    if not row:
+        return None
+    return max(0.0, (row.next_attempt_on - datetime.datetime.utcnow()).total_seconds())
+
+
+def _deliver():
+    counts = deliver_pending()
+    if any(counts.values()):
+        logger.info(f"Mail delivery: {counts}")
+    # sleeps until the next retry, woken early by start_mail_delivery() when new mail is queued
+    return _next_due()
+
+
+_worker = Worker('mail-delivery', 'Mail delivery', _deliver)
+
+
+def start_mail_delivery():
+    """Deliver the outbox in a daemon thread unless one is already running; returns the thread"""
+    return _worker.start()
+
+
+def has_pending_mail():
+    return not db(db.mail_outbox.status == 'pending').isempty()
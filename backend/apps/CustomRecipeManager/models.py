@@ -6,6 +6,16 @@ from pydal.validators import *
 import datetime
 
 from .common import Field, db, auth
+from . import settings
+from .background_jobs import start_job
+from .image_downloads import queue_image_downloads, start_image_downloads
+from .mail_outbox import has_pending_mail, start_mail_delivery
+from .nutrition import has_missing_nutrition, start_nutrition_backfill
+from .search_index import setup_search_index
+from .response_cache import setup_cache_generations
+from .structured_log import log_event
+from .ingredient_autocomplete import build_ingredient_autocomplete
+from .ingredient_index import build_ingredient_index
 
 ### Define your table below
 #
@@ -79,36 +89,165 @@ db.define_table(
     format='%(multi_images)s'
 )
 
+
+# materialized nutrition per recipe, refreshed by nutrition.refresh_recipe_nutrition
+# whenever a recipe, its ingredients or its servings change
+
+db.define_table(
+    'recipe_nutrition',
+    Field('recipe_id', 'reference recipe', unique=True, requires=IS_NOT_EMPTY()),
+    Field('servings', 'integer', default=1),
+    Field('total_calories', 'double', default=0),
+    Field('total_protein', 'double', default=0),
+    Field('total_fat', 'double', default=0),
+    Field('total_carbs', 'double', default=0),
+    Field('total_sugar', 'double', default=0),
+    Field('total_fiber', 'double', default=0),
+    Field('total_sodium', 'double', default=0),
+    Field('calories_per_serving', 'double', default=0),
+    Field('protein_per_serving', 'double', default=0),
+    Field('fat_per_serving', 'double', default=0),
+    Field('carbs_per_serving', 'double', default=0),
+    Field('sugar_per_serving', 'double', default=0),
+    Field('fiber_per_serving', 'double', default=0),
+    Field('sodium_per_serving', 'double', default=0),
+    Field('updated_on', 'datetime', default=datetime.datetime.utcnow, update=datetime.datetime.utcnow),
+    format='%(recipe_id)s'
+)
+
+# one row per one-off background job (see background_jobs.py), name is unique
+db.define_table(
+    'background_job',
+    Field('name', 'string', length=64, unique=True, requires=IS_NOT_EMPTY()),
+    Field('status', 'string', length=16, requires=IS_IN_SET(['running', 'done', 'failed'])),
+    Field('started_on', 'datetime'),
+    Field('finished_on', 'datetime'),
+    Field('details', 'text')
+)
+
+# one row per remote recipe image copied into uploads/ (see image_downloads.py), url is unique
+db.define_table(
+    'image_download',
+    Field('url', 'string', length=500, unique=True, requires=IS_NOT_EMPTY()),
+    Field('status', 'string', length=16, default='pending', requires=IS_IN_SET(['pending', 'done', 'failed'])),
+    Field('attempts', 'integer', default=0),
+    Field('filename', 'string', length=128),
+    Field('error', 'text'),
+    Field('updated_on', 'datetime', default=datetime.datetime.utcnow, update=datetime.datetime.utcnow)
+)
+
+# one row per outbound email (see mail_outbox.py): pending until sent, dead once given up on
+db.define_table(
+    'mail_outbox',
+    Field('to_address', 'string', length=255, requires=IS_EMAIL()),
+    Field('subject', 'string', length=255),
+    Field('body', 'text'),
+    Field('status', 'string', length=16, default='pending', requires=IS_IN_SET(['pending', 'sent', 'dead'])),
+    Field('attempts', 'integer', default=0),
+    Field('next_attempt_on', 'datetime'),
+    Field('claim', 'string', length=32),
+    Field('error', 'text'),
+    Field('created_on', 'datetime', default=datetime.datetime.utcnow),
+    Field('sent_on', 'datetime')
+)
+
 db.commit()
 
+# ==============================================================
+# ------------------------- INDEXES ---------------------------
+# ==============================================================
+
+# secondary indexes of the hot query paths: name -> (table, indexed columns or expressions).
+# auth_user.email and the other unique fields are already indexed by their UNIQUE constraint.
+INDEXES = {
+    # recipe detail, nutrition and the search triggers join ingredients per recipe and back
+    'recipe_ingredient_recipe_id_idx': ('recipe_ingredient', ['recipe_id']),
+    'recipe_ingredient_ingredient_id_idx': ('recipe_ingredient', ['ingredient_id']),
+    # images of a recipe / a page of recipes
+    'recipe_multiple_images_recipe_id_idx': ('recipe_multiple_images', ['recipe_id']),
+    # listings are ordered newest first by (created_on, id), id is implied by the rowid
+    'recipe_created_on_idx': ('recipe', ['created_on']),
+    'recipe_type_created_on_idx': ('recipe', ['type', 'created_on']),
+    'recipe_author_created_on_idx': ('recipe', ['author', 'created_on']),
+    # case-insensitive name lookups of the bulk loader and add_ingredient
+    'ingredient_name_lower_idx': ('ingredient', ['lower(name)']),
+    'recipe_name_lower_idx': ('recipe', ['lower(name)']),
+    # the mail worker's due / claimed batches
+    'mail_outbox_status_next_attempt_on_idx': ('mail_outbox', ['status', 'next_attempt_on']),
+    'mail_outbox_claim_idx': ('mail_outbox', ['claim']),
+}
+
+
+def index_sql(name):
+    table, columns = INDEXES[name]
+    return f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"
+
+
+def setup_indexes():
+    """
+    Create the INDEXES that are missing and rebuild those whose definition
+    changed, then refresh the planner statistics. Safe to run on every start;
+    returns the names of the indexes it (re)built.
+    """
+    if db._adapter.dbengine != 'sqlite':
+        return []
+    existing = dict(db.executesql("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"))
+    built = []
+    for name in INDEXES:
+        if existing.get(name) == index_sql(name):
+            continue
+        if name in existing:
+            db.executesql(f"DROP INDEX {name}")
+        db.executesql(index_sql(name))
+        built.append(name)
+    if built:
+        db.executesql("ANALYZE")
+    db.commit()
+    return built
+
+
+setup_indexes()
+
+# full-text index over recipes, kept in sync by SQLite triggers
+setup_search_index()
+
+# response cache generations, bumped by SQLite triggers on every write
+setup_cache_generations()
+
 # ==============================================================
 # -------------- AUTOMATIC THEMEALDB IMPORT -------------------
 # ==============================================================
 
+def themealdb_imported_before_jobs():
+    """
+    Details for a database imported before the themealdb_import job existed
+    (TheMealDB recipes but no job row), else None. A LIKE scan, so it is only
+    asked once, through is_job_done(..., done_before=...)
+    """
+    existing_recipes = db(db.recipe.description.like('%TheMealDB%')).count()
+    if existing_recipes > 0:
+        log_event('themealdb_import', 'already_imported', recipes=existing_recipes)
+        return f"already imported ({existing_recipes} recipes)"
+    return None
+
+
 def auto_import_themealdb():
     """
     Automatically import recipes from TheMealDB API on first startup
-    This runs once when the app starts and populates the database
+    Runs as the themealdb_import background job, once per database
     """
     try:
-        # Check if import has already been done
-        existing_recipes = db(db.recipe.description.like('%TheMealDB%')).count()
-        if existing_recipes > 0:
-            print(f"[TheMealDB] Import already completed. Found {existing_recipes} recipes.")
-            return
-        
-        print("[TheMealDB] Starting automatic import...")
+        log_event('themealdb_import', 'started')
         
-        import requests
-        import time
         import re
         from datetime import datetime
+        from .recipe_loader import load_ingredients, load_recipes
+        from .themealdb import TheMealDBClient
         
         recipes_imported = 0
         ingredients_imported = 0
         
-        # TheMealDB API endpoints
-        THEMEALDB_BASE = "https://www.themealdb.com/api/json/v1/1"
+        client = TheMealDBClient()
         
         # Create admin user for TheMealDB recipes
         admin_user = db(db.auth_user.email == 'admin@themealdb.com').select().first()
@@ -119,7 +258,7 @@ def auto_import_themealdb():
                 email='admin@themealdb.com',
                 password='dummy_password'
             )
-            print("[TheMealDB] Created admin user")
+            log_event('themealdb_import', 'created_admin_user')
         else:
             admin_user_id = admin_user.id
         
@@ -275,46 +414,33 @@ def auto_import_themealdb():
             except Exception:
                 return 100.0
         
+        def ingredient_values(ingredient_name, description):
+            return {
+                'name': ingredient_name,
+                'unit': 'g',
+                'description': description,
+                'calories_per_unit': get_default_calories(ingredient_name),
+                'protein_per_unit': get_default_protein(ingredient_name),
+                'fat_per_unit': get_default_fat(ingredient_name),
+                'carbs_per_unit': get_default_carbs(ingredient_name),
+                'sugar_per_unit': get_default_sugar(ingredient_name),
+                'fiber_per_unit': get_default_fiber(ingredient_name),
+                'sodium_per_unit': get_default_sodium(ingredient_name)
+            }
+        
         # Import ingredients first
-        print("[TheMealDB] Importing ingredients...")
+        log_event('themealdb_import', 'importing_ingredients')
         try:
-            ingredients_response = requests.get(f"{THEMEALDB_BASE}/list.php?i=list", timeout=15)
-            if ingredients_response.status_code == 200:
-                ingredients_data = ingredients_response.json()
-                
-                for ingredient_item in ingredients_data.get('meals', [])[:100]:
-                    ingredient_name = ingredient_item.get('strIngredient', '').strip()
-                    if not ingredient_name:
-                        continue
-                        
-                    existing = db(db.ingredient.name.ilike(ingredient_name)).select().first()
-                    if existing:
-                        continue
-                    
-                    db.ingredient.insert(
-                        name=ingredient_name,
-                        unit='g',
-                        description=f'Ingredient imported from TheMealDB',
-                        calories_per_unit=get_default_calories(ingredient_name),
-                        protein_per_unit=get_default_protein(ingredient_name),
-                        fat_per_unit=get_default_fat(ingredient_name),
-                        carbs_per_unit=get_default_carbs(ingredient_name),
-                        sugar_per_unit=get_default_sugar(ingredient_name),
-                        fiber_per_unit=get_default_fiber(ingredient_name),
-                        sodium_per_unit=get_default_sodium(ingredient_name)
-                    )
-                    ingredients_imported += 1
-                    
-                    if ingredients_imported % 20 == 0:
-                        print(f"[TheMealDB] Imported {ingredients_imported} ingredients...")
-                    
-                    time.sleep(0.05)  # Faster rate limiting for startup
-                    
+            report = load_ingredients(
+                ingredient_values((item.get('strIngredient') or '').strip(), 'Ingredient imported from TheMealDB')
+                for item in client.list_ingredients()[:100]
+            )
+            ingredients_imported += report['ingredients']
         except Exception as e:
-            print(f"[TheMealDB] Error importing ingredients: {e}")
+            log_event('themealdb_import', 'ingredients_failed', 'warning', error=str(e))
         
         # Import recipes
-        print("[TheMealDB] Importing recipes...")
+        log_event('themealdb_import', 'importing_recipes')
         categories = ['Beef', 'Chicken', 'Dessert', 'Lamb', 'Pasta', 'Pork', 'Seafood', 'Vegetarian']
         category_mapping = {
             'Beef': 'Dinner',
@@ -327,126 +453,97 @@ def auto_import_themealdb():
             'Vegetarian': 'Lunch'
         }
         
-        for category in categories:
-            try:
-                response = requests.get(f"{THEMEALDB_BASE}/filter.php?c={category}", timeout=15)
-                if response.status_code != 200:
-                    continue
-                
-                data = response.json()
-                meals = data.get('meals', [])[:5]  # 5 recipes per category for faster startup
-                
-                for meal in meals:
-                    meal_id = meal.get('idMeal')
-                    if not meal_id:
-                        continue
-                    
-                    try:
-                        detail_response = requests.get(f"{THEMEALDB_BASE}/lookup.php?i={meal_id}", timeout=15)
-                        if detail_response.status_code != 200:
-                            continue
-                            
-                        detail_data = detail_response.json()
-                        recipe_detail = detail_data.get('meals', [{}])[0]
-                        
-                        if not recipe_detail:
-                            continue
-                        
-                        recipe_name = recipe_detail.get('strMeal', '').strip()
-                        recipe_category = recipe_detail.get('strCategory', category)
-                        recipe_instructions = recipe_detail.get('strInstructions', '').strip()
-                        recipe_area = recipe_detail.get('strArea', '')
-                        
-                        if not recipe_name or not recipe_instructions:
-                            continue
-                        
-                        existing_recipe = db(db.recipe.name.ilike(recipe_name)).select().first()
-                        if existing_recipe:
-                            continue
-                        
-                        mapped_category = category_mapping.get(recipe_category, 'Dinner')
-                        
-                        description = f"Delicious {recipe_name} recipe imported from TheMealDB."
-                        if recipe_area:
-                            description += f" Traditional {recipe_area} cuisine."
-                        description += f" Category: {recipe_category}."
-                        
-                        recipe_id = db.recipe.insert(
-                            name=recipe_name,
-                            type=mapped_category,
-                            description=description,
-                            instruction_steps=recipe_instructions,
-                            servings=4,
-                            image=recipe_detail.get('strMealThumb', ''),  # Store the MealDB image URL
-                            author=admin_user_id,
-                            created_on=datetime.utcnow()
-                        )
-                        
-                        # Add ingredients to recipe
-                        for i in range(1, 21):
-                            ingredient_name = recipe_detail.get(f'strIngredient{i}', '').strip()
-                            ingredient_measure = recipe_detail.get(f'strMeasure{i}', '').strip()
-                            
-                            if not ingredient_name or not ingredient_measure:
-                                continue
-                            
-                            ingredient = db(db.ingredient.name.ilike(ingredient_name)).select().first()
-                            if not ingredient:
-                                ingredient_id = db.ingredient.insert(
-                                    name=ingredient_name,
-                                    unit='g',
-                                    description=f'Ingredient from TheMealDB recipe: {recipe_name}',
-                                    calories_per_unit=get_default_calories(ingredient_name),
-                                    protein_per_unit=get_default_protein(ingredient_name),
-                                    fat_per_unit=get_default_fat(ingredient_name),
-                                    carbs_per_unit=get_default_carbs(ingredient_name),
-                                    sugar_per_unit=get_default_sugar(ingredient_name),
-                                    fiber_per_unit=get_default_fiber(ingredient_name),
-                                    sodium_per_unit=get_default_sodium(ingredient_name)
-                                )
-                                ingredients_imported += 1
-                            else:
-                                ingredient_id = ingredient.id
-                            
-                            quantity = parse_quantity(ingredient_measure)
-                            
-                            db.recipe_ingredient.insert(
-                                recipe_id=recipe_id,
-                                ingredient_id=ingredient_id,
-                                quantity_per_serving=quantity
-                            )
-                        
-                        recipes_imported += 1
-                        print(f"[TheMealDB] Imported: {recipe_name}")
-                        
-                        time.sleep(0.2)  # Faster rate limiting
-                        
-                    except Exception as e:
-                        continue
+        # Category lists and recipe details are fetched concurrently, then loaded in bulk
+        meals, errors = client.fetch_category_meals(categories, per_category=5)  # 5 recipes per category for faster startup
+        for error in errors:
+            log_event('themealdb_import', 'fetch_failed', 'warning', error=error)
+        
+        recipes = []
+        for category, recipe_detail in meals:
+            recipe_name = recipe_detail.get('strMeal', '').strip()
+            recipe_category = recipe_detail.get('strCategory', category)
+            recipe_instructions = recipe_detail.get('strInstructions', '').strip()
+            recipe_area = recipe_detail.get('strArea', '')
+            
+            if not recipe_name or not recipe_instructions:
+                continue
+            
+            mapped_category = category_mapping.get(recipe_category, 'Dinner')
+            
+            description = f"Delicious {recipe_name} recipe imported from TheMealDB."
+            if recipe_area:
+                description += f" Traditional {recipe_area} cuisine."
+            description += f" Category: {recipe_category}."
+            
+            # Add ingredients to recipe
+            ingredients = []
+            for i in range(1, 21):
+                ingredient_name = (recipe_detail.get(f'strIngredient{i}') or '').strip()
+                ingredient_measure = (recipe_detail.get(f'strMeasure{i}') or '').strip()
                 
-                time.sleep(0.5)  # Brief pause between categories
+                if not ingredient_name or not ingredient_measure:
+                    continue
                 
-            except Exception as e:
-                continue
+                item = ingredient_values(ingredient_name, f'Ingredient from TheMealDB recipe: {recipe_name}')
+                item['quantity_per_serving'] = parse_quantity(ingredient_measure)
+                ingredients.append(item)
+            
+            recipes.append({
+                'name': recipe_name,
+                'type': mapped_category,
+                'description': description,
+                'instruction_steps': recipe_instructions,
+                'servings': 4,
+                'image': recipe_detail.get('strMealThumb', ''),  # MealDB image URL until the download lands
+                'created_on': datetime.utcnow(),
+                'ingredients': ingredients
+            })
+        
+        # One short transaction for everything, existing recipes are skipped
+        report = load_recipes(recipes, author=admin_user_id)
+        recipes_imported += report['recipes']
+        ingredients_imported += report['ingredients']
+        log_event('themealdb_import', 'loaded', rows=report['rows'], seconds=report['seconds'], rows_per_second=report['rows_per_second'])
         
-        # Commit all changes
+        # load_recipes() already committed, this covers the admin user
         db.commit()
         
-        print(f"[TheMealDB] Import completed! {recipes_imported} recipes, {ingredients_imported} ingredients")
+        if recipes_imported == 0:
+            # e.g. no network, leave the job failed so the next start tries again
+            raise RuntimeError("no recipes could be imported")
+        
+        # the in-memory indexes were built before these recipes existed
+        build_ingredient_index()
+        build_ingredient_autocomplete()
+        
+        # copy the images into uploads/ in the background
+        queue_image_downloads([recipe['image'] for recipe in recipes])
+        
+        log_event('themealdb_import', 'completed', recipes=recipes_imported, ingredients=ingredients_imported)
+        return f"{recipes_imported} recipes, {ingredients_imported} ingredients"
         
     except Exception as e:
-        print(f"[TheMealDB] Import failed: {e}")
-        # Don't crash the app if import fails
-        pass
-
-# Run the automatic import
-try:
-    # Only import if requests is available
-    import requests
-    auto_import_themealdb()
-except ImportError:
-    print("[TheMealDB] Skipping import - requests library not available")
-    print("[TheMealDB] Install with: pip install requests")
-except Exception as e:
-    print(f"[TheMealDB] Import error: {e}")
+        log_event('themealdb_import', 'failed', 'warning', error=str(e))
+        # recorded on the background job, the app keeps running
+        raise
+
+# Run the automatic import in the background, startup never waits on the network
+if settings.THEMEALDB_AUTO_IMPORT:
+    start_job('themealdb_import', auto_import_themealdb, done_before=themealdb_imported_before_jobs)
+
+# Resume image downloads left pending by an earlier run (or never started)
+if settings.IMAGE_DOWNLOADS:
+    start_image_downloads(resume=True)
+
+# Deliver mail left in the outbox by an earlier run
+if has_pending_mail():
+    start_mail_delivery()
+
+# Store recipe_nutrition for recipes written without it (scripts, older versions)
+if has_missing_nutrition():
+    start_nutrition_backfill()
 
+# in-memory ingredient -> recipes index for search_by_ingredients
+build_ingredient_index()
+# in-memory ingredient name index for api/ingredients/search
+build_ingredient_autocomplete()
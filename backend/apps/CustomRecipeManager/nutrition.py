@@ -0,0 +1,182 @@
+"""
+This file computes nutrition totals and image lists for a whole page of recipes
+at once, so the listing endpoints do not run one query per recipe.
+
+Totals are materialized in db.recipe_nutrition: every write that changes a
+recipe's ingredients or servings must call refresh_recipe_nutrition() (an
+ingredient's per-unit values: refresh_ingredient_nutrition()) before the
+request commits, and rebuild_recipe_nutrition() backfills the whole table.
+Reads never write: recipes without a row (e.g. inserted by a script) are
+computed on the fly, and the backfill started at app startup
+(start_nutrition_backfill) stores them.
+"""
+
+from .background_jobs import run_in_thread
+from .common import db, logger
+
+# nutrients summed for recipe cards, in the order the endpoints report them
+CARD_NUTRIENTS = ['calories', 'protein', 'carbs', 'fat']
+
+# every nutrient stored in db.recipe_nutrition
+NUTRIENTS = ['calories', 'protein', 'fat', 'carbs', 'sugar', 'fiber', 'sodium']
+
+
+def get_nutrition_totals(recipe_ids, nutrients=CARD_NUTRIENTS):
+    """
+    Return {recipe_id: {nutrient: total}} for the given recipes using a single
+    grouped SUM(quantity_per_serving * <nutrient>_per_unit) query.
+    Recipes without ingredients get zero totals.
+    """
+    recipe_ids = list(recipe_ids)
+    totals = {recipe_id: {n: 0 for n in nutrients} for recipe_id in recipe_ids}
+    if not recipe_ids:
+        return totals
+
+    quantity = db.recipe_ingredient.quantity_per_serving
+    sums = {n: (quantity * db.ingredient[f'{n}_per_unit']).sum() for n in nutrients}
+    rows = db(
+        db.recipe_ingredient.recipe_id.belongs(recipe_ids) &
+        (db.recipe_ingredient.ingredient_id == db.ingredient.id)
+    ).select(
+        db.recipe_ingredient.recipe_id,
+        *sums.values(),
+        groupby=db.recipe_ingredient.recipe_id
+    )
+    for row in rows:
+        totals[row.recipe_ingredient.recipe_id] = {n: row[s] or 0 for n, s in sums.items()}
+    return totals
+
+
+def get_additional_images(recipe_ids):
+    """Return {recipe_id: [filename, ...]} from recipe_multiple_images in a single belongs() query"""
+    recipe_ids = list(recipe_ids)
+    images = {recipe_id: [] for recipe_id in recipe_ids}
+    if not recipe_ids:
+        return images
+
+    rows = db(db.recipe_multiple_images.recipe_id.belongs(recipe_ids)).select(
+        db.recipe_multiple_images.recipe_id,
+        db.recipe_multiple_images.multi_images,
+        orderby=db.recipe_multiple_images.id
+    )
+    for row in rows:
+        if row.multi_images:
+            images[row.recipe_id].append(row.multi_images)
+    return images
+
+
+def compute_recipe_nutrition(recipe_ids):
+    """Return {recipe_id: db.recipe_nutrition values} for the given recipes, without storing them"""
+    recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+    if not recipe_ids:
+        return {}
+
+    totals = get_nutrition_totals(recipe_ids, NUTRIENTS)
+    recipes = db(db.recipe.id.belongs(recipe_ids)).select(db.recipe.id, db.recipe.servings)
+    computed = {}
+    for recipe in recipes:
+        servings = recipe.servings or 1
+        values = {'recipe_id': recipe.id, 'servings': servings}
+        for n in NUTRIENTS:
+            values[f'total_{n}'] = totals[recipe.id][n]
+            values[f'{n}_per_serving'] = totals[recipe.id][n] / servings
+        computed[recipe.id] = values
+    return computed
+
+
+def refresh_recipe_nutrition(recipe_ids):
+    """Recompute and store db.recipe_nutrition rows for the given recipes"""
+    recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+    stored = compute_recipe_nutrition(recipe_ids)
+    if not recipe_ids:
+        return stored
+
+    # replace rather than update row by row, all inside the caller's transaction
+    db(db.recipe_nutrition.recipe_id.belongs(recipe_ids)).delete()
+    if stored:
+        db.recipe_nutrition.bulk_insert(list(stored.values()))
+    return stored
+
+
+def refresh_ingredient_nutrition(ingredient_id):
+    """Refresh every recipe that uses an ingredient, e.g. after its per-unit values were edited"""
+    rows = db(db.recipe_ingredient.ingredient_id == ingredient_id).select(
+        db.recipe_ingredient.recipe_id, distinct=True
+    )
+    return refresh_recipe_nutrition([row.recipe_id for row in rows])
+
+
+def rebuild_recipe_nutrition(batch_size=500):
+    """Backfill db.recipe_nutrition for every recipe, batch_size recipes per grouped query"""
+    refreshed = 0
+    last_id = 0
+    while True:
+        recipe_ids = [row.id for row in db(db.recipe.id > last_id).select(
+            db.recipe.id, orderby=db.recipe.id, limitby=(0, batch_size)
+        )]
+        if not recipe_ids:
+            break
+        refresh_recipe_nutrition(recipe_ids)
+        refreshed += len(recipe_ids)
+        last_id = recipe_ids[-1]
+    # drop rows left behind by recipes removed without cascading
+    db(~db.recipe_nutrition.recipe_id.belongs(db()._select(db.recipe.id))).delete()
+    db.commit()
+    return refreshed
+
+
+def _missing_nutrition():
+    return ~db.recipe.id.belongs(db()._select(db.recipe_nutrition.recipe_id))
+
+
+def has_missing_nutrition():
+    return not db(_missing_nutrition()).isempty()
+
+
+def backfill_recipe_nutrition(batch_size=500):
+    """Store db.recipe_nutrition for the recipes that have none, committing per batch; returns how many"""
+    backfilled = 0
+    while True:
+        recipe_ids = [row.id for row in db(_missing_nutrition()).select(
+            db.recipe.id, orderby=db.recipe.id, limitby=(0, batch_size)
+        )]
+        if not recipe_ids:
+            break
+        refresh_recipe_nutrition(recipe_ids)
+        db.commit()
+        backfilled += len(recipe_ids)
+    return backfilled
+
+
+def _backfill():
+    backfilled = backfill_recipe_nutrition()
+    if backfilled:
+        logger.info(f"Backfilled nutrition of {backfilled} recipes")
+
+
+def start_nutrition_backfill():
+    """Run backfill_recipe_nutrition() in a daemon thread; returns the thread"""
+    return run_in_thread('nutrition-backfill', 'Nutrition backfill', _backfill)
+
+
+def nutrition_left_join():
+    """Left join that attaches db.recipe_nutrition to a db.recipe select"""
+    return db.recipe_nutrition.on(db.recipe_nutrition.recipe_id == db.recipe.id)
+
+
+def get_joined_nutrition(rows):
+    """
+    Return {recipe_id: recipe_nutrition values} from a select (Rows or as_list())
+    made with nutrition_left_join(). Recipes never materialized are computed
+    here but not stored, a read takes no write lock; the backfill stores them.
+    """
+    nutrition = {}
+    missing = []
+    for row in rows:
+        if row['recipe_nutrition']['id'] is None:
+            missing.append(row['recipe']['id'])
+        else:
+            nutrition[row['recipe']['id']] = row['recipe_nutrition']
+    for recipe_id, values in compute_recipe_nutrition(missing).items():
+        nutrition[recipe_id] = values
+    return nutrition
@@ -0,0 +1,104 @@
+"""
+This file implements keyset (cursor) pagination for recipe listings.
+
+Pages are ordered newest first by (created_on, id). Instead of an OFFSET the
+client sends back the opaque next_cursor of the previous page, so every page
+costs the same no matter how deep it is. Relevance-ranked search results use
+position cursors into the ranked id list instead.
+"""
+
+import base64
+import datetime
+import json
+
+from .common import cache, db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# how long an approximate total is reused before counting again (seconds)
+TOTAL_CACHE_SECONDS = 60
+
+
+def recipe_order():
+    """Newest first, id breaks ties between recipes created in the same second"""
+    return ~db.recipe.created_on | ~db.recipe.id
+
+
+def get_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Parse a limit parameter and clamp it to 1..MAX_PAGE_SIZE"""
+    try:
+        limit = int(value) if value else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_on, recipe_id):
+    """Return the opaque token pointing just after the given recipe"""
+    payload = [created_on.isoformat() if created_on else None, recipe_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_on, recipe_id) from a token, raising ValueError if it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_on, recipe_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if created_on is not None:
+            created_on = datetime.datetime.fromisoformat(created_on)
+        return created_on, int(recipe_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {token}")
+
+
+def encode_position_cursor(position):
+    """Return the opaque token for the given position in a ranked result list"""
+    payload = ['position', position]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_position_cursor(token):
+    """Return the position from a ranked-list token, raising ValueError if it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        kind, position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if kind != 'position' or int(position) < 0:
+            raise ValueError(token)
+        return int(position)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {token}")
+
+
+def after_cursor(token):
+    """Return the query selecting recipes that come after the cursor in recipe_order()"""
+    created_on, recipe_id = decode_cursor(token)
+    if created_on is None:
+        # rows without created_on sort last, only ids break ties among them
+        return (db.recipe.created_on == None) & (db.recipe.id < recipe_id)
+    return (
+        (db.recipe.created_on < created_on) |
+        ((db.recipe.created_on == created_on) & (db.recipe.id < recipe_id)) |
+        (db.recipe.created_on == None)
+    )
+
+
+def paginate(rows, limit):
+    """
+    Split rows selected with limitby=(0, limit + 1) into (page, next_cursor).
+    next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last['recipe']['created_on'], last['recipe']['id'])
+
+
+def approximate_total(query):
+    """Return db(query).count(), recomputed at most every TOTAL_CACHE_SECONDS per query"""
+    return cache.get(
+        f"recipe_total:{db(query)._count()}",
+        lambda: db(query).count(),
+        expiration=TOTAL_CACHE_SECONDS
+    )
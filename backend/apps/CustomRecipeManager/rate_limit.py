@@ -0,0 +1,198 @@
+"""
+This file throttles login and registration attempts with sliding-window
+limits per client IP and per email and client IP, checked before any
+auth_user query or password hashing runs. The email limit is per client so
+that failed attempts from elsewhere can not lock the account's owner out;
+guessing one password from many addresses still meets each one's IP limit.
+
+Each limit is (attempts, window seconds). The window slides by weighting the
+previous fixed window by how much of it still overlaps: attempts in the last
+`window` seconds ~= previous * (1 - elapsed / window) + current. So every
+key costs two counters, whatever the traffic, and rejected attempts count
+too: a client hammering the endpoint stays blocked until it slows down.
+
+Counters live in a store with increment() / evict():
+- MemoryStore (RATE_LIMIT_STORE="memory"): a dict per worker process, expired
+  keys are evicted every EVICT_SECONDS.
+- SQLiteStore (RATE_LIMIT_STORE="sqlite"): a table in settings.SESSION_DB
+  shared by the workers on the host, like the sessions.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from py4web import request
+
+from . import settings
+
+EVICT_SECONDS = 60
+
+# action -> key type -> (attempts, window seconds)
+RULES = {
+    'login': {'ip': settings.LOGIN_LIMIT_PER_IP, 'email': settings.LOGIN_LIMIT_PER_EMAIL},
+    'register': {'ip': settings.REGISTER_LIMIT_PER_IP},
+}
+
+
+class MemoryStore:
+    """Counters of this process: key -> [window number, current count, previous count, expires at]"""
+
+    def __init__(self):
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def increment(self, key, number, expires):
+        with self.lock:
+            counter = self.counters.get(key)
+            if counter is None or counter[0] < number - 1:
+                counter = self.counters[key] = [number, 0, 0, expires]
+            elif counter[0] == number - 1:
+                counter[:] = [number, 0, counter[1], expires]
+            counter[1] += 1
+            counter[3] = expires
+            return counter[1], counter[2]
+
+    def evict(self, now):
+        with self.lock:
+            for key in [key for key, counter in self.counters.items() if counter[3] < now]:
+                del self.counters[key]
+
+    def __len__(self):
+        return len(self.counters)
+
+
+class SQLiteStore:
+    """Counters shared by every process using the same SQLite file (WAL)"""
+
+    SCHEMA_SQL = [
+        """CREATE TABLE IF NOT EXISTS rate_limit (
+            key TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (key, number)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS rate_limit_expires_at ON rate_limit (expires_at)",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        for sql in self.SCHEMA_SQL:
+            self.connection().execute(sql)
+
+    def connection(self):
+        # one autocommit connection per thread
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def increment(self, key, number, expires):
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                """INSERT INTO rate_limit (key, number, count, expires_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT (key, number) DO UPDATE SET count = count + 1""",
+                (key, number, expires),
+            )
+            counts = dict(connection.execute(
+                "SELECT number, count FROM rate_limit WHERE key = ? AND number >= ?", (key, number - 1)
+            ).fetchall())
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return counts.get(number, 0), counts.get(number - 1, 0)
+
+    def evict(self, now):
+        self.connection().execute("DELETE FROM rate_limit WHERE expires_at < ?", (now,))
+
+    def __len__(self):
+        return self.connection().execute("SELECT count(*) FROM rate_limit").fetchone()[0]
+
+
+if settings.RATE_LIMIT_STORE == 'sqlite':
+    store = SQLiteStore(settings.SESSION_DB)
+else:
+    store = MemoryStore()
+
+stats = Counter()
+_lock = threading.Lock()
+_state = {'last_evict': time.time()}
+
+
+def client_ip():
+    """
+    The client address: the socket peer, or behind RATE_LIMIT_TRUSTED_PROXIES
+    reverse proxies the X-Forwarded-For entry the outermost one appended
+    """
+    hops = settings.RATE_LIMIT_TRUSTED_PROXIES
+    forwarded = [part.strip() for part in request.environ.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+    if hops and forwarded:
+        # each proxy appends the address it got the request from, the client can only add entries on the left
+        return forwarded[-min(hops, len(forwarded))]
+    return request.environ.get('REMOTE_ADDR')
+
+
+def hit(name, value, limit, window, now=None):
+    """Count an attempt for key name:value, return 0 if it is within limit per window, else seconds to wait"""
+    now = now or time.time()
+    number, elapsed = divmod(now, window)
+    # a window's counter is needed until the end of the next one
+    current, previous = store.increment(f"{name}:{value}", int(number), (number + 2) * window)
+    if previous * (1 - elapsed / window) + current <= limit:
+        return 0
+    # when the previous window's weight has dropped enough, or the current one is over
+    if current <= limit and previous:
+        return max(1, math.ceil(window * (1 - (limit - current) / previous) - elapsed))
+    return max(1, math.ceil(window - elapsed))
+
+
+def throttle(action, **keys):
+    """
+    Count an attempt at action (see RULES) for each key given, e.g.
+    throttle('login', ip=client_ip(), email=email). Returns 0 if allowed,
+    else the seconds until the client may retry.
+    """
+    now = time.time()
+    wait = 0
+    for key_type, value in keys.items():
+        if not value:
+            continue
+        limit, window = RULES[action][key_type]
+        value = str(value).strip().lower()
+        if key_type == 'email':
+            value = f"{value}|{keys.get('ip')}"
+        blocked = hit(f"{action}:{key_type}", value, limit, window, now)
+        if blocked:
+            stats[f'blocked:{action}:{key_type}'] += 1
+        wait = max(wait, blocked)
+    stats[f"{'blocked' if wait else 'allowed'}:{action}"] += 1
+    with _lock:
+        evict = now - _state['last_evict'] > EVICT_SECONDS
+        if evict:
+            _state['last_evict'] = now
+    if evict:
+        store.evict(now)
+    return wait
+
+
+def limiter_stats():
+    """Allowed / blocked attempts per action (and blocks per key type) since start, plus tracked keys"""
+    counts = dict(stats)
+    actions = {}
+    for action in RULES:
+        actions[action] = {
+            'allowed': counts.get(f'allowed:{action}', 0),
+            'blocked': counts.get(f'blocked:{action}', 0),
+            'blocked_by': {key_type: counts.get(f'blocked:{action}:{key_type}', 0) for key_type in RULES[action]},
+        }
+    return {'actions': actions, 'tracked_keys': len(store), 'store': type(store).__name__}
@@ -0,0 +1,100 @@
+"""
+This file answers conditional GETs (If-None-Match / If-Modified-Since -> 304)
+for the recipe JSON endpoints without building the response.
+
+The validators come from a few narrow queries instead of the full response,
+all on state shared by every worker process: the ids and modified_on
+(auth.signature) of the recipes on the page, the row count and highest id of
+their images and ingredients (rows that are replaced get new ids), the
+listing total and the 'recipes' generation of the cache_generation table,
+which triggers bump on every committed write, however quick. The ETag is a
+digest of those values, so each worker sends the same one for the same data.
+
+Last-Modified is when 'recipes' last changed (cache_generation.changed_on),
+deletes included, so If-Modified-Since can be answered too. It is only sent
+once that time is a whole second in the past: a write later in the same
+second would otherwise keep the same HTTP date. If-None-Match wins when both
+are sent.
+"""
+
+import email.utils
+import functools
+import hashlib
+import time
+
+from py4web import request, response
+
+from .common import db
+from .pagination import after_cursor, approximate_total, get_page_size, recipe_order
+from .response_cache import shared_version
+from .static_files import not_modified
+
+
+def _children(table, recipe_ids):
+    # row count and highest id of a child table for recipe_ids
+    count, newest = table.id.count(), table.id.max()
+    row = db(table.recipe_id.belongs(recipe_ids)).select(count, newest).first()
+    return row[count], row[newest]
+
+
+def _validators(recipes, *extra):
+    # modified_on has one second resolution, the shared generation catches quicker writes
+    number, changed_on = shared_version('recipes')
+    state = repr(([(recipe.id, recipe.modified_on) for recipe in recipes], extra, number))
+    last_modified = None
+    if changed_on is not None and int(changed_on) < int(time.time()):
+        last_modified = int(changed_on)
+    return f'"{hashlib.sha1(state.encode()).hexdigest()}"', last_modified
+
+
+def public_recipes_validators():
+    """(etag, last_modified) of the api/recipes/public page the request asks for"""
+    query = db.recipe.id > 0
+    cursor = request.params.get('cursor', '').strip()
+    if cursor:
+        query &= after_cursor(cursor)
+    limit = get_page_size(request.params.get('limit'))
+    recipes = db(query).select(
+        db.recipe.id, db.recipe.modified_on, orderby=recipe_order(), limitby=(0, limit + 1)
+    )
+    images = _children(db.recipe_multiple_images, [recipe.id for recipe in recipes])
+    return _validators(recipes, limit, images, approximate_total(db.recipe.id > 0))
+
+
+def recipe_detail_validators(recipe_id):
+    """(etag, last_modified) of api/recipes/<recipe_id>"""
+    recipes = db(db.recipe.id == recipe_id).select(db.recipe.id, db.recipe.modified_on)
+    return _validators(
+        recipes,
+        _children(db.recipe_ingredient, [recipe_id]),
+        _children(db.recipe_multiple_images, [recipe_id]),
+    )
+
+
+def conditional_get(validators, headers=None):
+    """
+    Send ETag / Last-Modified (unix time) from validators(*args) and answer a
+    matching If-None-Match or If-Modified-Since with 304 before the action
+    runs. headers() sets per-request headers (CORS) on the 304 too. Requests the validators can not handle
+    (e.g. a malformed cursor) go straight to the action.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                etag, last_modified = validators(*args, **kwargs)
+            except ValueError:
+                return func(*args, **kwargs)
+            response.headers['ETag'] = etag
+            if last_modified:
+                response.headers['Last-Modified'] = email.utils.formatdate(last_modified, usegmt=True)
+            # clients may keep the body but must revalidate it
+            response.headers['Cache-Control'] = 'no-cache'
+            if not_modified(etag, last_modified):
+                if headers:
+                    headers()
+                response.status = 304
+                return ""
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,192 @@
+"""
+This file is the bulk ingestion path shared by the recipe importers
+(TheMealDB script, startup auto-import, admin endpoint, import_mealdb.py and
+the JSON/CSV loader script).
+
+load_recipes() takes any iterable of normalized recipe dicts:
+
+    {
+        'name': 'Beef Stew', 'type': 'Dinner', 'description': '...',
+        'instruction_steps': '...', 'servings': 4, 'image': None,
+        'ingredients': [
+            {'name': 'Beef', 'quantity_per_serving': 150,
+             # only used when the ingredient does not exist yet:
+             'unit': 'g', 'description': '...', 'calories_per_unit': 2.5, ...},
+        ],
+    }
+
+and loads it batch by batch inside a single transaction. Every batch resolves
+all its ingredient names with one query on lower(name) (indexed, see
+models.INDEXES), creates the missing ingredients, recipes and
+recipe_ingredient rows with bulk_insert, and computes nutrition with one
+grouped query. Recipes whose name already exists (case-insensitive) are
+skipped. servings and quantity_per_serving default to 1 only when missing
+or None; a value that is not a number, negative (or servings below 1) raises
+RecipeLoadError and nothing is loaded.
+"""
+
+import math
+import time
+from itertools import islice
+
+from .common import db
+from .nutrition import NUTRIENTS, refresh_recipe_nutrition
+from .response_cache import invalidate
+
+# recipes per batch, one set of lookups and inserts per batch
+BATCH_SIZE = 500
+
+
+class RecipeLoadError(ValueError):
+    """Raised when a recipe dict holds a value that can not be stored"""
+
+
+def _amount(value, what, minimum=0, integer=False):
+    # 1 when missing, else value as a number of at least minimum
+    if value is None:
+        return 1
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RecipeLoadError(f"{what} must be a number, got {value!r}")
+    if not math.isfinite(number) or number < minimum:
+        raise RecipeLoadError(f"{what} must be at least {minimum}, got {value!r}")
+    if integer:
+        if not number.is_integer():
+            raise RecipeLoadError(f"{what} must be a whole number, got {value!r}")
+        return int(number)
+    return number
+
+
+def _ingredient_values(item):
+    values = {
+        'name': item['name'].strip(),
+        'unit': item.get('unit') or 'g',
+        'description': item.get('description') or '',
+    }
+    for n in NUTRIENTS:
+        values[f'{n}_per_unit'] = float(item.get(f'{n}_per_unit') or 0)
+    return values
+
+
+def resolve_ingredients(items, report):
+    """
+    Return {lowercased name: ingredient_id} for the ingredient dicts in items,
+    inserting the ones that do not exist yet with bulk_insert.
+    """
+    wanted = {}
+    for item in items:
+        name = item['name'].strip()
+        if name:
+            wanted.setdefault(name.lower(), item)
+    if not wanted:
+        return {}
+
+    ids = {}
+    rows = db(db.ingredient.name.lower().belongs(list(wanted))).select(db.ingredient.id, db.ingredient.name)
+    for row in rows:
+        ids.setdefault(row.name.lower(), row.id)
+
+    missing = [key for key in wanted if key not in ids]
+    if missing:
+        new_ids = db.ingredient.bulk_insert([_ingredient_values(wanted[key]) for key in missing])
+        ids.update(zip(missing, new_ids))
+        report['ingredients'] += len(missing)
+    return ids
+
+
+def _new_report():
+    return {'recipes': 0, 'ingredients': 0, 'recipe_ingredients': 0, 'skipped': 0}
+
+
+def _finish(report, started):
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    report['rows'] = report['recipes'] + report['ingredients'] + report['recipe_ingredients']
+    report['rows_per_second'] = round(report['rows'] / report['seconds']) if report['seconds'] else report['rows']
+    return report
+
+
+def _load_batch(batch, author, report, seen):
+    keys = {recipe['name'].strip().lower() for recipe in batch}
+    existing = {row.name.lower() for row in db(db.recipe.name.lower().belongs(list(keys))).select(db.recipe.name)}
+
+    recipes = []
+    for recipe in batch:
+        key = recipe['name'].strip().lower()
+        if key in existing or key in seen:
+            report['skipped'] += 1
+            continue
+        seen.add(key)
+        recipes.append(recipe)
+    if not recipes:
+        return
+
+    ingredient_ids = resolve_ingredients(
+        [item for recipe in recipes for item in recipe.get('ingredients', [])], report
+    )
+
+    recipe_ids = db.recipe.bulk_insert([{
+        'name': recipe['name'].strip(),
+        'type': recipe.get('type') or 'Dinner',
+        'description': recipe.get('description') or '',
+        'instruction_steps': recipe.get('instruction_steps') or '',
+        'servings': _amount(recipe.get('servings'), f"{recipe['name'].strip()}: servings", minimum=1, integer=True),
+        'image': recipe.get('image'),
+        'author': recipe.get('author') or author,
+        **({'created_on': recipe['created_on']} if recipe.get('created_on') else {}),
+    } for recipe in recipes])
+
+    links = [{
+        'recipe_id': recipe_id,
+        'ingredient_id': ingredient_ids[item['name'].strip().lower()],
+        'quantity_per_serving': _amount(
+            item.get('quantity_per_serving'), f"{recipe['name'].strip()}: {item['name'].strip()} quantity_per_serving"
+        ),
+    } for recipe, recipe_id in zip(recipes, recipe_ids)
+        for item in recipe.get('ingredients', []) if item['name'].strip()]
+    db.recipe_ingredient.bulk_insert(links)
+
+    refresh_recipe_nutrition(recipe_ids)
+    report['recipes'] += len(recipe_ids)
+    report['recipe_ingredients'] += len(links)
+
+
+def load_recipes(recipes, author=None, batch_size=BATCH_SIZE, commit=True):
+    """
+    Load an iterable of normalized recipe dicts in one transaction and return
+    a report: recipes, ingredients, recipe_ingredients, skipped, seconds, rows_per_second.
+    Nothing is written if any batch fails.
+    """
+    started = time.perf_counter()
+    report = _new_report()
+    seen = set()
+    recipes = iter(recipes)
+    try:
+        while True:
+            batch = list(islice(recipes, batch_size))
+            if not batch:
+                break
+            _load_batch(batch, author, report, seen)
+        if commit:
+            db.commit()
+            invalidate('recipes')
+    except Exception:
+        db.rollback()
+        raise
+    return _finish(report, started)
+
+
+def load_ingredients(ingredients, commit=True):
+    """Insert the ingredient dicts that do not exist yet, in one transaction; returns a report"""
+    started = time.perf_counter()
+    report = _new_report()
+    try:
+        resolve_ingredients(list(ingredients), report)
+        if commit:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return _finish(report, started)
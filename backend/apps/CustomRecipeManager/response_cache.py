@@ -0,0 +1,190 @@
+"""
+This file caches the JSON of the anonymous read endpoints (api/recipes/public,
+api/recipes/search, api/recipes/<id> and api/ingredients/search) in the app's
+LRU Cache from common.py.
+
+Entries are keyed on the endpoint, its path arguments, the normalized query
+parameters and the current generation of every scope the endpoint reads
+('recipes', 'ingredients'). A new generation makes every entry built before
+it unreachable at once, and they age out of the LRU.
+
+Generations live in the database: SQLite triggers on the tables a scope is
+built from bump its cache_generation row in the same transaction as the
+write, whichever process or script makes it. Every lookup reads the current
+generations first (one small primary key read), so no worker serves an entry
+built before another worker's committed write. A request that read older
+data may still finish after the bump, but it stores its result under the old
+generation where nobody looks. invalidate() also bumps a per-process counter,
+for state outside the database such as the in-memory ingredient indexes.
+"""
+
+import functools
+import threading
+from collections import Counter
+
+from py4web import request, response
+
+from .common import cache, db, logger
+
+# upper bound on how long an entry is served (seconds)
+CACHE_SECONDS = 300
+
+SCOPES = ('recipes', 'ingredients')
+
+# tables each scope is built from, their writes bump its generation
+SCOPE_TABLES = {
+    'recipes': ['recipe', 'recipe_ingredient', 'recipe_multiple_images', 'recipe_nutrition', 'ingredient', 'auth_user'],
+    'ingredients': ['ingredient'],
+}
+# only updates of these columns count (author names), other tables: every update
+WATCHED_COLUMNS = {'auth_user': ['first_name', 'last_name']}
+
+_generations = dict.fromkeys(SCOPES, 0)
+_lock = threading.Lock()
+_state = {'shared': False}
+stats = Counter()
+
+
+# unix time with fractions of a second, as SQLite computes it
+NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"
+
+
+def _trigger_sql(table, event):
+    name = f"cache_generation_{table}_{event.lower()}"
+    scopes = ', '.join(f"'{scope}'" for scope in SCOPES if table in SCOPE_TABLES[scope])
+    columns = WATCHED_COLUMNS.get(table)
+    when = f"UPDATE OF {', '.join(columns)}" if event == 'UPDATE' and columns else event
+    return name, f"""CREATE TRIGGER {name} AFTER {when} ON {table} BEGIN
+        UPDATE cache_generation SET generation = generation + 1, changed_on = {NOW_SQL} WHERE scope IN ({scopes});
+    END"""
+
+
+def setup_cache_generations():
+    """Create the cache_generation table and the triggers that bump it, replacing outdated triggers"""
+    if db._adapter.dbengine != 'sqlite':
+        logger.warning("Shared response cache generations need SQLite triggers, only this process' writes invalidate")
+        return False
+    try:
+        db.executesql("CREATE TABLE IF NOT EXISTS cache_generation (scope TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        if 'changed_on' not in [row[1] for row in db.executesql("PRAGMA table_info(cache_generation)")]:
+            db.executesql("ALTER TABLE cache_generation ADD COLUMN changed_on REAL")
+        for scope in SCOPES:
+            db.executesql(
+                f"INSERT OR IGNORE INTO cache_generation (scope, generation, changed_on) VALUES (?, 0, {NOW_SQL})",
+                placeholders=[scope]
+            )
+        db.executesql(f"UPDATE cache_generation SET changed_on = {NOW_SQL} WHERE changed_on IS NULL")
+        existing = dict(db.executesql("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+        tables = sorted({table for tables in SCOPE_TABLES.values() for table in tables})
+        for table in tables:
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                name, sql = _trigger_sql(table, event)
+                if existing.get(name) != sql:
+                    db.executesql(f"DROP TRIGGER IF EXISTS {name}")
+                    db.executesql(sql)
+        db.commit()
+        _state['shared'] = True
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Shared response cache generations unavailable ({e}), only this process' writes invalidate")
+        _state['shared'] = False
+    return _state['shared']
+
+
+def _shared_state():
+    # {scope: (generation, changed_on)} as committed in the database, empty when not set up
+    if not _state['shared']:
+        return {}
+    rows = db.executesql("SELECT scope, generation, changed_on FROM cache_generation")
+    return {scope: (number, changed_on) for scope, number, changed_on in rows}
+
+
+def shared_generations():
+    """{scope: generation} as committed in the database, the same in every process; empty when not set up"""
+    return {scope: number for scope, (number, _) in _shared_state().items()}
+
+
+def shared_version(scope):
+    """
+    (generation, changed_on) of scope in the database: changed_on is the unix
+    time of its last committed write, deletes included. (None, None) when not set up.
+    """
+    return _shared_state().get(scope, (None, None))
+
+
+class _Uncacheable(Exception):
+    # carries a response that must not be stored (server errors)
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+
+
+def invalidate(*scopes):
+    """
+    Drop this process' cached responses that read one of scopes. Database
+    writes do it for every process through the triggers; this is for state
+    the triggers can not see. Call it after the write is committed.
+    """
+    with _lock:
+        for scope in scopes or SCOPES:
+            _generations[scope] += 1
+        stats['invalidations'] += 1
+
+
+def normalized_params():
+    """The query parameters as a sorted tuple, surrounding spaces and empty values dropped"""
+    params = ((key, str(value).strip()) for key, value in request.query.items())
+    return tuple(sorted((key, value) for key, value in params if value))
+
+
+def cache_key(name, scopes, args):
+    shared = shared_generations()
+    with _lock:
+        generations = tuple((shared.get(scope), _generations[scope]) for scope in scopes)
+    return f"response:{name}:{generations}:{args}:{normalized_params()}"
+
+
+def hit_rates():
+    """Hits, misses and hit rate per endpoint, plus the invalidation count"""
+    with _lock:
+        counts = dict(stats)
+    rates = {}
+    for name in {key.split(':', 1)[1] for key in counts if key.startswith(('hit:', 'miss:'))}:
+        hits, misses = counts.get(f'hit:{name}', 0), counts.get(f'miss:{name}', 0)
+        rates[name] = {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 3)}
+    return {'endpoints': rates, 'invalidations': counts.get('invalidations', 0)}
+
+
+def cached_response(*scopes, headers=None, expiration=CACHE_SECONDS):
+    """
+    Cache what a GET action returns, per path arguments and query parameters.
+    headers() runs on every request (hit or miss) to set per-request headers
+    such as CORS. Responses with a 5xx status are never stored.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if headers:
+                headers()
+            key = cache_key(func.__name__, scopes, (args, sorted(kwargs.items())))
+            computed = []
+
+            def compute():
+                value = func(*args, **kwargs)
+                computed.append(True)
+                if response.status_code >= 500:
+                    raise _Uncacheable(value)
+                return response.status_code, value
+
+            try:
+                status, value = cache.get(key, compute, expiration)
+            except _Uncacheable as e:
+                return e.value
+            outcome = 'miss' if computed else 'hit'
+            with _lock:
+                stats[f'{outcome}:{func.__name__}'] += 1
+            response.status = status
+            response.headers['X-Cache'] = outcome.upper()
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,130 @@
+"""
+This file maintains a SQLite FTS5 full-text index over recipes.
+
+recipe_fts holds one row per recipe (rowid = recipe.id) with its name,
+description, instruction_steps and the names of its ingredients. Triggers on
+recipe, recipe_ingredient and ingredient keep it in sync on every insert,
+update and delete, whichever code path does the write.
+
+search_recipes_page() runs the match, the caller's other filters, the bm25
+order and the page in one statement joined to recipe (and recipe_nutrition),
+so every match is reachable and the total counts the same join. On databases
+without FTS5 the index is disabled and it returns None so callers can fall
+back to ilike().
+"""
+
+import re
+
+from .common import db, logger
+
+# column weights for bm25(), in recipe_fts column order
+RANK_WEIGHTS = {'name': 10.0, 'description': 2.0, 'instruction_steps': 1.0, 'ingredients': 4.0}
+
+INGREDIENT_NAMES_SQL = """
+    (SELECT COALESCE(group_concat(ingredient.name, ' '), '')
+       FROM recipe_ingredient JOIN ingredient ON ingredient.id = recipe_ingredient.ingredient_id
+      WHERE recipe_ingredient.recipe_id = {recipe_id})
+"""
+
+# the triggers below look up ingredients per recipe and recipes per ingredient,
+# through the recipe_ingredient indexes created by models.setup_indexes()
+SCHEMA_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS recipe_fts USING fts5(
+        {', '.join(RANK_WEIGHTS)}, tokenize = 'unicode61 remove_diacritics 2'
+    );""",
+    """CREATE TRIGGER IF NOT EXISTS recipe_fts_insert AFTER INSERT ON recipe BEGIN
+        INSERT INTO recipe_fts (rowid, name, description, instruction_steps, ingredients)
+        VALUES (new.id, new.name, new.description, new.instruction_steps, '');
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS recipe_fts_update AFTER UPDATE OF name, description, instruction_steps ON recipe BEGIN
+        UPDATE recipe_fts SET name = new.name, description = new.description,
+               instruction_steps = new.instruction_steps
+         WHERE rowid = new.id;
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS recipe_fts_delete AFTER DELETE ON recipe BEGIN
+        DELETE FROM recipe_fts WHERE rowid = old.id;
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS recipe_fts_ingredient_insert AFTER INSERT ON recipe_ingredient BEGIN
+        UPDATE recipe_fts SET ingredients = {INGREDIENT_NAMES_SQL.format(recipe_id='new.recipe_id')}
+         WHERE rowid = new.recipe_id;
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS recipe_fts_ingredient_delete AFTER DELETE ON recipe_ingredient BEGIN
+        UPDATE recipe_fts SET ingredients = {INGREDIENT_NAMES_SQL.format(recipe_id='old.recipe_id')}
+         WHERE rowid = old.recipe_id;
+    END;""",
+    f"""CREATE TRIGGER IF NOT EXISTS recipe_fts_ingredient_rename AFTER UPDATE OF name ON ingredient BEGIN
+        UPDATE recipe_fts SET ingredients = {INGREDIENT_NAMES_SQL.format(recipe_id='recipe_fts.rowid')}
+         WHERE rowid IN (SELECT recipe_id FROM recipe_ingredient WHERE ingredient_id = new.id);
+    END;""",
+]
+
+_enabled = False
+
+
+def setup_search_index():
+    """Create recipe_fts and its triggers if needed, backfilling it the first time"""
+    global _enabled
+    if db._adapter.dbengine != 'sqlite':
+        logger.warning("Full-text recipe search needs SQLite FTS5, falling back to ilike()")
+        return False
+    try:
+        created = not db.executesql("SELECT name FROM sqlite_master WHERE name = 'recipe_fts'")
+        for statement in SCHEMA_SQL:
+            db.executesql(statement)
+        if created:
+            rebuild_search_index()
+        db.commit()
+        _enabled = True
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Full-text recipe search unavailable ({e}), falling back to ilike()")
+        _enabled = False
+    return _enabled
+
+
+def rebuild_search_index():
+    """Repopulate recipe_fts from the recipe, recipe_ingredient and ingredient tables"""
+    db.executesql("DELETE FROM recipe_fts")
+    db.executesql(f"""
+        INSERT INTO recipe_fts (rowid, name, description, instruction_steps, ingredients)
+        SELECT recipe.id, recipe.name, recipe.description, recipe.instruction_steps,
+               {INGREDIENT_NAMES_SQL.format(recipe_id='recipe.id')}
+          FROM recipe
+    """)
+
+
+def build_match_expression(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix"""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes_page(text, filters=None, offset=0, limit=10, count=True):
+    """
+    Return (recipe ids of the page, best match first, total or None) for recipes
+    matching text and the pydal query filters (on recipe and recipe_nutrition),
+    or None when the full-text index is not available and the caller should use
+    ilike(). One id past limit is returned when a next page exists.
+    """
+    if not _enabled:
+        return None
+    expression = build_match_expression(text)
+    if not expression:
+        return [], (0 if count else None)
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS.values())
+    joins = "JOIN recipe ON recipe.id = recipe_fts.rowid"
+    if filters is not None and 'recipe_nutrition' in db._adapter.tables(filters):
+        joins += " JOIN recipe_nutrition ON recipe_nutrition.recipe_id = recipe.id"
+    # pydal renders the filters with their values escaped
+    where = "recipe_fts MATCH ?" + (f" AND {filters}" if filters is not None else "")
+    rows = db.executesql(
+        f"""SELECT recipe.id FROM recipe_fts {joins} WHERE {where}
+            ORDER BY bm25(recipe_fts, {weights}), recipe.id LIMIT ? OFFSET ?""",
+        placeholders=[expression, limit + 1, offset]
+    )
+    total = None
+    if count:
+        total = db.executesql(
+            f"SELECT count(*) FROM recipe_fts {joins} WHERE {where}", placeholders=[expression]
+        )[0][0]
+    return [row[0] for row in rows], total
@@ -0,0 +1,191 @@
+"""
+This file is the server-side session storage shared by every worker process:
+py4web's Session keeps only the session uuid in the cookie and reads/writes
+the data through SessionStore.get() / set().
+
+Sessions live in their own SQLite database (settings.SESSION_DB) in WAL mode,
+so readers in any number of processes never block each other and a write
+only holds the lock for one upsert. It is a separate file from storage.db,
+so session writes never commit or wait on the app's request transaction.
+
+py4web saves the session on every authenticated request (auth stamps
+recent_timestamp), almost always with nothing else changed. Such saves are
+touches: they are skipped while the stored row is younger than
+TOUCH_SECONDS, and after that queued and written in one transaction per
+FLUSH_SECONDS (or MAX_PENDING touches) per process. A queued touch never
+overwrites a newer write from another worker. Expired rows are swept every
+SWEEP_SECONDS.
+
+persistent_secret() gives every worker the same session secret across
+restarts.
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+# saves that only move timestamps are skipped while the row is younger than this
+TOUCH_SECONDS = 60
+# queued touches are written together at most this often
+FLUSH_SECONDS = 5
+MAX_PENDING = 200
+SWEEP_SECONDS = 300
+# keys py4web / auth rewrite on every request
+VOLATILE_KEYS = ('timestamp', 'recent_timestamp', 'recent_activity')
+
+SCHEMA_SQL = [
+    """CREATE TABLE IF NOT EXISTS session (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL,
+        expires_at REAL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS session_expires_at ON session (expires_at)",
+]
+
+
+def persistent_secret(path):
+    """
+    Return the secret stored in path, creating it on first use. Workers that
+    start together agree on one: the file is written under a temporary name
+    and linked into place, and only the first link succeeds.
+    """
+    try:
+        with open(path) as f:
+            secret = f.read().strip()
+        if secret:
+            return secret
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        f.write(secrets.token_hex(32))
+    try:
+        os.link(temporary, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temporary)
+    with open(path) as f:
+        return f.read().strip()
+
+
+def _stable(value):
+    # the session data without the keys that change on every save
+    try:
+        data = json.loads(value)
+    except (TypeError, ValueError):
+        return value
+    if not isinstance(data, dict):
+        return value
+    return {key: item for key, item in data.items() if key not in VOLATILE_KEYS}
+
+
+class SessionStore:
+    """py4web Session storage backed by a shared SQLite database in WAL mode"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # key -> (value, expiration, updated_at it is based on) of touches waiting for the next flush
+        self.pending = {}
+        self.last_flush = self.last_sweep = time.time()
+        for sql in SCHEMA_SQL:
+            self.connection().execute(sql)
+
+    def connection(self):
+        # one connection per thread, autocommit: every statement is its own short transaction
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        if isinstance(key, bytes):
+            key = key.decode()
+        now = time.time()
+        row = self.connection().execute(
+            "SELECT value, updated_at, expires_at FROM session WHERE key = ?", (key,)
+        ).fetchone()
+        self._maintain(now)
+        if not row or (row[2] is not None and row[2] < now):
+            self.local.loaded = None
+            return None
+        # remembered for the set() that usually follows in the same request
+        self.local.loaded = (key, row[0], row[1])
+        return row[0]
+
+    def set(self, key, value, expiration=None):
+        if isinstance(key, bytes):
+            key = key.decode()
+        now = time.time()
+        loaded = getattr(self.local, 'loaded', None)
+        self.local.loaded = None
+        if loaded and loaded[0] == key and _stable(loaded[1]) == _stable(value):
+            if now - loaded[2] >= TOUCH_SECONDS:
+                with self.lock:
+                    self.pending[key] = (value, expiration, loaded[2])
+            self._maintain(now)
+            return
+        with self.lock:
+            self.pending.pop(key, None)
+        self._upsert(key, value, expiration, now)
+        self._maintain(now)
+
+    def _upsert(self, key, value, expiration, now):
+        self.connection().execute(
+            """INSERT INTO session (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value, expires_at = excluded.expires_at, updated_at = excluded.updated_at""",
+            (key, value, now + expiration if expiration else None, now),
+        )
+
+    def flush(self):
+        """
+        Write the queued touches in one transaction. A touch only applies to
+        the row it was based on: if another request or worker rewrote the
+        session since (e.g. a logout), the touch is dropped.
+        """
+        with self.lock:
+            items, self.pending = self.pending, {}
+            self.last_flush = now = time.time()
+        if not items:
+            return 0
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(
+                "UPDATE session SET value = ?, expires_at = ?, updated_at = ? WHERE key = ? AND updated_at = ?",
+                [(value, now + expiration if expiration else None, now, key, base)
+                 for key, (value, expiration, base) in items.items()],
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return len(items)
+
+    def sweep(self):
+        """Delete expired sessions, returns how many"""
+        with self.lock:
+            self.last_sweep = time.time()
+        return self.connection().execute(
+            "DELETE FROM session WHERE expires_at < ?", (self.last_sweep,)
+        ).rowcount
+
+    def _maintain(self, now):
+        with self.lock:
+            flush = self.pending and (now - self.last_flush > FLUSH_SECONDS or len(self.pending) >= MAX_PENDING)
+            sweep = now - self.last_sweep > SWEEP_SECONDS
+        if flush:
+            self.flush()
+        if sweep:
+            self.sweep()
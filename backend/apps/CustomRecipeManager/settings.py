@@ -6,7 +6,6 @@ This is an optional file that defined app level settings such as:
 This file is provided as an example:
 """
 import os
-import secrets
 
 from py4web.core import required_folder
 
@@ -19,7 +18,7 @@ APP_NAME = os.path.split(APP_FOLDER)[-1]
 
 # DB_FOLDER:    Sets the place where migration files will be created
 #               and is the store location for SQLite databases
-DB_FOLDER = required_folder(APP_FOLDER, "databases")
+DB_FOLDER = os.environ.get("MEALZI_DB_FOLDER") or required_folder(APP_FOLDER, "databases")
 DB_URI = "sqlite://storage.db"
 DB_POOL_SIZE = 1
 DB_MIGRATE = True
@@ -31,9 +30,28 @@ STATIC_FOLDER = required_folder(APP_FOLDER, "static")
 # location where to store uploaded files:
 UPLOAD_FOLDER = required_folder(APP_FOLDER, "uploads")
 
+# import recipes from TheMealDB on first startup (set to 0 for scratch/benchmark databases)
+THEMEALDB_AUTO_IMPORT = os.environ.get("THEMEALDB_AUTO_IMPORT", "1") != "0"
+# TheMealDB API root, override to run the importers against a local stub server
+THEMEALDB_BASE_URL = os.environ.get("THEMEALDB_BASE_URL", "https://www.themealdb.com/api/json/v1/1")
+# on-disk cache of TheMealDB responses: "on", "replay" (offline, cache only) or "off"
+THEMEALDB_CACHE = os.environ.get("THEMEALDB_CACHE", "on")
+THEMEALDB_CACHE_FOLDER = os.environ.get("THEMEALDB_CACHE_FOLDER") or os.path.join(APP_FOLDER, "cache", "themealdb")
+# seconds before a cached response is revalidated
+THEMEALDB_CACHE_TTL = int(os.environ.get("THEMEALDB_CACHE_TTL", 7 * 24 * 3600))
+
+# copy remote recipe images (TheMealDB) into uploads/ in the background (set to 0 to keep hot-linking)
+IMAGE_DOWNLOADS = os.environ.get("IMAGE_DOWNLOADS", "1") != "0"
+
 # send verification email on registration
 VERIFY_EMAIL = False
 
+# password hashing (see credentials.py): pydal CRYPT algorithm "pbkdf2(iterations,key length,digest)",
+# raise the iterations as hardware gets faster, existing hashes are upgraded on login
+PASSWORD_HASH = os.environ.get("PASSWORD_HASH", "pbkdf2(210000,32,sha512)")
+# threads hashing passwords at once (0: one per CPU core)
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 0))
+
 # complexity of the password 0: no constraints, 50: safe!
 PASSWORD_ENTROPY = 0 if MODE == "development" else 50
 
@@ -57,14 +75,19 @@ SMTP_SSL = False  # Use STARTTLS instead of direct SSL for port 587
 SMTP_SERVER = os.environ.get("SMTP_SERVER", "smtp.gmail.com:587")
 SMTP_SENDER = os.environ.get("SMTP_SENDER", "mealzigroup@gmail.com")
 SMTP_LOGIN = os.environ.get("SMTP_LOGIN", "mealzigroup@gmail.com:rslygqrvcoasxobc")  # format: "email:password"
-SMTP_TLS = True  # Enable STARTTLS for secure connection
+SMTP_TLS = os.environ.get("SMTP_TLS", "1") != "0"  # Enable STARTTLS for secure connection (0 for a local test server)
 
 # Contact form notification settings
 CONTACT_NOTIFICATION_EMAIL = os.environ.get("CONTACT_NOTIFICATION_EMAIL", "mealzigroup@gmail.com")
 
 # session settings
-SESSION_TYPE = "memory"  # Store sessions in memory only
-SESSION_SECRET_KEY = secrets.token_hex(32)  # Generate random key on each server start
+# "sqlite": server-side store in SESSION_DB shared by all workers on the host,
+# "cookies" / "memory": signed cookie, "redis", "memcache" or "database"
+SESSION_TYPE = os.environ.get("SESSION_TYPE", "sqlite")
+SESSION_DB = os.path.join(DB_FOLDER, "sessions.db")
+# every worker must sign with the same key: from the environment, else generated once and kept in SESSION_SECRET_FILE
+SESSION_SECRET_FILE = os.environ.get("SESSION_SECRET_FILE") or os.path.join(APP_FOLDER, "private", "session.secret")
+SESSION_SECRET_KEY = os.environ.get("SESSION_SECRET_KEY")
 SESSION_EXPIRATION = 3600  # 1 hour in seconds
 SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
 SESSION_COOKIE_HTTPONLY = True
@@ -74,12 +97,30 @@ SESSION_COOKIE_DOMAIN = None
 SESSION_COOKIE_PATH = "/"
 SESSION_COOKIE_EXPIRES = 3600  # 1 hour in seconds
 MEMCACHE_CLIENTS = ["127.0.0.1:11211"]
-REDIS_SERVER = "localhost:6379"
+REDIS_SERVER = os.environ.get("REDIS_SERVER", "localhost:6379")
+
+# login / registration throttling (rate_limit.py): (attempts, window seconds) per client IP or email
+LOGIN_LIMIT_PER_IP = (20, 60)
+LOGIN_LIMIT_PER_EMAIL = (5, 60)  # per email and client IP
+REGISTER_LIMIT_PER_IP = (5, 600)
+# "memory": counters per worker process, "sqlite": shared by all workers on the host in SESSION_DB
+RATE_LIMIT_STORE = os.environ.get("RATE_LIMIT_STORE", "memory")
+# reverse proxies in front of the app that append to X-Forwarded-For, 0 uses the socket address;
+# only the entry the outermost of them appended is trusted, clients can write the ones left of it
+RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0))
 
 # logger settings
 LOGGERS = [
     "warning:stdout"
 ]  # syntax "severity:filename:format" filename can be stderr or stdout
+# the handlers above are fed from a queue of at most LOG_QUEUE_SIZE records by a background
+# thread, so requests never wait on log I/O; records beyond it are dropped and counted
+LOG_QUEUE_SIZE = 10000
+# per-endpoint events (structured_log.log_event): level and share of sub-warning events kept,
+# e.g. {"auth_login": "info"}, {"spa": 0.01}; unlisted endpoints use the LOGGERS level and keep all.
+# Both can be changed at runtime with POST /api/admin/logging
+LOG_LEVELS = {}
+LOG_SAMPLING = {"spa": 0.01}
 
 # Disable default login when using OAuth
 DEFAULT_LOGIN_ENABLED = True
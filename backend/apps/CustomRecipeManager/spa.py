@@ -0,0 +1,146 @@
+"""
+This file serves the React single page app: the index.html shell for every
+client-side route and the hashed build output under static/assets/.
+
+The shell is read once and kept in memory with gzip and brotli variants,
+and read again only when the mtime of index.html changes. It is sent with
+an ETag and Cache-Control: no-cache, so browsers revalidate it (304) and
+pick up a new build at once.
+
+Files in static/assets/ carry a content hash in their name (Vite build), so
+they are cached as immutable. Text assets get .gz / .br siblings next to
+them, written on first request, and the smallest one the browser accepts
+is sent.
+
+brotli is optional: without it only gzip is used.
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+
+from py4web import request, response
+
+from . import settings
+from .static_files import IMMUTABLE, content_type, not_modified, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+INDEX_PATH = os.path.join(settings.STATIC_FOLDER, 'index.html')
+ASSETS_FOLDER = os.path.join(settings.STATIC_FOLDER, 'assets')
+
+# client-side routes of frontend/src/App.jsx, all answered with the shell
+SPA_ROUTES = [
+    'static/',
+    'static/recipes',
+    'static/recipe/<recipe_id:int>',
+    'static/dashboard',
+    'static/create-recipe',
+    'static/contact',
+    'static/ingredients',
+    'static/about',
+    'static/login',
+    'static/register',
+]
+
+COMPRESSIBLE = {'.js', '.css', '.html', '.svg', '.json', '.txt', '.map'}
+
+_shell = {}
+_lock = threading.Lock()
+
+
+def _compress(body):
+    variants = {'gzip': gzip.compress(body, compresslevel=9)}
+    if brotli:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+
+def _load_shell():
+    mtime = os.stat(INDEX_PATH).st_mtime_ns
+    with _lock:
+        if _shell.get('mtime') != mtime:
+            with open(INDEX_PATH, 'rb') as f:
+                body = f.read()
+            _shell.clear()
+            _shell.update(
+                mtime=mtime,
+                etag=f'"{hashlib.sha256(body).hexdigest()}"',
+                variants=dict(_compress(body), identity=body),
+            )
+        return dict(_shell)
+
+
+def accepted_encodings():
+    """Content codings the request accepts, without the ones refused with q=0"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if coding and params.replace(' ', '') not in ('q=0', 'q=0.0'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def serve_shell():
+    """The index.html shell, negotiated between brotli, gzip and identity"""
+    if not os.path.isfile(INDEX_PATH):
+        response.status = 404
+        return "Frontend not found"
+    shell = _load_shell()
+    response.headers['Content-Type'] = 'text/html; charset=utf-8'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    accepted = accepted_encodings()
+    encoding = next((e for e in ('br', 'gzip') if e in accepted and e in shell['variants']), 'identity')
+    # one ETag per representation
+    etag = shell['etag'] if encoding == 'identity' else f'{shell["etag"][:-1]}-{encoding}"'
+    response.headers['ETag'] = etag
+    if not_modified(etag):
+        response.status = 304
+        return ""
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    return shell['variants'][encoding]
+
+
+def _sibling(path, encoding, compress):
+    # path.br / path.gz, (re)written when missing or older than the asset
+    sibling = f"{path}.{'br' if encoding == 'br' else 'gz'}"
+    if os.path.exists(sibling) and os.stat(sibling).st_mtime >= os.stat(path).st_mtime:
+        return sibling
+    with open(path, 'rb') as f:
+        data = compress(f.read())
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, sibling)
+    except OSError:
+        # read-only deployment, serve the asset uncompressed
+        return None
+    return sibling
+
+
+def serve_asset(filename):
+    """A file from static/assets/, immutable, precompressed when the browser allows it"""
+    path = os.path.join(ASSETS_FOLDER, os.path.basename(filename))
+    if filename.endswith(('.gz', '.br')) or not os.path.isfile(path):
+        response.status = 404
+        return "File not found"
+    response.headers['Vary'] = 'Accept-Encoding'
+    if os.path.splitext(path)[1] in COMPRESSIBLE:
+        accepted = accepted_encodings()
+        compressors = [('br', lambda data: brotli.compress(data, quality=11))] if brotli else []
+        compressors.append(('gzip', lambda data: gzip.compress(data, compresslevel=9)))
+        for encoding, compress in compressors:
+            if encoding in accepted:
+                sibling = _sibling(path, encoding, compress)
+                if sibling:
+                    response.headers['Content-Encoding'] = encoding
+                    return send_file(sibling, cache_control=IMMUTABLE, mimetype=content_type(path))
+    return send_file(path, cache_control=IMMUTABLE)
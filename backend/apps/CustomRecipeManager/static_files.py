@@ -0,0 +1,147 @@
+"""
+This file sends files from disk with HTTP caching, used by serve_upload and
+the static/assets/ route (spa.py).
+
+send_file() answers conditional requests (If-None-Match, If-Modified-Since)
+with 304, single byte ranges with 206 (If-Range aware) and returns an open
+file otherwise, which the server hands to wsgi.file_wrapper (sendfile where
+the server supports it) instead of reading it into memory.
+
+ETags are strong: the SHA-256 of the content, taken from the name for
+content-addressed files and otherwise hashed once per (mtime, size) and
+remembered. Content types are guessed once per extension.
+"""
+
+import email.utils
+import functools
+import hashlib
+import mimetypes
+import os
+import threading
+
+from py4web import request, response
+
+CHUNK_SIZE = 64 * 1024
+# content-addressed names never change content
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# anything else is cached for a day, then revalidated with its ETag
+REVALIDATE = 'public, max-age=86400'
+
+_etags = {}  # path -> (mtime_ns, size, etag)
+_etags_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=64)
+def _content_type_for(extension):
+    content_type, _ = mimetypes.guess_type(f"file{extension}")
+    return content_type or 'application/octet-stream'
+
+
+def content_type(path):
+    return _content_type_for(os.path.splitext(path)[1].lower())
+
+
+def file_etag(path, stat=None):
+    """Strong ETag from the SHA-256 of the file, hashed again only when it changes"""
+    stat = stat or os.stat(path)
+    with _etags_lock:
+        cached = _etags.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+    etag = f'"{digest.hexdigest()}"'
+    with _etags_lock:
+        _etags[path] = (stat.st_mtime_ns, stat.st_size, etag)
+    return etag
+
+
+def etag_matches(etag, header):
+    """True if an If-None-Match / If-Range style header lists etag (W/ prefixes ignored)"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = (tag.strip() for tag in header.split(','))
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in tags)
+
+
+def not_modified(etag, last_modified=None):
+    """True if the request's validators show the client already has this version"""
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag_matches(etag, if_none_match)
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if last_modified is not None and if_modified_since:
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since.timestamp()
+    return False
+
+
+def parse_range(header, length):
+    """(start, end) with end exclusive for a single 'bytes=' range, None if absent or unusable, False if unsatisfiable"""
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if not start:
+            start, end = max(0, length - int(end)), length
+        else:
+            start, end = int(start), min(int(end) + 1, length) if end else length
+    except ValueError:
+        return None
+    if start >= length or start >= end:
+        return False
+    return start, end
+
+
+def _iter_range(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def send_file(path, etag=None, cache_control=REVALIDATE, mimetype=None):
+    """Return the action body for serving path, setting status and caching headers"""
+    stat = os.stat(path)
+    etag = etag or file_etag(path, stat)
+    length = stat.st_size
+    response.headers['Content-Type'] = mimetype or content_type(path)
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = email.utils.formatdate(stat.st_mtime, usegmt=True)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Accept-Ranges'] = 'bytes'
+
+    if not_modified(etag, stat.st_mtime):
+        response.status = 304
+        return ""
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or etag_matches(etag, if_range):
+        byte_range = parse_range(request.headers.get('Range'), length)
+    if byte_range is False:
+        response.status = 416
+        response.headers['Content-Range'] = f"bytes */{length}"
+        return ""
+
+    if byte_range:
+        start, end = byte_range
+        response.status = 206
+        response.headers['Content-Range'] = f"bytes {start}-{end - 1}/{length}"
+        response.headers['Content-Length'] = str(end - start)
+        return "" if request.method == 'HEAD' else _iter_range(path, start, end)
+
+    response.headers['Content-Length'] = str(length)
+    return "" if request.method == 'HEAD' else open(path, 'rb')
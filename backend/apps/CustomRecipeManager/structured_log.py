@@ -0,0 +1,137 @@
+"""
+This file keeps logging off the request path and lets busy endpoints log
+structured, sampled events.
+
+make_queue_logger() builds the app logger from settings.LOGGERS with py4web's
+make_logger, then moves its handlers behind a queue: a request only formats
+the record and puts it on a bounded queue, a listener thread does the writes.
+When the queue is full the record is dropped and counted instead of blocking.
+
+log_event(endpoint, event, level, **fields) writes one line per event,
+"<event> key=value ...", on the child logger "<app logger>.<endpoint>", so
+each endpoint has its own level. Events below warning are sampled: only the
+settings.LOG_SAMPLING share of them (default all) is written. Levels and
+sampling rates start from settings.LOG_LEVELS / LOG_SAMPLING and can be
+changed at runtime with set_log_config(), per worker process.
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
+
+from py4web.server_adapters.logging_utils import make_logger
+
+from . import settings
+
+LOGGER_NAME = "py4web:" + settings.APP_NAME
+LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING,
+          'error': logging.ERROR, 'critical': logging.CRITICAL}
+
+stats = Counter()
+_sampling = {}
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats['dropped'] += 1
+
+
+def _stop(handler):
+    # writes out what is still queued; a no-op once stopped
+    listener, handler.listener = handler.listener, None
+    if listener is not None:
+        listener.stop()
+
+
+def make_queue_logger(name, loggers_info):
+    """make_logger(name, loggers_info) with its handlers run by a queue listener thread"""
+    # a reloaded app rebuilds the logger, stop the previous listener first
+    for handler in logging.getLogger(name).handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            _stop(handler)
+    logger = make_logger(name, loggers_info)
+    handlers = list(logger.handlers)
+    list(map(logger.removeHandler, handlers))
+    handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    handler.listener = QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    handler.listener.start()
+    logger.addHandler(handler)
+    atexit.register(_stop, handler)
+    return logger
+
+
+def _level(level):
+    if isinstance(level, str):
+        if level.lower() not in LEVELS:
+            raise ValueError(f"Unknown log level {level!r}, use one of {', '.join(LEVELS)}")
+        return LEVELS[level.lower()]
+    return level
+
+
+def _value(value):
+    if isinstance(value, (list, tuple)):
+        text = ','.join(map(str, value))
+    else:
+        text = value if isinstance(value, str) else json.dumps(value, default=str)
+    if not text or any(c in text for c in ' ="\n'):
+        return json.dumps(text)
+    return text
+
+
+def log_event(endpoint, event, level='info', **fields):
+    """Log event of endpoint as "<event> key=value ..." if its level is enabled and it is sampled in"""
+    level = _level(level)
+    logger = logging.getLogger(f"{LOGGER_NAME}.{endpoint}")
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = _sampling.get(endpoint, 1.0)
+        if rate < 1 and random.random() >= rate:
+            stats['sampled_out'] += 1
+            return
+    stats['logged'] += 1
+    message = ' '.join([event] + [f"{key}={_value(value)}" for key, value in fields.items()])
+    logger.log(level, message, extra={'endpoint': endpoint, 'event': event}, stacklevel=2)
+
+
+def set_log_config(levels=None, sampling=None):
+    """
+    Change endpoint levels ({endpoint: "info", ...}, None restores the app
+    logger's level) and sampling rates ({endpoint: 0.0 - 1.0}) of this process
+    """
+    levels = {endpoint: _level(level) if level is not None else None for endpoint, level in (levels or {}).items()}
+    sampling = dict(sampling or {})
+    for endpoint, rate in sampling.items():
+        if not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+            raise ValueError(f"Sampling rate of {endpoint} must be a number between 0 and 1")
+    for endpoint, level in levels.items():
+        logging.getLogger(f"{LOGGER_NAME}.{endpoint}").setLevel(level or logging.NOTSET)
+    _sampling.update(sampling)
+
+
+def log_config():
+    """Current endpoint levels, sampling rates and event counters of this process"""
+    manager = logging.getLogger(LOGGER_NAME).manager
+    levels = {
+        name.rsplit('.', 1)[-1]: logging.getLevelName(logger.level).lower()
+        for name, logger in manager.loggerDict.items()
+        if name.startswith(LOGGER_NAME + '.') and isinstance(logger, logging.Logger) and logger.level
+    }
+    return {
+        'level': logging.getLevelName(logging.getLogger(LOGGER_NAME).level).lower(),
+        'levels': levels,
+        'sampling': dict(_sampling),
+        'events': {key: stats[key] for key in ('logged', 'sampled_out', 'dropped')},
+    }
+
+
+set_log_config(settings.LOG_LEVELS, settings.LOG_SAMPLING)
@@ -0,0 +1,188 @@
+"""
+This file is the shared HTTP client for TheMealDB API, used by every import
+path (import_themealdb.py, the startup auto-import, api/admin/import-themealdb
+and import_mealdb.py).
+
+All requests go through one pooled requests.Session and a token bucket
+(RATE_PER_SECOND, bursts of BURST) instead of fixed sleeps. Connection errors,
+timeouts, 429 and 5xx are retried with exponential backoff. Category lists and
+lookups run on a bounded thread pool, only the HTTP part: callers still write
+to the database from their own thread. settings.THEMEALDB_BASE_URL can point
+the client at a local stub server.
+
+Responses go through the on-disk cache in themealdb_cache.py, which can also
+replay a previous run without any network.
+"""
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import settings
+from .themealdb_cache import default_cache
+
+MAX_WORKERS = 8
+RATE_PER_SECOND = 10
+BURST = 10
+RETRIES = 3
+BACKOFF_SECONDS = 0.5
+TIMEOUT_SECONDS = 15
+
+
+class TheMealDBError(Exception):
+    """Raised when a TheMealDB request fails for good"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket, acquire() blocks until a request may be sent"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TheMealDBClient:
+    """Rate-limited, retrying, concurrent client for TheMealDB JSON API"""
+
+    def __init__(self, base_url=None, max_workers=MAX_WORKERS, rate=RATE_PER_SECOND, burst=BURST,
+                 retries=RETRIES, backoff=BACKOFF_SECONDS, timeout=TIMEOUT_SECONDS, cache=None):
+        # cache=None uses the cache from settings, cache=False turns it off
+        self.cache = default_cache() if cache is None else cache or None
+        self.base_url = (base_url or settings.THEMEALDB_BASE_URL).rstrip('/')
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_json(self, endpoint, **params):
+        """GET base_url/endpoint with params and return the decoded JSON, through the cache"""
+        cache = self.cache
+        if cache is None:
+            return self._decode(endpoint, params, self._request(endpoint, params).content)
+
+        entry = cache.lookup(endpoint, params)
+        if entry and (cache.replay or cache.is_fresh(entry)):
+            cache.count('hit')
+            return self._decode(endpoint, params, cache.read(entry))
+        if cache.replay:
+            raise TheMealDBError(f"{endpoint} {params}: not in the replay cache {cache.folder}")
+
+        try:
+            response = self._request(endpoint, params, cache.validators(entry))
+        except TheMealDBError:
+            if not entry:
+                raise
+            # the API is unreachable, a stale copy is better than nothing
+            cache.count('stale')
+            return self._decode(endpoint, params, cache.read(entry))
+
+        if response.status_code == 304 and entry:
+            cache.count('revalidated')
+            cache.touch(entry)
+            return self._decode(endpoint, params, cache.read(entry))
+        cache.count('miss')
+        data = self._decode(endpoint, params, response.content)
+        cache.store(endpoint, params, response.content, response.headers)
+        return data
+
+    def _decode(self, endpoint, params, body):
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise TheMealDBError(f"{endpoint} {params}: {e}")
+
+    def _request(self, endpoint, params, headers=None):
+        """Send the GET with rate limiting and retries, return the successful response"""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            try:
+                response = self.session.get(
+                    f"{self.base_url}/{endpoint}", params=params, headers=headers, timeout=self.timeout
+                )
+                if response.status_code == 429 or response.status_code >= 500:
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                    error = TheMealDBError(f"HTTP {response.status_code}")
+                else:
+                    response.raise_for_status()
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException as e:
+                # other HTTP errors are not worth retrying
+                raise TheMealDBError(f"{endpoint} {params}: {e}")
+            if attempt < self.retries:
+                time.sleep(delay)
+        raise TheMealDBError(f"{endpoint} {params} failed after {self.retries + 1} attempts: {error}")
+
+    def list_ingredients(self):
+        return self.get_json('list.php', i='list').get('meals') or []
+
+    def filter_by_category(self, category):
+        return self.get_json('filter.php', c=category).get('meals') or []
+
+    def lookup_meal(self, meal_id):
+        meals = self.get_json('lookup.php', i=meal_id).get('meals') or []
+        return meals[0] if meals else None
+
+    def search_meals(self, name=''):
+        return self.get_json('search.php', s=name).get('meals') or []
+
+    def map_concurrently(self, func, items):
+        """Yield (item, result, error) of func(item) for every item, in order, on the thread pool"""
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(func, item) for item in items]
+            for item, future in zip(items, futures):
+                try:
+                    yield item, future.result(), None
+                except Exception as e:
+                    yield item, None, e
+
+    def fetch_category_meals(self, categories, per_category=None):
+        """
+        Return ([(category, meal_detail), ...], errors) for the first per_category
+        meals of each category, fetching lists and lookups concurrently.
+        """
+        errors = []
+        wanted = []
+        for category, meals, error in self.map_concurrently(self.filter_by_category, categories):
+            if error:
+                errors.append(f"Error fetching {category} recipes: {error}")
+                continue
+            wanted += [(category, meal['idMeal']) for meal in meals[:per_category] if meal.get('idMeal')]
+
+        details = []
+        for (category, meal_id), detail, error in self.map_concurrently(lambda pair: self.lookup_meal(pair[1]), wanted):
+            if error:
+                errors.append(f"Error importing recipe {meal_id}: {error}")
+            elif detail:
+                details.append((category, detail))
+        return details, errors
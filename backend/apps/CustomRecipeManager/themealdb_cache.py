@@ -0,0 +1,125 @@
+"""
+This file is the on-disk cache of raw TheMealDB responses used by
+TheMealDBClient.get_json().
+
+Bodies are stored content-addressed under blobs/ by the sha256 of their bytes,
+so identical responses (e.g. the many {"meals": null}) are kept once. Each
+request, keyed by endpoint and params, has a small entry under entries/ with
+the blob hash, the fetch time and the ETag / Last-Modified validators.
+
+settings.THEMEALDB_CACHE selects the mode:
+- "on": fresh entries (younger than THEMEALDB_CACHE_TTL) are served from disk,
+  stale ones are revalidated with If-None-Match / If-Modified-Since
+- "replay": offline, every request must be in the cache and nothing is sent
+- "off": no cache
+
+A cache folder filled by one import run is a snapshot that later reimports and
+benchmarks can replay with zero network and deterministic timing.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from . import settings
+
+
+def request_key(endpoint, params):
+    """Stable hash of endpoint and params, the same for i=52772 and i='52772'"""
+    text = json.dumps([endpoint, sorted((k, str(v)) for k, v in params.items())])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _write_atomic(path, data):
+    # write to a temp file and rename, readers never see half a file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class ResponseCache:
+    """Content-addressed on-disk store of TheMealDB responses"""
+
+    def __init__(self, folder, ttl, replay=False):
+        self.folder = folder
+        self.ttl = ttl
+        self.replay = replay
+        self.stats = Counter()  # hit, miss, revalidated, stale
+        self.lock = threading.Lock()
+
+    def count(self, what):
+        with self.lock:
+            self.stats[what] += 1
+
+    def _entry_path(self, key):
+        return os.path.join(self.folder, 'entries', key[:2], f"{key}.json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.folder, 'blobs', digest[:2], digest)
+
+    def lookup(self, endpoint, params):
+        """Return the cache entry for the request, or None"""
+        try:
+            with open(self._entry_path(request_key(endpoint, params)), 'rb') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if os.path.isfile(self._blob_path(entry['blob'])) else None
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_on'] < self.ttl
+
+    def read(self, entry):
+        with open(self._blob_path(entry['blob']), 'rb') as f:
+            return f.read()
+
+    def validators(self, entry):
+        """Conditional request headers to revalidate a stale entry"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, endpoint, params, body, headers=None):
+        """Save a response body and point the request's entry at it"""
+        headers = headers or {}
+        digest = hashlib.sha256(body).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.isfile(blob_path):
+            _write_atomic(blob_path, body)
+        self._save_entry({
+            'key': request_key(endpoint, params),
+            'endpoint': endpoint,
+            'params': {k: str(v) for k, v in params.items()},
+            'blob': digest,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched_on': time.time(),
+        })
+
+    def touch(self, entry):
+        """Mark an entry fresh again after a 304 Not Modified"""
+        self._save_entry(dict(entry, fetched_on=time.time()))
+
+    def _save_entry(self, entry):
+        _write_atomic(self._entry_path(entry['key']), json.dumps(entry).encode())
+
+
+def default_cache():
+    """The cache configured in settings, None when it is turned off"""
+    mode = settings.THEMEALDB_CACHE
+    if mode == 'off':
+        return None
+    return ResponseCache(settings.THEMEALDB_CACHE_FOLDER, settings.THEMEALDB_CACHE_TTL, replay=(mode == 'replay'))
@@ -0,0 +1,218 @@
+"""
+This file is the upload pipeline and the content-addressed image store behind
+uploads/, shared by create_recipe, update_recipe, upload_images and the
+TheMealDB image downloads.
+
+Uploaded images are copied in CHUNK_SIZE blocks into a temp file inside the
+uploads folder, so a worker never holds a whole image in memory. The size
+limit is checked and the SHA-256 of the content is computed during the copy,
+and the file is then renamed to <sha256><extension>: names never collide and
+an image uploaded twice is stored once.
+
+recipe.image and recipe_multiple_images.multi_images are the references to a
+stored image. release_images() deletes the files nothing refers to any more,
+along with their resized copies (image_derivatives.py); callers run it after
+the commit that dropped the references.
+
+An upload of content that is already stored reuses the file and touches it,
+but its reference is only committed later, possibly in another process. So
+release_images() first renames an unreferenced file aside: an upload that
+comes after that finds it gone and stores it again. If the file was touched
+in the last REUSE_GRACE_SECONDS it is put back, and a background thread
+checks it again once that time has passed.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+from . import settings
+from .background_jobs import Worker
+from .common import db
+from .image_derivatives import remove_derivatives
+
+CHUNK_SIZE = 64 * 1024
+# largest accepted image, in bytes
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+# images per recipe (main image included)
+MAX_IMAGES = 5
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+
+# an unreferenced image touched this recently may be reused by an upload that has not committed yet
+REUSE_GRACE_SECONDS = 600
+
+_lock = threading.Lock()
+# filename -> when release_images() looks at it again
+_deferred = {}
+
+
+class UploadError(Exception):
+    """Raised when an upload breaks a limit; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def uploaded_files(files, name):
+    """All uploads sent under form field name as a list (request.files may hold one or a list)"""
+    value = files.get(name)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def image_extension(filename):
+    """Lowercased extension of filename if it is an image one, else .jpg"""
+    extension = os.path.splitext(filename or '')[1].lower()
+    return extension if extension in IMAGE_EXTENSIONS else '.jpg'
+
+
+def is_content_addressed(filename):
+    """True for names produced by the store (they never change content)"""
+    return bool(CONTENT_ADDRESSED.match(filename or ''))
+
+
+def save_stream(stream, extension='.jpg', max_bytes=MAX_IMAGE_BYTES, folder=None):
+    """
+    Copy stream into the store in fixed-size blocks and return
+    {'filename', 'sha256', 'size', 'created'}; created is False when the same
+    content was already stored. Raises UploadError above max_bytes.
+    """
+    folder = folder or settings.UPLOAD_FOLDER
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                block = stream.read(CHUNK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadError(f"Image is larger than {max_bytes // (1024 * 1024)} MB", status=413)
+                digest.update(block)
+                f.write(block)
+        if not size:
+            raise UploadError("Image is empty")
+        filename = f"{digest.hexdigest()}{extension}"
+        path = os.path.join(folder, filename)
+        created = not os.path.exists(path)
+        if not created:
+            try:
+                # keeps release_images() away until our reference is committed
+                os.utime(path)
+            except FileNotFoundError:
+                # released in the meantime, store it again
+                created = True
+        if created:
+            os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {'filename': filename, 'sha256': digest.hexdigest(), 'size': size, 'created': created}
+
+
+def save_uploads(files, max_count=MAX_IMAGES, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Stream every uploaded file (py4web FileUpload) into the store. Nothing new
+    is kept if any of them breaks a limit. Returns the save_stream() results in order.
+    """
+    files = [f for f in files if f is not None and hasattr(f, 'file')]
+    if len(files) > max_count:
+        raise UploadError(f"At most {max_count} images can be uploaded")
+    saved = []
+    try:
+        for upload in files:
+            saved.append(save_stream(upload.file, image_extension(upload.filename), max_bytes))
+    except BaseException:
+        discard_uploads(saved)
+        raise
+    return saved
+
+
+def discard_uploads(saved):
+    """Delete the files a failed request stored (save_uploads() results), after its rollback"""
+    # only files it created, an existing blob may be referenced elsewhere
+    release_images([item['filename'] for item in saved if item['created']])
+
+
+def image_references(filenames):
+    """Return {filename: number of recipe.image and recipe_multiple_images rows using it}"""
+    filenames = list({name for name in filenames if name})
+    counts = dict.fromkeys(filenames, 0)
+    if not filenames:
+        return counts
+    count = db.recipe.id.count()
+    for row in db(db.recipe.image.belongs(filenames)).select(db.recipe.image, count, groupby=db.recipe.image):
+        counts[row.recipe.image] += row[count]
+    count = db.recipe_multiple_images.id.count()
+    for row in db(db.recipe_multiple_images.multi_images.belongs(filenames)).select(
+        db.recipe_multiple_images.multi_images, count, groupby=db.recipe_multiple_images.multi_images
+    ):
+        counts[row.recipe_multiple_images.multi_images] += row[count]
+    return counts
+
+
+def _remove_unused(filename):
+    # True if the file was deleted, False if it is gone already or was reused lately
+    folder = settings.UPLOAD_FOLDER
+    path = os.path.join(folder, os.path.basename(filename))
+    released = os.path.join(folder, f'.released-{os.path.basename(filename)}')
+    try:
+        os.rename(path, released)
+    except FileNotFoundError:
+        return False
+    if time.time() - os.stat(released).st_mtime < REUSE_GRACE_SECONDS:
+        # maybe about to be referenced, put it back (an upload may have stored the same bytes again)
+        os.replace(released, path)
+        _defer(filename)
+        return False
+    os.remove(released)
+    remove_derivatives(filename)
+    return True
+
+
+def release_images(filenames):
+    """
+    Delete the stored files among filenames that no recipe refers to any more,
+    once the references are committed; returns how many were deleted now
+    """
+    removed = 0
+    for filename, references in image_references(filenames).items():
+        if not references:
+            removed += _remove_unused(filename)
+    return removed
+
+
+def _release_deferred():
+    # release the deferred files that are due, else wait for the next one
+    now = time.time()
+    with _lock:
+        if not _deferred:
+            return None
+        due = [filename for filename, at in _deferred.items() if at <= now]
+        for filename in due:
+            del _deferred[filename]
+        wait = min(_deferred.values(), default=now) - now
+    if due:
+        release_images(due)
+        db.commit()
+        return 0
+    return wait
+
+
+_worker = Worker('image-release', 'Releasing images', _release_deferred)
+
+
+def _defer(filename):
+    # look at filename again once REUSE_GRACE_SECONDS have passed
+    with _lock:
+        _deferred[filename] = time.time() + REUSE_GRACE_SECONDS
+    _worker.start()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Synthetic catalog generator for the benchmarks: users, ingredients, recipes,
+recipe_ingredient rows and images with realistic distributions
+
+- a few prolific authors write most recipes (Zipf), most users write none or one
+- ingredient popularity is Zipf too: salt and onion are in thousands of
+  recipes, most ingredients in a handful
+- ingredients per recipe are log-normal around 8, between 2 and 25
+- dinners are the most common type, drinks the rarest
+- recipes get more frequent towards today (exponential age)
+- most recipes have a main image, some have up to 4 more
+
+Names are built from real ingredient and dish words, so name and ingredient
+searches hit a realistic share of the catalog. Image files are not written,
+only their names are stored.
+
+Usage: python benchmark_dataset.py [recipe_count] [folder]   (default: 10000, a temporary folder)
+"""
+
+import datetime
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+BASES = [
+    "Salt", "Onion", "Garlic", "Olive Oil", "Butter", "Black Pepper", "Egg", "Flour", "Sugar", "Milk",
+    "Tomato", "Chicken Breast", "Lemon", "Carrot", "Potato", "Rice", "Ginger", "Cumin", "Paprika", "Parsley",
+    "Beef", "Pork", "Lamb", "Salmon", "Prawn", "Tofu", "Lentil", "Chickpea", "Mushroom", "Spinach",
+    "Basil", "Coriander", "Chilli", "Honey", "Soy Sauce", "Cream", "Cheddar", "Parmesan", "Yogurt", "Bread",
+    "Pasta", "Noodles", "Coconut Milk", "Bell Pepper", "Courgette", "Aubergine", "Cabbage", "Celery", "Leek", "Pea",
+    "Apple", "Banana", "Strawberry", "Orange", "Almond", "Walnut", "Oat", "Vanilla", "Cinnamon", "Chocolate",
+]
+QUALIFIERS = ["Fresh", "Dried", "Smoked", "Ground", "Organic", "Red", "Green", "Wild", "Frozen", "Roasted"]
+STYLES = ["Spicy", "Creamy", "Crispy", "Smoky", "Sticky", "Slow Cooked", "Grilled", "Roasted", "Braised", "Classic"]
+DISHES = {
+    "Breakfast": ["Omelette", "Pancakes", "Porridge", "Hash", "Toast"],
+    "Lunch": ["Salad", "Wrap", "Soup", "Sandwich", "Bowl"],
+    "Dinner": ["Curry", "Stew", "Pie", "Risotto", "Stir Fry", "Tacos", "Bake"],
+    "Snack": ["Fritters", "Dip", "Bites", "Skewers"],
+    "Dessert": ["Tart", "Cake", "Crumble", "Pudding", "Ice Cream"],
+    "Drink": ["Smoothie", "Lassi", "Shake", "Punch"],
+}
+TYPE_WEIGHTS = {"Dinner": 30, "Lunch": 20, "Breakfast": 15, "Dessert": 15, "Snack": 12, "Drink": 8}
+UNITS = ["g", "g", "g", "ml", "piece", "tbsp", "tsp"]
+WORDS = "mix stir season simmer bake fold whisk chop slice serve rest cover heat pour drain".split()
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def ingredient_names(count):
+    """count distinct ingredient names, the plain bases first"""
+    names = list(BASES) + [f"{q} {b}" for q in QUALIFIERS for b in BASES]
+    names += [f"{names[i % len(names)]} {i // len(names) + 1}" for i in range(max(0, count - len(names)))]
+    return names[:count]
+
+
+def _weighted_sample(rng, population, cum_weights, k):
+    # k distinct items, popular ones more likely
+    picked = set()
+    while len(picked) < k:
+        picked.add(rng.choices(population, cum_weights=cum_weights)[0])
+    return list(picked)
+
+
+def _cumulative(weights):
+    total, cumulative = 0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def build_dataset(recipes=10000, users=None, ingredients=None, seed=0, batch_size=1000):
+    """
+    Insert a synthetic catalog into the app database (point MEALZI_DB_FOLDER at
+    a scratch folder first), refresh the in-memory indexes and return
+    {'users', 'ingredients', 'recipes', 'recipe_ingredients', 'images', 'seconds'}
+    """
+    from apps.CustomRecipeManager.ingredient_autocomplete import build_ingredient_autocomplete
+    from apps.CustomRecipeManager.ingredient_index import build_ingredient_index
+    from apps.CustomRecipeManager.models import db
+    from apps.CustomRecipeManager.nutrition import refresh_recipe_nutrition
+
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    users = users or max(10, recipes // 20)
+    ingredients = ingredients or min(len(BASES) * (len(QUALIFIERS) + 1), max(60, recipes // 20))
+    counts = {"users": users, "ingredients": ingredients, "recipes": recipes, "recipe_ingredients": 0, "images": 0}
+
+    user_ids = db.auth_user.bulk_insert([
+        {"email": f"cook{i}@example.com", "first_name": "Cook", "last_name": str(i), "username": f"cook{i}"}
+        for i in range(users)
+    ])
+    # log-normal calories per unit: most around 1, a few rich ones (oils, nuts) much higher
+    ingredient_rows = []
+    for name in ingredient_names(ingredients):
+        calories = rng.lognormvariate(0, 1.1)
+        ingredient_rows.append({
+            "name": name, "unit": rng.choice(UNITS), "description": f"{name}, synthetic",
+            "calories_per_unit": round(calories, 3), "protein_per_unit": round(calories * rng.uniform(0, 0.25), 3),
+            "fat_per_unit": round(calories * rng.uniform(0, 0.1), 3), "carbs_per_unit": round(calories * rng.uniform(0, 0.25), 3),
+            "sugar_per_unit": round(calories * rng.uniform(0, 0.1), 3), "fiber_per_unit": round(rng.uniform(0, 0.05), 3),
+            "sodium_per_unit": round(rng.uniform(0, 5), 3),
+        })
+    ingredient_ids = db.ingredient.bulk_insert(ingredient_rows)
+    ingredient_names_by_id = {i: row["name"] for i, row in zip(ingredient_ids, ingredient_rows)}
+    db.commit()
+
+    author_weights = _cumulative(zipf_weights(users))
+    ingredient_weights = _cumulative(zipf_weights(ingredients))
+    types, type_weights = list(TYPE_WEIGHTS), _cumulative(TYPE_WEIGHTS.values())
+    now = datetime.datetime.utcnow()
+    for offset in range(0, recipes, batch_size):
+        rows, links = [], []
+        for n in range(offset, min(recipes, offset + batch_size)):
+            recipe_type = rng.choices(types, cum_weights=type_weights)[0]
+            chosen = _weighted_sample(
+                rng, ingredient_ids, ingredient_weights,
+                min(ingredients, max(2, min(25, round(rng.lognormvariate(math.log(8), 0.4))))),
+            )
+            links.append(chosen)
+            main = ingredient_names_by_id[chosen[0]]
+            rows.append({
+                "name": f"{rng.choice(STYLES)} {main} {rng.choice(DISHES[recipe_type])} {n}",
+                "type": recipe_type,
+                "description": f"A {recipe_type.lower()} of {main.lower()}, serves the family.",
+                "instruction_steps": " ".join(rng.choices(WORDS, k=rng.randint(20, 120))),
+                "servings": rng.choice([1, 2, 2, 4, 4, 4, 6, 8]),
+                "image": f"synthetic_{n}.jpg" if rng.random() < 0.85 else None,
+                "author": rng.choices(user_ids, cum_weights=author_weights)[0],
+                "created_on": now - datetime.timedelta(days=min(3 * 365, rng.expovariate(1 / 180))),
+            })
+        recipe_ids = db.recipe.bulk_insert(rows)
+        recipe_ingredients = [
+            {"recipe_id": recipe_id, "ingredient_id": ingredient_id,
+             "quantity_per_serving": round(rng.lognormvariate(math.log(60), 0.8), 1)}
+            for recipe_id, chosen in zip(recipe_ids, links) for ingredient_id in chosen
+        ]
+        db.recipe_ingredient.bulk_insert(recipe_ingredients)
+        # extra images: none for most recipes, geometric beyond that
+        images = []
+        for recipe_id in recipe_ids:
+            extra = 0
+            while extra < 4 and rng.random() < 0.35:
+                extra += 1
+            images += [{"recipe_id": recipe_id, "multi_images": f"synthetic_{recipe_id}_{i}.jpg"} for i in range(extra)]
+        db.recipe_multiple_images.bulk_insert(images)
+        refresh_recipe_nutrition(recipe_ids)
+        db.commit()
+        counts["recipe_ingredients"] += len(recipe_ingredients)
+        counts["images"] += len(images)
+
+    # both were built when the app was imported, before the catalog existed
+    build_ingredient_index()
+    build_ingredient_autocomplete()
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    folder = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp(prefix="mealzi_dataset_")
+    os.makedirs(folder, exist_ok=True)
+    os.environ["MEALZI_DB_FOLDER"] = folder
+    os.environ["THEMEALDB_AUTO_IMPORT"] = "0"
+    os.environ["IMAGE_DOWNLOADS"] = "0"
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+    try:
+        import apps.CustomRecipeManager  # noqa: F401
+    except ImportError as e:
+        print(f"Error importing database models: {e}")
+        print("Make sure you're running this script from the py4web backend directory")
+        sys.exit(1)
+    print(f"Building {count} recipes in {folder}")
+    print(build_dataset(count))
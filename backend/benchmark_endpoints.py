@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmark: drives the API actions in-process through the py4web WSGI
+app against a synthetic catalog (benchmark_dataset.py) in a scratch database,
+the app database is never touched
+
+Reports per endpoint p50/p95/p99 latency, SQL queries per request and the
+peak RSS of the process, as a table and optionally as JSON (--json) so runs
+can be compared: --baseline previous.json prints the change per endpoint and
+exits with status 1 when p95 grew beyond --tolerance or an endpoint issues
+more queries than before.
+
+Read endpoints are measured uncached (the response cache is invalidated
+before every request) unless --cached is given.
+
+Usage: python benchmark_endpoints.py [--recipes 10000] [--requests 200] [--json out.json] [--baseline old.json]
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+# Point the app at a scratch database before it is imported
+os.environ["MEALZI_DB_FOLDER"] = tempfile.mkdtemp(prefix="mealzi_bench_")
+os.environ["THEMEALDB_AUTO_IMPORT"] = "0"
+os.environ["IMAGE_DOWNLOADS"] = "0"
+
+# Add the py4web path to import the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from pydal.helpers.classes import ExecutionHandler
+    from py4web.core import bottle
+
+    from apps.CustomRecipeManager import controllers  # noqa: F401 (benchmark_ scripts skip it in __init__)
+    from apps.CustomRecipeManager.models import db
+    from apps.CustomRecipeManager.response_cache import invalidate
+    from benchmark_dataset import BASES, DISHES, STYLES, build_dataset, zipf_weights
+except ImportError as e:
+    print(f"Error importing the app: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+PASSWORD = "Bench#Pass123!"
+PERCENTILES = (50, 95, 99)
+
+
+class QueryCounter(ExecutionHandler):
+    """Counts every SQL statement the adapter executes"""
+    count = 0
+
+    def before_execute(self, command):
+        QueryCounter.count += 1
+
+
+class Client:
+    """Minimal in-process WSGI client that keeps the session cookie"""
+
+    def __init__(self, app):
+        self.app = app
+        self.cookies = {}
+
+    def request(self, method, path, params=None, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": "/" + path.lstrip("/"),
+            "QUERY_STRING": urlencode(params or {}),
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "CONTENT_TYPE": "application/json" if body is not None else "",
+            "CONTENT_LENGTH": str(len(data)),
+            "wsgi.input": io.BytesIO(data),
+            "wsgi.errors": sys.stderr,
+            "wsgi.url_scheme": "http",
+            "wsgi.version": (1, 0),
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        if self.cookies:
+            environ["HTTP_COOKIE"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        result = {}
+
+        def start_response(status, headers, exc_info=None):
+            result["status"] = int(status.split()[0])
+            result["headers"] = dict(headers)
+            for key, value in headers:
+                if key.lower() == "set-cookie":
+                    name, value = value.split(";")[0].split("=", 1)
+                    self.cookies[name] = value
+
+        payload = b"".join(self.app(environ, start_response))
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            payload = None
+        return result["status"], result["headers"], payload
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Workload:
+    """Request generators per endpoint, popular recipes and ingredients are asked for more"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.recipe_ids = [row.id for row in db(db.recipe).select(db.recipe.id, orderby=~db.recipe.created_on)]
+        self.recipe_weights = zipf_weights(len(self.recipe_ids), 0.8)
+        self.ingredients = [row.id for row in db(db.ingredient).select(db.ingredient.id, orderby=db.ingredient.id)]
+        self.ingredient_weights = zipf_weights(len(self.ingredients))
+        self.names = [row.name for row in db(db.ingredient).select(db.ingredient.name, orderby=db.ingredient.id)]
+        self.cursor = None
+        self.created = []
+        self.counter = 0
+
+    def ingredients_search(self):
+        name = self.rng.choices(self.names, weights=self.ingredient_weights)[0].lower()
+        query = name[:self.rng.randint(2, min(6, len(name)))]
+        if self.rng.random() < 0.2:
+            # a typo, answered by the fuzzy ranking
+            position = self.rng.randrange(len(name))
+            return "GET", "api/ingredients/search", {"query": name[:position] + "x" + name[position + 1:], "fuzzy": "true"}, None
+        return "GET", "api/ingredients/search", {"query": query}, None
+
+    def get_public_recipes(self):
+        # most visitors look at the first page, some keep scrolling
+        params = {"limit": 12}
+        if self.cursor and self.rng.random() < 0.7:
+            params["cursor"] = self.cursor
+        return "GET", "api/recipes/public", params, None
+
+    def search_recipes(self):
+        words = [self.rng.choice(BASES), self.rng.choice(STYLES), self.rng.choice([d for ds in DISHES.values() for d in ds])]
+        params = {"name": self.rng.choice(words).lower()}
+        if self.rng.random() < 0.3:
+            params["type"] = self.rng.choice(list(DISHES))
+        return "GET", "api/recipes/search", params, None
+
+    def search_recipes_by_ingredients(self):
+        ids = {self.rng.choices(self.ingredients, weights=self.ingredient_weights)[0] for _ in range(self.rng.randint(1, 4))}
+        params = {"ingredients": ",".join(map(str, ids)), "match_all": self.rng.choice(["true", "false"])}
+        return "GET", "api/recipes/search_by_ingredients", params, None
+
+    def get_recipe_detail(self):
+        recipe_id = self.rng.choices(self.recipe_ids, weights=self.recipe_weights)[0]
+        return "GET", f"api/recipes/{recipe_id}", None, None
+
+    def add_ingredient(self):
+        self.counter += 1
+        body = {"name": f"Benchmark Spice {self.counter}", "unit": "g", "description": "benchmark", "calories_per_unit": 3.2}
+        return "POST", "api/ingredients", None, body
+
+    def create_recipe(self):
+        ids = {self.rng.choices(self.ingredients, weights=self.ingredient_weights)[0] for _ in range(8)}
+        body = {
+            "name": f"Benchmark Stew {len(self.created)}", "type": "Dinner", "description": "benchmark",
+            "instruction_steps": "Mix and cook.", "servings": 4,
+            "ingredients": [{"id": i, "quantity_per_serving": 50} for i in ids],
+        }
+        return "POST", "api/recipes", None, body
+
+    def update_recipe(self):
+        recipe_id = self.rng.choice(self.created)
+        return "PUT", f"api/recipes/{recipe_id}", None, {"description": f"updated {self.rng.random()}", "servings": self.rng.randint(1, 8)}
+
+    def delete_recipe(self):
+        return "DELETE", f"api/recipes/{self.created.pop()}", None, None
+
+    def observe(self, name, payload):
+        if name == "get_public_recipes":
+            self.cursor = (payload or {}).get("next_cursor")
+        elif name == "create_recipe" and payload and payload.get("success"):
+            self.created.append(payload["recipe"]["id"])
+
+
+# reads first, then writes in an order where each finds what it needs
+ENDPOINTS = [
+    "ingredients_search",
+    "get_public_recipes",
+    "search_recipes",
+    "search_recipes_by_ingredients",
+    "get_recipe_detail",
+    "add_ingredient",
+    "create_recipe",
+    "update_recipe",
+    "delete_recipe",
+]
+READS = set(ENDPOINTS[:5])
+
+
+def run_endpoint(client, workload, name, count, cached):
+    timings, queries, errors, hits = [], [], 0, 0
+    for _ in range(count):
+        if name in READS and not cached:
+            invalidate()
+        method, path, params, body = getattr(workload, name)()
+        before = QueryCounter.count
+        start = time.perf_counter()
+        status, headers, payload = client.request(method, path, params, body)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(QueryCounter.count - before)
+        errors += status >= 400
+        hits += headers.get("X-Cache") == "HIT"
+        workload.observe(name, payload)
+    result = {"requests": count, "errors": errors}
+    result.update({f"p{p}_ms": round(percentile(timings, p), 3) for p in PERCENTILES})
+    result["mean_ms"] = round(sum(timings) / count, 3)
+    result["queries_per_request"] = round(sum(queries) / count, 2)
+    result["max_queries"] = max(queries)
+    result["cache_hits"] = hits
+    result["peak_rss_kb"] = peak_rss_kb()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Print the change against a previous report, return the names of endpoints that regressed"""
+    regressions = []
+    print(f"\n{'endpoint vs baseline':<32} {'p95 ms':>17} {'queries':>15}")
+    for name, result in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old:
+            print(f"{name:<32} {'(new)':>17}")
+            continue
+        change = result["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0
+        slower = change > tolerance
+        more_queries = result["queries_per_request"] > old["queries_per_request"]
+        flag = "  REGRESSION" if slower or more_queries else ""
+        print(f"{name:<32} {old['p95_ms']:>7.2f} -> {result['p95_ms']:<7.2f}"
+              f" {old['queries_per_request']:>6} -> {result['queries_per_request']:<6}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints in-process")
+    parser.add_argument("--recipes", type=int, default=10000, help="synthetic recipes to generate")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cached", action="store_true", help="leave the response cache on for reads")
+    parser.add_argument("--json", help="write the report to this JSON file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("Endpoint Benchmark")
+    print("=" * 70)
+    dataset = build_dataset(args.recipes, seed=args.seed)
+    print(f"\nBuilt {dataset['recipes']} recipes, {dataset['ingredients']} ingredients, "
+          f"{dataset['users']} users in {dataset['seconds']}s")
+
+    db._adapter.execution_handlers.append(QueryCounter)
+    client = Client(bottle.default_app())
+    client.request("POST", "api/auth/register", body={"email": "bench@example.com", "password": PASSWORD, "first_name": "Bench"})
+    status, _, _ = client.request("POST", "api/auth/login", body={"email": "bench@example.com", "password": PASSWORD})
+    if status != 200:
+        print(f"❌ Could not log in the benchmark user (HTTP {status})")
+        sys.exit(1)
+
+    workload = Workload(random.Random(args.seed))
+    endpoints = {}
+    for name in ENDPOINTS:
+        # warm up: first calls build lazy state (query plans, in-memory indexes)
+        run_endpoint(client, workload, name, min(10, args.requests), args.cached)
+        if name == "delete_recipe":
+            # every delete needs a recipe of the benchmark user left over from create_recipe
+            while len(workload.created) < args.requests:
+                workload.observe("create_recipe", client.request(*workload.create_recipe())[2])
+        endpoints[name] = run_endpoint(client, workload, name, args.requests, args.cached)
+
+    report = {
+        "benchmark": "endpoints",
+        "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "options": {"recipes": args.recipes, "requests": args.requests, "seed": args.seed, "cached": args.cached},
+        "dataset": dataset,
+        "endpoints": endpoints,
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+    print(f"\n{'endpoint':<32} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, result in endpoints.items():
+        print(f"{name:<32} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+              f" {result['queries_per_request']:>8} {result['errors']:>7}")
+    print(f"\nPeak RSS: {report['peak_rss_kb'] / 1024:.1f} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.json}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+    print("=" * 70)
+    if regressions:
+        print(f"❌ Regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
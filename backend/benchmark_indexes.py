@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the secondary indexes of models.INDEXES: EXPLAIN QUERY PLAN and
+timings of the hot queries without and with them
+Builds a synthetic catalog in a scratch database, the app database is never touched
+
+Usage: python benchmark_indexes.py [recipe_count]   (default: 50000)
+"""
+
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+os.environ["MEALZI_DB_FOLDER"] = tempfile.mkdtemp(prefix="mealzi_bench_")
+os.environ["THEMEALDB_AUTO_IMPORT"] = "0"
+os.environ["IMAGE_DOWNLOADS"] = "0"
+
+# Add the py4web path to import the database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from apps.CustomRecipeManager.models import INDEXES, db, setup_indexes
+    from apps.CustomRecipeManager.pagination import recipe_order
+except ImportError as e:
+    print(f"Error importing database models: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+TYPES = ["Breakfast", "Lunch", "Dinner", "Snack", "Dessert", "Drink"]
+RUNS = 20
+
+
+def build_catalog(count, user_count=1000, ingredient_count=500, ingredients_per_recipe=8):
+    """Insert users, ingredients and count recipes with ingredients and images, in batches"""
+    rng = random.Random(count)
+    user_ids = db.auth_user.bulk_insert([
+        {"email": f"cook{i}@example.com", "first_name": f"Cook {i}"} for i in range(user_count)
+    ])
+    ingredient_ids = db.ingredient.bulk_insert([
+        {"name": f"Ingredient {i}", "unit": "g", "calories_per_unit": rng.uniform(0, 9)}
+        for i in range(ingredient_count)
+    ])
+    now = datetime.datetime.utcnow()
+    batch = 1000
+    for offset in range(0, count, batch):
+        recipe_ids = db.recipe.bulk_insert([
+            {
+                "name": f"Recipe {offset + i}",
+                "type": rng.choice(TYPES),
+                "description": "Synthetic recipe",
+                "instruction_steps": "Mix and cook.",
+                "servings": rng.randint(1, 6),
+                "author": rng.choice(user_ids),
+                "created_on": now - datetime.timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+            }
+            for i in range(min(batch, count - offset))
+        ])
+        db.recipe_ingredient.bulk_insert([
+            {"recipe_id": recipe_id, "ingredient_id": ingredient_id, "quantity_per_serving": 100}
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(ingredient_ids, ingredients_per_recipe)
+        ])
+        db.recipe_multiple_images.bulk_insert([
+            {"recipe_id": recipe_id, "multi_images": f"{recipe_id}-{n}.jpg"}
+            for recipe_id in recipe_ids if rng.random() < 0.3
+            for n in range(rng.randint(1, 3))
+        ])
+        db.commit()
+    return user_ids, ingredient_ids
+
+
+def hot_queries(user_id, recipe_id, ingredient_id):
+    """(label, SQL) of the queries behind the listing, detail, search and login paths"""
+    page_ids = [row.id for row in db(db.recipe).select(db.recipe.id, orderby=recipe_order(), limitby=(0, 20))]
+    return [
+        ("public listing page", db(db.recipe)._select(
+            db.recipe.ALL, orderby=recipe_order(), limitby=(0, 21))),
+        ("listing by type", db(db.recipe.type == "Dinner")._select(
+            db.recipe.ALL, orderby=recipe_order(), limitby=(0, 21))),
+        ("author's recipes", db(db.recipe.author == user_id)._select(
+            db.recipe.ALL, orderby=~db.recipe.created_on)),
+        ("recipe ingredients", db(db.recipe_ingredient.recipe_id == recipe_id)._select(
+            db.recipe_ingredient.ALL, db.ingredient.ALL,
+            left=db.ingredient.on(db.recipe_ingredient.ingredient_id == db.ingredient.id))),
+        ("recipes by ingredient", db(db.recipe_ingredient.ingredient_id == ingredient_id)._select(
+            db.recipe_ingredient.recipe_id)),
+        ("images of a page", db(db.recipe_multiple_images.recipe_id.belongs(page_ids))._select(
+            db.recipe_multiple_images.recipe_id, db.recipe_multiple_images.multi_images)),
+        ("ingredient by name", db(db.ingredient.name.lower() == "ingredient 42")._select(db.ingredient.id)),
+        ("login lookup", db(db.auth_user.email == "cook7@example.com")._select(db.auth_user.id)),
+    ]
+
+
+def query_plan(sql):
+    return "; ".join(row[-1] for row in db.executesql(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def measure(sql):
+    """Return the median in milliseconds over RUNS executions"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        db.executesql(sql)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def run(queries):
+    return {label: (measure(sql), query_plan(sql)) for label, sql in queries}
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    if db._adapter.dbengine != "sqlite":
+        print("❌ This benchmark reads SQLite query plans")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("Database Index Benchmark")
+    print("=" * 70)
+
+    start = time.perf_counter()
+    user_ids, ingredient_ids = build_catalog(count)
+    print(f"\nBuilt {count} recipes in {time.perf_counter() - start:.1f}s")
+    queries = hot_queries(user_ids[7], count // 2, ingredient_ids[42])
+
+    # the catalog is built with the indexes (the search triggers need them), drop them to compare
+    for name in INDEXES:
+        db.executesql(f"DROP INDEX IF EXISTS {name}")
+    db.commit()
+    before = run(queries)
+
+    start = time.perf_counter()
+    built = setup_indexes()
+    print(f"Created {len(built)} indexes in {time.perf_counter() - start:.1f}s")
+    after = run(queries)
+
+    print(f"\n{'query':<24} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    for label, _ in queries:
+        speedup = before[label][0] / after[label][0] if after[label][0] else float("inf")
+        print(f"{label:<24} {before[label][0]:>10.2f} {after[label][0]:>10.2f} {speedup:>8.1f}x")
+
+    print("\nEXPLAIN QUERY PLAN")
+    for label, _ in queries:
+        print(f"\n{label}")
+        print(f"  before: {before[label][1]}")
+        print(f"  after:  {after[label][1]}")
+
+    print("\nRun again: setup_indexes() has nothing to do ->", setup_indexes() or "no changes")
+    print("=" * 70)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark for password hashing (credentials.py): logins per second per core
+and through the hashing pool at each cost setting, to pick PASSWORD_HASH
+No database is used beyond a scratch one created by importing the app
+
+Usage: python benchmark_passwords.py [iterations ...]   (default: 1000 50000 100000 210000 600000)
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Point the app at a scratch database before it is imported
+os.environ["MEALZI_DB_FOLDER"] = tempfile.mkdtemp(prefix="mealzi_bench_")
+os.environ["THEMEALDB_AUTO_IMPORT"] = "0"
+os.environ["IMAGE_DOWNLOADS"] = "0"
+
+# Add the py4web path to import the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from apps.CustomRecipeManager import credentials
+    from apps.CustomRecipeManager.credentials import HASH_WORKERS, verify_password
+except ImportError as e:
+    print(f"Error importing credentials: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+PASSWORD = "Correct#Horse42"
+RUNS = 5
+
+
+def single_core(stored):
+    """Median seconds of one verification in this thread"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        credentials._verify(PASSWORD, stored)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def through_pool(stored, logins):
+    """Logins per second when `logins` concurrent requests verify through the pool"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as requests:
+        assert all(requests.map(lambda _: verify_password(PASSWORD, stored), range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    costs = [int(arg) for arg in sys.argv[1:]] or [1000, 50000, 100000, 210000, 600000]
+
+    print("=" * 70)
+    print("Password Hashing Benchmark")
+    print("=" * 70)
+    print(f"{os.cpu_count()} CPU cores, hashing pool of {HASH_WORKERS} threads")
+    print(f"\n{'algorithm':<28} {'ms/login':>9} {'logins/s/core':>14} {'pool logins/s':>14}")
+    for iterations in costs:
+        digest_alg = f"pbkdf2({iterations},32,sha512)"
+        stored = credentials._hash(PASSWORD, digest_alg)
+        seconds = single_core(stored)
+        pooled = through_pool(stored, min(credentials.MAX_WAITING, HASH_WORKERS * 4))
+        print(f"{digest_alg:<28} {seconds * 1000:>9.1f} {1 / seconds:>14.1f} {pooled:>14.1f}")
+    print("\nPick the highest cost whose logins/s covers the expected login peak,")
+    print("set it as PASSWORD_HASH; existing hashes are upgraded on their next login.")
+    print("=" * 70)
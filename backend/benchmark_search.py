@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark for recipe text search: ilike() scan versus the recipe_fts full-text index
+Builds a synthetic catalog in a scratch database, the app database is never touched
+
+Usage: python benchmark_search.py [recipe_count ...]   (default: 10000 100000)
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# Point the app at a scratch database before it is imported
+os.environ["MEALZI_DB_FOLDER"] = tempfile.mkdtemp(prefix="mealzi_bench_")
+os.environ["THEMEALDB_AUTO_IMPORT"] = "0"
+
+# Add the py4web path to import the database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from apps.CustomRecipeManager.models import db
+    from apps.CustomRecipeManager.search_index import search_recipes_page
+except ImportError as e:
+    print(f"Error importing database models: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+WORDS = [
+    "chicken", "beef", "pork", "lamb", "salmon", "prawn", "tofu", "lentil", "chickpea", "mushroom",
+    "tomato", "garlic", "ginger", "lemon", "chilli", "basil", "coriander", "cumin", "paprika", "honey",
+    "roasted", "grilled", "braised", "spicy", "creamy", "crispy", "smoky", "sticky", "fresh", "slow",
+    "curry", "stew", "salad", "soup", "pie", "tart", "noodles", "risotto", "tacos", "burger",
+]
+# filler vocabulary so descriptions and instructions read like varied text, not 40 repeated words
+SYLLABLES = ["ba", "ke", "ri", "so", "tu", "ma", "len", "dor", "pi", "sha", "vo", "gre", "nu", "tal"]
+FILLER = sorted({"".join(random.Random(i).choices(SYLLABLES, k=3)) for i in range(5000)})
+QUERIES = ["chicken", "garlic", "spicy curry", "smok", "lemon tart", "basil tomato soup", "zzz"]
+RUNS = 20
+
+
+def build_catalog(count, ingredient_count=300, ingredients_per_recipe=8):
+    """Insert count synthetic recipes with ingredients, in batches"""
+    rng = random.Random(count)
+    ingredient_ids = [
+        db.ingredient.insert(name=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}", unit="g")
+        for i in range(ingredient_count)
+    ]
+    batch = 1000
+    for offset in range(0, count, batch):
+        recipes = []
+        for _ in range(min(batch, count - offset)):
+            name = " ".join(rng.sample(WORDS, 3)).title()
+            recipes.append({
+                "name": name,
+                "type": rng.choice(["Breakfast", "Lunch", "Dinner", "Dessert"]),
+                "description": " ".join(rng.choices(FILLER, k=10) + rng.choices(WORDS, k=2)),
+                "instruction_steps": " ".join(rng.choices(FILLER, k=36) + rng.choices(WORDS, k=4)),
+                "servings": rng.randint(1, 6),
+            })
+        recipe_ids = db.recipe.bulk_insert(recipes)
+        db.recipe_ingredient.bulk_insert([
+            {"recipe_id": recipe_id, "ingredient_id": ingredient_id, "quantity_per_serving": 100}
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(ingredient_ids, ingredients_per_recipe)
+        ])
+        db.commit()
+
+
+def measure(search):
+    """Return (median, p95) in milliseconds over RUNS calls"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        search()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def ilike_search(text):
+    return db(db.recipe.name.ilike(f"%{text}%")).select(
+        db.recipe.id, orderby=~db.recipe.created_on | ~db.recipe.id, limitby=(0, 21)
+    )
+
+
+def fts_search(text):
+    page_ids, _ = search_recipes_page(text, limit=20, count=False)
+    return db(db.recipe.id.belongs(page_ids)).select(db.recipe.id)
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    if search_recipes_page("probe") is None:
+        print("❌ SQLite FTS5 is not available, nothing to compare")
+        sys.exit(1)
+
+    print("=" * 70)
+    print("Recipe Search Benchmark")
+    print("=" * 70)
+
+    built = 0
+    for count in sorted(counts):
+        build_catalog(count - built)
+        built = count
+        print(f"\n{count} recipes")
+        print(f"{'query':<20} {'ilike median/p95 ms':>22} {'fts median/p95 ms':>22} {'fts hits':>9}")
+        for text in QUERIES:
+            ilike_median, ilike_p95 = measure(lambda: ilike_search(text))
+            fts_median, fts_p95 = measure(lambda: fts_search(text))
+            hits = search_recipes_page(text)[1]
+            print(f"{text:<20} {ilike_median:>12.2f} / {ilike_p95:<8.2f} {fts_median:>12.2f} / {fts_p95:<8.2f} {hits:>9}")
+
+    print("\nNote: ilike() only matches names, recipe_fts also matches descriptions,")
+    print("instructions and ingredient names and returns the best matches first.")
+    print("=" * 70)
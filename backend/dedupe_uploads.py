@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Move the existing files in uploads/ into the content-addressed image store
+Byte-identical copies collapse into one <sha256><extension> file and
+recipe.image / recipe_multiple_images are pointed at the new names
+Run it once after upgrading; running it again does nothing
+"""
+
+import sys
+import os
+
+# Add the py4web path to import the database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from apps.CustomRecipeManager import settings
+    from apps.CustomRecipeManager.models import db
+    from apps.CustomRecipeManager.uploads import UploadError, image_extension, is_content_addressed, save_stream
+except ImportError as e:
+    print(f"Error importing database models: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+
+def dedupe_uploads():
+    """Return (files moved, bytes freed)"""
+    folder = settings.UPLOAD_FOLDER
+    renames = {}
+    freed = 0
+    for filename in sorted(os.listdir(folder)):
+        path = os.path.join(folder, filename)
+        if filename.startswith('.') or is_content_addressed(filename) or not os.path.isfile(path):
+            continue
+        try:
+            with open(path, 'rb') as f:
+                stored = save_stream(f, image_extension(filename), max_bytes=float('inf'))
+        except UploadError as e:
+            print(f"Skipping {filename}: {e}")
+            continue
+        renames[filename] = stored['filename']
+        if not stored['created']:
+            freed += stored['size']
+
+    # point the references at the new names before any old file goes away
+    for old, new in renames.items():
+        db(db.recipe.image == old).update(image=new)
+        db(db.recipe_multiple_images.multi_images == old).update(multi_images=new)
+    db.commit()
+
+    for old in renames:
+        os.remove(os.path.join(folder, old))
+    return len(renames), freed
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Uploads Deduplication Script")
+    print("=" * 50)
+
+    try:
+        moved, freed = dedupe_uploads()
+        print(f"✅ Moved {moved} files into the image store, freed {freed / (1024 * 1024):.1f} MB")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error during deduplication: {e}")
+        sys.exit(1)
+
+    print("=" * 50)
@@ -13,9 +13,7 @@ Requirements:
     - py4web environment setup
 """
 
-import requests
 import json
-import time
 import sys
 import os
 from datetime import datetime
@@ -27,6 +25,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 try:
     from apps.CustomRecipeManager.models import db
     from apps.CustomRecipeManager.common import auth
+    from apps.CustomRecipeManager.image_downloads import queue_image_downloads, start_image_downloads
+    from apps.CustomRecipeManager.recipe_loader import load_ingredients, load_recipes
+    from apps.CustomRecipeManager.themealdb import TheMealDBClient
 except ImportError as e:
     print(f"Error importing database models: {e}")
     print("Make sure you're running this script from the py4web backend directory")
@@ -34,7 +35,8 @@ except ImportError as e:
 
 class TheMealDBImporter:
     def __init__(self):
-        self.base_url = "https://www.themealdb.com/api/json/v1/1"
+        self.client = TheMealDBClient()
+        self.base_url = self.client.base_url
         self.recipes_imported = 0
         self.ingredients_imported = 0
         self.errors = []
@@ -114,50 +116,17 @@ class TheMealDBImporter:
         self.log("Fetching ingredients from TheMealDB...")
         
         try:
-            response = requests.get(f"{self.base_url}/list.php?i=list", timeout=15)
-            if response.status_code != 200:
-                self.log(f"Failed to fetch ingredients: HTTP {response.status_code}")
-                return
-                
-            data = response.json()
-            ingredients = data.get('meals', [])[:100]  # Limit to 100 ingredients
+            ingredients = self.client.list_ingredients()[:100]  # Limit to 100 ingredients
             
             self.log(f"Found {len(ingredients)} ingredients to import")
             
-            for ingredient_item in ingredients:
-                ingredient_name = ingredient_item.get('strIngredient', '').strip()
-                if not ingredient_name:
-                    continue
-                    
-                # Check if ingredient already exists
-                existing = db(db.ingredient.name.ilike(ingredient_name)).select().first()
-                if existing:
-                    continue
-                
-                try:
-                    # Create new ingredient with realistic default values
-                    db.ingredient.insert(
-                        name=ingredient_name,
-                        unit='g',  # Default unit
-                        description=f'Ingredient imported from TheMealDB',
-                        calories_per_unit=self._get_default_calories(ingredient_name),
-                        protein_per_unit=self._get_default_protein(ingredient_name),
-                        fat_per_unit=self._get_default_fat(ingredient_name),
-                        carbs_per_unit=self._get_default_carbs(ingredient_name),
-                        sugar_per_unit=self._get_default_sugar(ingredient_name),
-                        fiber_per_unit=self._get_default_fiber(ingredient_name),
-                        sodium_per_unit=self._get_default_sodium(ingredient_name)
-                    )
-                    self.ingredients_imported += 1
-                    
-                    if self.ingredients_imported % 10 == 0:
-                        self.log(f"Imported {self.ingredients_imported} ingredients...")
-                        
-                except Exception as e:
-                    self.errors.append(f"Error importing ingredient {ingredient_name}: {str(e)}")
-                
-                time.sleep(0.1)  # Rate limiting
-                
+            # Existing names are resolved in one query, new ones inserted in bulk
+            report = load_ingredients(
+                self._ingredient_values(item.get('strIngredient') or '', 'Ingredient imported from TheMealDB')
+                for item in ingredients
+            )
+            self.ingredients_imported += report['ingredients']
+            
             self.log(f"Completed ingredient import: {self.ingredients_imported} ingredients")
             
         except Exception as e:
@@ -269,6 +238,22 @@ class TheMealDBImporter:
         else:
             return 0.02    # Default 20mg per 100g
     
+    def _ingredient_values(self, ingredient_name, description):
+        """Normalized ingredient dict with realistic default nutrition values"""
+        ingredient_name = ingredient_name.strip()
+        return {
+            'name': ingredient_name,
+            'unit': 'g',  # Default unit
+            'description': description,
+            'calories_per_unit': self._get_default_calories(ingredient_name),
+            'protein_per_unit': self._get_default_protein(ingredient_name),
+            'fat_per_unit': self._get_default_fat(ingredient_name),
+            'carbs_per_unit': self._get_default_carbs(ingredient_name),
+            'sugar_per_unit': self._get_default_sugar(ingredient_name),
+            'fiber_per_unit': self._get_default_fiber(ingredient_name),
+            'sodium_per_unit': self._get_default_sodium(ingredient_name)
+        }
+    
     def import_recipes(self):
         """Import recipes from TheMealDB"""
         admin_user_id = self.create_admin_user()
@@ -293,133 +278,76 @@ class TheMealDBImporter:
             'Side': 'Snack'
         }
         
-        for category in categories:
-            self.log(f"Importing {category} recipes...")
+        # Fetch every category list and recipe detail concurrently, then insert in order
+        self.log(f"Fetching {', '.join(categories)} recipes...")
+        meals, errors = self.client.fetch_category_meals(categories, per_category=6)  # Limit to 6 recipes per category
+        self.errors.extend(errors)
+        self.log(f"Found {len(meals)} recipes to import")
+        
+        recipes = []
+        for category, recipe_detail in meals:
+            # Extract recipe data
+            recipe_name = recipe_detail.get('strMeal', '').strip()
+            recipe_category = recipe_detail.get('strCategory', category)
+            recipe_instructions = recipe_detail.get('strInstructions', '').strip()
+            recipe_area = recipe_detail.get('strArea', '')
             
-            try:
-                # Get recipes from category
-                response = requests.get(f"{self.base_url}/filter.php?c={category}", timeout=15)
-                if response.status_code != 200:
-                    self.log(f"Failed to fetch {category} recipes: HTTP {response.status_code}")
-                    continue
-                
-                data = response.json()
-                meals = data.get('meals', [])[:6]  # Limit to 6 recipes per category
-                
-                self.log(f"Found {len(meals)} {category} recipes to import")
-                
-                for meal in meals:
-                    meal_id = meal.get('idMeal')
-                    if not meal_id:
-                        continue
-                    
-                    try:
-                        # Get detailed recipe information
-                        detail_response = requests.get(f"{self.base_url}/lookup.php?i={meal_id}", timeout=15)
-                        if detail_response.status_code != 200:
-                            continue
-                            
-                        detail_data = detail_response.json()
-                        recipe_detail = detail_data.get('meals', [{}])[0]
-                        
-                        if not recipe_detail:
-                            continue
-                        
-                        # Extract recipe data
-                        recipe_name = recipe_detail.get('strMeal', '').strip()
-                        recipe_category = recipe_detail.get('strCategory', category)
-                        recipe_instructions = recipe_detail.get('strInstructions', '').strip()
-                        recipe_area = recipe_detail.get('strArea', '')
-                        
-                        if not recipe_name or not recipe_instructions:
-                            continue
-                        
-                        # Check if recipe already exists
-                        existing_recipe = db(db.recipe.name.ilike(recipe_name)).select().first()
-                        if existing_recipe:
-                            continue
-                        
-                        mapped_category = category_mapping.get(recipe_category, 'Dinner')
-                        
-                        # Create recipe description
-                        description = f"Delicious {recipe_name} recipe imported from TheMealDB."
-                        if recipe_area:
-                            description += f" Traditional {recipe_area} cuisine."
-                        description += f" Category: {recipe_category}."
-                        
-                        # Create recipe
-                        recipe_id = db.recipe.insert(
-                            name=recipe_name,
-                            type=mapped_category,
-                            description=description,
-                            instruction_steps=recipe_instructions,
-                            servings=4,  # Default servings
-                            image=recipe_detail.get('strMealThumb', ''),  # Use original MealDB image URL
-                            author=admin_user_id,
-                            created_on=datetime.utcnow()
-                        )
-                        
-                        # Import ingredients for this recipe
-                        self._import_recipe_ingredients(recipe_detail, recipe_id, recipe_name)
-                        
-                        self.recipes_imported += 1
-                        self.log(f"Imported recipe: {recipe_name}")
-                        
-                        time.sleep(0.5)  # Rate limiting
-                        
-                    except Exception as e:
-                        self.errors.append(f"Error importing recipe {meal_id}: {str(e)}")
-                        continue
-                
-                time.sleep(1)  # Rate limiting between categories
-                
-            except Exception as e:
-                self.log(f"Error fetching {category} recipes: {e}")
-                self.errors.append(f"Category {category} import failed: {str(e)}")
+            if not recipe_name or not recipe_instructions:
                 continue
+            
+            mapped_category = category_mapping.get(recipe_category, 'Dinner')
+            
+            # Create recipe description
+            description = f"Delicious {recipe_name} recipe imported from TheMealDB."
+            if recipe_area:
+                description += f" Traditional {recipe_area} cuisine."
+            description += f" Category: {recipe_category}."
+            
+            recipes.append({
+                'name': recipe_name,
+                'type': mapped_category,
+                'description': description,
+                'instruction_steps': recipe_instructions,
+                'servings': 4,  # Default servings
+                'image': recipe_detail.get('strMealThumb', ''),  # MealDB image URL until the download lands
+                'created_on': datetime.utcnow(),
+                'ingredients': self._recipe_ingredients(recipe_detail, recipe_name)
+            })
+        
+        # Recipes that already exist are skipped, everything else goes in one transaction
+        try:
+            report = load_recipes(recipes, author=admin_user_id)
+            self.recipes_imported += report['recipes']
+            self.ingredients_imported += report['ingredients']
+            self.log(f"Loaded {report['rows']} rows in {report['seconds']}s ({report['rows_per_second']} rows/s), "
+                     f"skipped {report['skipped']} existing recipes")
+        except Exception as e:
+            self.log(f"Error loading recipes: {e}")
+            self.errors.append(f"Recipe load failed: {str(e)}")
         
         self.log(f"Completed recipe import: {self.recipes_imported} recipes")
+        
+        # Recipes are saved, now copy their images into uploads/
+        queued = queue_image_downloads([recipe['image'] for recipe in recipes], start=False)
+        if queued:
+            self.log(f"Downloading {queued} recipe images...")
+            start_image_downloads().join()
     
-    def _import_recipe_ingredients(self, recipe_detail, recipe_id, recipe_name):
-        """Import ingredients for a specific recipe"""
+    def _recipe_ingredients(self, recipe_detail, recipe_name):
+        """Normalized ingredient lines of a TheMealDB recipe"""
+        items = []
         for i in range(1, 21):  # TheMealDB has up to 20 ingredients
-            ingredient_name = recipe_detail.get(f'strIngredient{i}', '').strip()
-            ingredient_measure = recipe_detail.get(f'strMeasure{i}', '').strip()
+            ingredient_name = (recipe_detail.get(f'strIngredient{i}') or '').strip()
+            ingredient_measure = (recipe_detail.get(f'strMeasure{i}') or '').strip()
             
             if not ingredient_name or not ingredient_measure:
                 continue
             
-            # Find or create ingredient
-            ingredient = db(db.ingredient.name.ilike(ingredient_name)).select().first()
-            if not ingredient:
-                ingredient_id = db.ingredient.insert(
-                    name=ingredient_name,
-                    unit='g',
-                    description=f'Ingredient from TheMealDB recipe: {recipe_name}',
-                    calories_per_unit=self._get_default_calories(ingredient_name),
-                    protein_per_unit=self._get_default_protein(ingredient_name),
-                    fat_per_unit=self._get_default_fat(ingredient_name),
-                    carbs_per_unit=self._get_default_carbs(ingredient_name),
-                    sugar_per_unit=self._get_default_sugar(ingredient_name),
-                    fiber_per_unit=self._get_default_fiber(ingredient_name),
-                    sodium_per_unit=self._get_default_sodium(ingredient_name)
-                )
-                self.ingredients_imported += 1
-            else:
-                ingredient_id = ingredient.id
-            
+            item = self._ingredient_values(ingredient_name, f'Ingredient from TheMealDB recipe: {recipe_name}')
             # Parse quantity from measure string
-            quantity = self._parse_quantity(ingredient_measure)
-            
-            # Add ingredient to recipe
-            try:
-                db.recipe_ingredient.insert(
-                    recipe_id=recipe_id,
-                    ingredient_id=ingredient_id,
-                    quantity_per_serving=quantity
-                )
-            except Exception as e:
-                self.errors.append(f"Error adding ingredient {ingredient_name} to recipe {recipe_name}: {str(e)}")
+            item['quantity_per_serving'] = self._parse_quantity(ingredient_measure)
+            items.append(item)
+        return items
     
     def _parse_quantity(self, measure_string):
         """Parse quantity from TheMealDB measure string"""
@@ -521,6 +449,8 @@ class TheMealDBImporter:
             self.log("Import completed successfully!")
             self.log(f"Total recipes imported: {self.recipes_imported}")
             self.log(f"Total ingredients imported: {self.ingredients_imported}")
+            if self.client.cache:
+                self.log(f"TheMealDB response cache: {dict(self.client.cache.stats)}")
             
             if self.errors:
                 self.log(f"Encountered {len(self.errors)} errors during import")
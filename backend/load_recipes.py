@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Load recipes from a JSON or CSV file with the bulk loader
+
+JSON: a list of recipe dicts as described in apps/CustomRecipeManager/recipe_loader.py
+CSV: one row per recipe ingredient with the columns name, type, description,
+instruction_steps, servings, image, ingredient, quantity_per_serving, unit;
+consecutive rows with the same name make up one recipe
+
+Usage: python load_recipes.py recipes.json|recipes.csv
+"""
+
+import csv
+import json
+import sys
+import os
+from itertools import groupby
+
+# Add the py4web path to import the database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from apps.CustomRecipeManager.models import db
+    from apps.CustomRecipeManager.recipe_loader import load_recipes
+except ImportError as e:
+    print(f"Error importing database models: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+
+def read_csv(path):
+    """Yield one recipe dict per group of consecutive rows with the same name"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for name, rows in groupby(csv.DictReader(f), key=lambda row: row['name']):
+            rows = list(rows)
+            first = rows[0]
+            yield {
+                'name': name,
+                'type': first.get('type'),
+                'description': first.get('description'),
+                'instruction_steps': first.get('instruction_steps'),
+                # empty cells count as missing, the loader defaults and checks the values
+                'servings': first.get('servings') or None,
+                'image': first.get('image') or None,
+                'ingredients': [{
+                    'name': row['ingredient'],
+                    'quantity_per_serving': row.get('quantity_per_serving') or None,
+                    'unit': row.get('unit') or 'g',
+                } for row in rows if row.get('ingredient')]
+            }
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+
+    path = sys.argv[1]
+    recipes = read_csv(path) if path.lower().endswith('.csv') else read_json(path)
+
+    try:
+        report = load_recipes(recipes)
+    except Exception as e:
+        print(f"❌ Error during load: {e}")
+        sys.exit(1)
+
+    print(f"✅ Loaded {report['recipes']} recipes, {report['ingredients']} new ingredients, "
+          f"{report['recipe_ingredients']} recipe ingredients ({report['skipped']} recipes skipped)")
+    print(f"   {report['rows']} rows in {report['seconds']}s ({report['rows_per_second']} rows/s)")
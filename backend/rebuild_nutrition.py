@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Rebuild script for the materialized recipe_nutrition table
+Run it once after upgrading, or whenever ingredient values were changed outside the app
+"""
+
+import sys
+import os
+
+# Add the py4web path to import the database
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+try:
+    from apps.CustomRecipeManager.models import db
+    from apps.CustomRecipeManager.nutrition import rebuild_recipe_nutrition
+except ImportError as e:
+    print(f"Error importing database models: {e}")
+    print("Make sure you're running this script from the py4web backend directory")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Recipe Nutrition Rebuild Script")
+    print("=" * 50)
+
+    try:
+        refreshed = rebuild_recipe_nutrition()
+        print(f"✅ Rebuilt nutrition for {refreshed} recipes")
+    except Exception as e:
+        print(f"❌ Error during rebuild: {e}")
+        sys.exit(1)
+
+    print("=" * 50)
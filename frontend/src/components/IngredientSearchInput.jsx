@@ -36,7 +36,7 @@ const IngredientSearchInput = ({ onAddIngredient }) => {
     setIsSearching(true);
     const timeoutId = setTimeout(async () => {
       try {
-        const response = await apiService.searchIngredients(searchTerm, 1, 10);
+        const response = await apiService.searchIngredients(searchTerm, 1, 10, true);
         setSearchResults(response.ingredients || []);
       } catch (error) {
         console.error('Error searching ingredients:', error);
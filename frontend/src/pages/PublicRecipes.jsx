@@ -65,7 +65,7 @@ const RecipeCard = ({ recipe, index, onViewRecipe }) => {
       <div className="relative h-48 bg-gradient-to-br from-emerald-400 via-green-500 to-teal-600 overflow-hidden">
         {recipe.image && !imageError ? (
           <img
-            src={recipe.image.startsWith('http') ? recipe.image : `/CustomRecipeManager/uploads/${recipe.image}`}
+            src={recipe.image.startsWith('http') ? recipe.image : `/CustomRecipeManager/uploads/${recipe.image}?size=thumb`}
             alt={recipe.name}
             className="absolute inset-0 w-full h-full object-cover transition-transform duration-300 group-hover:scale-110"
             onError={(e) => {
@@ -79,7 +79,7 @@ const RecipeCard = ({ recipe, index, onViewRecipe }) => {
             }}
             onLoad={() => {
               console.log('Image loaded successfully:', {
-                src: recipe.image.startsWith('http') ? recipe.image : `/CustomRecipeManager/uploads/${recipe.image}`,
+                src: recipe.image.startsWith('http') ? recipe.image : `/CustomRecipeManager/uploads/${recipe.image}?size=thumb`,
                 recipe: recipe.name,
                 isMealDB: recipe.image.startsWith('http')
               });
@@ -299,6 +299,8 @@ const PublicRecipes = () => {
   const [ingredientIds, setIngredientIds] = useState([]);
   const [matchAll, setMatchAll] = useState(false);
   const [totalRecipes, setTotalRecipes] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchSummary, setSearchSummary] = useState('');
 
   const openRecipeModal = (recipeId) => {
@@ -358,13 +360,15 @@ const PublicRecipes = () => {
       let response;
       if (!name && !type) {
         response = await apiService.getPublicRecipes();
-        setTotalRecipes(response.recipes?.length || 0);
+        setTotalRecipes(response.total || response.recipes?.length || 0);
         setRecipes(response.recipes || []);
+        setNextCursor(response.next_cursor || null);
       } else {
         // Use search endpoint but get all results
         response = await apiService.searchRecipes(name, type, 1, 100);
         setTotalRecipes(response.total || 0);
         setRecipes(response.recipes || []);
+        setNextCursor(null);
       }
       setLoading(false);
     } catch (err) {
@@ -374,6 +378,21 @@ const PublicRecipes = () => {
     }
   };
   
+  const fetchMoreRecipes = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await apiService.getPublicRecipes(nextCursor);
+      setRecipes((current) => [...current, ...(response.recipes || [])]);
+      setNextCursor(response.next_cursor || null);
+    } catch (err) {
+      console.error('Error fetching more recipes:', err);
+      setError('Failed to fetch recipes. Please try again later.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
   const fetchRecipesByIngredients = async (
     ingredients = ingredientIds,
     match = matchAll,
@@ -387,6 +406,7 @@ const PublicRecipes = () => {
       );
       setTotalRecipes(response.total || 0);
       setRecipes(response.recipes || []);
+      setNextCursor(null);
       setLoading(false);
     } catch (err) {
       console.error('Error fetching recipes by ingredients:', err);
@@ -534,16 +554,29 @@ const PublicRecipes = () => {
         
         {/* Recipe Grid */}
         {recipes.length > 0 ? (
-          <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-8">
-            {recipes.map((recipe, index) => (
-              <RecipeCard 
-                key={recipe.id} 
-                recipe={recipe} 
-                index={index} 
-                onViewRecipe={openRecipeModal}
-              />
-            ))}
-          </div>
+          <>
+            <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-8">
+              {recipes.map((recipe, index) => (
+                <RecipeCard 
+                  key={recipe.id} 
+                  recipe={recipe} 
+                  index={index} 
+                  onViewRecipe={openRecipeModal}
+                />
+              ))}
+            </div>
+            {nextCursor && (
+              <div className="text-center mt-10">
+                <button
+                  onClick={fetchMoreRecipes}
+                  disabled={loadingMore}
+                  className="bg-emerald-500 text-white px-6 py-3 rounded-lg font-medium hover:bg-emerald-600 transition-all duration-200 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more recipes'}
+                </button>
+              </div>
+            )}
+          </>
         ) : (
           <div className="text-center py-16">
             <div className="text-6xl mb-4">🍽️</div>
@@ -108,7 +108,7 @@ function RecipeDashboard() {
         {/* Recipe Image */}
         {recipe.image && (
           <img
-            src={`${API_BASE_URL}/uploads/${recipe.image}`}
+            src={`${API_BASE_URL}/uploads/${recipe.image}?size=thumb`}
             alt={recipe.name}
             className="absolute inset-0 w-full h-full object-cover z-0"
             style={{ opacity: 0.7 }}
@@ -52,12 +52,15 @@ class ApiService {
   }
 
   // Ingredient endpoints
-  async searchIngredients(query = '', page = 1, limit = 10) {
+  async searchIngredients(query = '', page = 1, limit = 10, fuzzy = false) {
     const params = new URLSearchParams({
       query,
       page: page.toString(),
       limit: limit.toString(),
     });
+    if (fuzzy) {
+      params.append('fuzzy', 'true');
+    }
     return this.request(`/api/ingredients/search?${params}`);
   }
 
@@ -131,8 +134,10 @@ class ApiService {
     }
   }
 
-  async getPublicRecipes() {
-    return this.request('/api/recipes/public');
+  async getPublicRecipes(cursor = null, limit = 24) {
+    const params = new URLSearchParams({ limit: limit.toString() });
+    if (cursor) params.append('cursor', cursor);
+    return this.request(`/api/recipes/public?${params}`);
   }
 
   async searchRecipes(nameQuery = '', typeQuery = '', page = 1, limit = 10) {